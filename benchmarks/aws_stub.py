@@ -0,0 +1,150 @@
+import random
+import re
+import sys
+import threading
+import time
+import types
+
+from s3_stub import ClientError, StubBody
+
+# In-memory stand-ins for bedrock-agent-runtime and polly, and a boto3 replacement that
+# hands them out, so the Lambda handlers can be imported and driven in-process without
+# credentials or network. Latencies are drawn per call from a lognormal distribution
+# around the configured median (seconds, multiplied by `time_scale`); failures are
+# drawn per call with the configured probability.
+
+class Latency:
+    def __init__(self, median: float, spread: float = 0.25, time_scale: float = 1.0, rng: random.Random = None):
+        self.median = median
+        self.spread = spread
+        self.time_scale = time_scale
+        self.rng = rng or random.Random()
+
+    def draw(self) -> float:
+        return self.median * self.time_scale * self.rng.lognormvariate(0, self.spread)
+
+    def sleep(self, extra: float = 0.0):
+        time.sleep(self.draw() + extra * self.time_scale)
+
+words = ("energy policy market carbon nuclear solar grid storage subsidy price demand supply emissions jobs industry "
+         "research innovation risk safety waste climate transition investment consumers regulation reactor wind cost").split()
+
+def sentences(rng: random.Random, count: int) -> str:
+    return " ".join(" ".join(rng.choice(words) for _ in range(rng.randint(8, 16))).capitalize() + "." for _ in range(count))
+
+class StubBedrockAgentRuntime:
+    # roles: {agentId: "speaker" | "ssml" | "stop" | "abstract"}; the Stop agent starts
+    # answering true from turn `stop_from` (counted per session)
+    def __init__(self, roles: dict, ttfc: Latency, chunk_interval: Latency, retrieve: Latency, chunk_chars: int = 40,
+                 sentences_per_answer: int = 5, throttle_rate: float = 0.0, invalid_ssml_rate: float = 0.0, stop_from: int = 6, rng: random.Random = None):
+        self.roles = roles
+        self.ttfc = ttfc
+        self.chunk_interval = chunk_interval
+        self.retrieve_latency = retrieve
+        self.chunk_chars = chunk_chars
+        self.sentences_per_answer = sentences_per_answer
+        self.throttle_rate = throttle_rate
+        self.invalid_ssml_rate = invalid_ssml_rate
+        self.stop_from = stop_from
+        self.rng = rng or random.Random()
+        self.lock = threading.Lock()
+        self.requests = {}
+        self.stop_calls = {}
+
+    def _count(self, operation: str):
+        with self.lock:
+            self.requests[operation] = self.requests.get(operation, 0) + 1
+
+    def reset_counters(self):
+        self.requests = {}
+
+    def _answer(self, role: str, request: dict) -> str:
+        with self.lock:
+            rng = random.Random(self.rng.random())
+        if role == "ssml":
+            text = request["inputText"]
+            if rng.random() < self.invalid_ssml_rate:
+                return f"<speak><prosody rate=\"fast\">{text}</speak>"
+            return f"<speak>{text}</speak>"
+        if role == "stop":
+            with self.lock:
+                calls = self.stop_calls[request["sessionId"]] = self.stop_calls.get(request["sessionId"], 0) + 1
+            stop = calls + 2 >= self.stop_from
+            return f"<STOP>{'true' if stop else 'false'}</STOP><reasoning>{sentences(rng, 1)}</reasoning>"
+        if role == "abstract":
+            return sentences(rng, 1)
+        return sentences(rng, self.sentences_per_answer)
+
+    def _completion(self, answer: str, trace: bool = False):
+        self.ttfc.sleep()
+        if trace:
+            yield {"trace": {"orchestrationTrace": {"modelInvocationInput": {"text": answer[:200], "type": "ORCHESTRATION"}}}}
+        for start in range(0, len(answer), self.chunk_chars):
+            if start:
+                self.chunk_interval.sleep()
+            yield {"chunk": {"bytes": answer[start:start + self.chunk_chars].encode("utf8")}}
+
+    def invoke_agent(self, **request):
+        self._count("InvokeAgent")
+        with self.lock:
+            throttled = self.rng.random() < self.throttle_rate
+        if throttled:
+            raise ClientError("throttlingException", "InvokeAgent")
+        answer = self._answer(self.roles.get(request["agentId"], "speaker"), request)
+        return {"completion": self._completion(answer, request.get("enableTrace", False)), "sessionId": request["sessionId"]}
+
+    def retrieve(self, knowledgeBaseId, retrievalQuery, retrievalConfiguration=None, **kwargs):
+        self._count("Retrieve")
+        self.retrieve_latency.sleep()
+        with self.lock:
+            rng = random.Random(self.rng.random())
+        count = (retrievalConfiguration or {}).get("vectorSearchConfiguration", {}).get("numberOfResults", 5)
+        return {"retrievalResults": [{"content": {"text": sentences(rng, 3)}} for _ in range(count)]}
+
+class StubPolly:
+    # MP3 at 24 kHz / 48 kbit/s (Polly's mp3 default): one 144-byte frame per 24 ms of speech
+    frame = bytes([0xff, 0xf3, 0x64, 0xc4]) + bytes(140)
+    frame_seconds = 576 / 24000
+
+    def __init__(self, latency: Latency, chars_per_second: float = 15.0, seconds_per_char: float = 0.0005):
+        self.latency = latency
+        self.chars_per_second = chars_per_second
+        self.seconds_per_char = seconds_per_char
+        self.requests = 0
+        self.lock = threading.Lock()
+
+    def reset_counters(self):
+        self.requests = 0
+
+    def synthesize_speech(self, Text, OutputFormat, VoiceId, Engine=None, TextType=None, **kwargs):
+        with self.lock:
+            self.requests += 1
+        text = re.sub(r"<[^>]*>", "", Text)
+        self.latency.sleep(extra=self.seconds_per_char * len(text))
+        frames = max(1, round(len(text) / self.chars_per_second / self.frame_seconds))
+        return {"AudioStream": StubBody(self.frame * frames), "ContentType": "audio/mpeg"}
+
+def install(clients: dict):
+    # Replaces boto3 and botocore for everything imported afterwards: boto3.client(name)
+    # returns clients[name] and records the name in boto3.created
+    boto3 = types.ModuleType("boto3")
+    boto3.created = []
+    def client(service_name, *args, **kwargs):
+        boto3.created.append(service_name)
+        return clients[service_name]
+    boto3.client = client
+    s3 = types.ModuleType("boto3.s3")
+    transfer = types.ModuleType("boto3.s3.transfer")
+    transfer.TransferConfig = lambda **kwargs: kwargs
+    s3.transfer = transfer
+    boto3.s3 = s3
+    botocore = types.ModuleType("botocore")
+    config = types.ModuleType("botocore.config")
+    config.Config = lambda **kwargs: kwargs
+    exceptions = types.ModuleType("botocore.exceptions")
+    exceptions.ClientError = ClientError
+    botocore.config = config
+    botocore.exceptions = exceptions
+    sys.modules.update({"boto3": boto3, "boto3.s3": s3, "boto3.s3.transfer": transfer,
+                        "botocore": botocore, "botocore.config": config, "botocore.exceptions": exceptions})
+    return boto3
@@ -0,0 +1,121 @@
+import argparse
+import collections
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+
+lambda_code = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "lambda_code")
+sys.path.insert(0, lambda_code)
+
+# Import-time and cold-start cost of every Lambda handler. Each sample runs in a fresh
+# interpreter, like a new container: it times the handler's module import (the init phase),
+# counts the AWS clients built during it (should be none: aws_clients builds them on first
+# use) and then times building each client the handler holds, as its first invocation would.
+# -X importtime gives the slowest modules pulled in. With --aws stub (default) boto3 is
+# replaced by the in-memory stand-ins, so the numbers cover this repo's own imports; run with
+# --aws real where boto3 is installed to include boto3 and its service models. A handler
+# whose third-party dependency is not installed here (cryptography for the signed cookies)
+# is reported as skipped. Exits 1 when a handler does not import otherwise, its median
+# import exceeds --budget-ms or it builds a client at import.
+#   python benchmarks/bench_cold_start.py --samples 5
+#   python benchmarks/bench_cold_start.py --aws real --budget-ms 800 lambda_function stop
+
+handlers = ("lambda_function", "stop", "conversation_full", "upload", "upload_simple", "start", "start_simple",
+            "play", "agent", "kb-retrieve", "on_off", "cloudfront-signed-cookie")
+importtime_pattern = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|\s*(\S+)")
+
+def child(handler: str, aws: str):
+    # runs in the fresh interpreter: one JSON line on stdout
+    os.environ.setdefault("AWS_REGION", "eu-west-1")
+    os.environ.setdefault("s3_bucket", "ai-conversation-frontend")
+    if aws == "stub":
+        import aws_stub
+        boto3 = aws_stub.install(collections.defaultdict(object))
+    modules_before = len(sys.modules)
+    start = time.perf_counter()
+    try:
+        module = __import__(handler)
+    except ModuleNotFoundError as e:
+        # a missing module of this repo is a failure, a missing package is the environment
+        if e.name is None or os.path.exists(os.path.join(lambda_code, e.name.split(".")[0] + ".py")):
+            raise
+        print(json.dumps({"skipped": f"{e.name} is not installed"}))
+        return
+    import_ms = (time.perf_counter() - start) * 1000
+    if aws == "stub":
+        import_clients = list(boto3.created)
+    else:
+        # real boto3 keeps no record: count what the factory memoized during the import
+        import_clients = [service for service, *_ in getattr(sys.modules.get("aws_clients"), "_clients", {})]
+
+    import aws_clients
+    first_use = {}
+    for name, value in vars(module).items():
+        if isinstance(value, aws_clients.LazyClient):
+            start = time.perf_counter()
+            aws_clients.client(value.service_name, value.region_name, value.profile)
+            first_use[f"{value.service_name}#{value.profile}" if value.profile else value.service_name] = round((time.perf_counter() - start) * 1000, 2)
+    print(json.dumps({"import_ms": import_ms, "modules": len(sys.modules) - modules_before, "import_clients": import_clients, "first_use_ms": first_use}))
+
+def sample(handler: str, aws: str, importtime: bool) -> dict:
+    command = [sys.executable] + (["-X", "importtime"] if importtime else []) + [os.path.abspath(__file__), "--child", handler, "--aws", aws]
+    result = subprocess.run(command, capture_output=True, text=True, cwd=lambda_code)
+    if result.returncode != 0:
+        return {"error": result.stderr.strip().splitlines()[-1] if result.stderr.strip() else f"exit {result.returncode}"}
+    measured = json.loads(result.stdout.strip().splitlines()[-1])
+    if importtime and "skipped" not in measured:
+        # self time per module, microseconds
+        slowest = sorted(((int(own), name.strip()) for own, _, name in importtime_pattern.findall(result.stderr)), reverse=True)
+        measured["slowest"] = [(name, own / 1000) for own, name in slowest[:5]]
+    return measured
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("handlers", nargs="*", default=list(handlers))
+    parser.add_argument("--samples", type=int, default=5, help="fresh interpreters per handler")
+    parser.add_argument("--aws", choices=("stub", "real"), default="stub")
+    parser.add_argument("--budget-ms", type=float, default=50.0, help="median import budget per handler")
+    parser.add_argument("--top", action="store_true", help="list the slowest modules imported by each handler")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        return child(args.child, args.aws)
+
+    failures = []
+    skipped = []
+    print(f"{'handler':<26} | {'import p50':>10} {'max':>8} {'modules':>7} | clients at import | first use ms")
+    for handler in args.handlers:
+        samples = [sample(handler, args.aws, args.top and n == 0) for n in range(args.samples)]
+        errors = [s["error"] for s in samples if "error" in s]
+        if errors:
+            print(f"{handler:<26} | import failed: {errors[0]}")
+            failures.append(f"{handler} does not import")
+            continue
+        if "skipped" in samples[0]:
+            print(f"{handler:<26} | skipped: {samples[0]['skipped']}")
+            skipped.append(handler)
+            continue
+        import_ms = [s["import_ms"] for s in samples]
+        median = statistics.median(import_ms)
+        import_clients = samples[0]["import_clients"]
+        print(f"{handler:<26} | {median:>10.1f} {max(import_ms):>8.1f} {samples[0]['modules']:>7} | {', '.join(import_clients) or '-':<17} | {samples[0]['first_use_ms']}")
+        if args.top:
+            for name, ms in samples[0]["slowest"]:
+                print(f"{'':<26} |   {ms:>8.1f} ms  {name}")
+        if median > args.budget_ms:
+            failures.append(f"{handler} import p50 {median:.1f} ms > {args.budget_ms:g} ms")
+        if import_clients:
+            failures.append(f"{handler} builds {', '.join(import_clients)} at import")
+
+    for failure in failures:
+        print(f"OVER BUDGET: {failure}")
+    if failures:
+        sys.exit(1)
+    print(f"Every handler within {args.budget_ms:g} ms" + (f" ({len(skipped)} skipped: {', '.join(skipped)})" if skipped else ""))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,231 @@
+import argparse
+import json
+import logging
+import os
+import random
+import sys
+import time
+import uuid
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "lambda_code"))
+
+import aws_stub
+from aws_stub import Latency, StubBedrockAgentRuntime, StubPolly
+from dynamodb_stub import StubDynamoDB
+from s3_stub import StubS3
+
+# End-to-end conversation loop, in-process: Speaker -> Validation -> ConversationHistory ->
+# Stop -> Next / Greeting -> ConversationFull -> EndFlag, as step_function.json wires them,
+# calling the real handlers against in-memory Bedrock, Polly, S3 and DynamoDB stand-ins.
+# Agents, ConversationParams and the turn limit are read from the state machine definition.
+# Reports per-stage and per-turn latency percentiles and S3 requests and bytes; with
+# --baseline it exits 1 when a stage's p50 or p95 regresses by more than --threshold and by
+# more than --min-delta-ms (sub-millisecond stages are mostly timer noise), or when S3
+# requests per turn regress by more than --threshold.
+#   python benchmarks/bench_conversation.py --conversations 5 --save-baseline /tmp/baseline.json
+#   python benchmarks/bench_conversation.py --conversations 5 --baseline /tmp/baseline.json
+
+state_machine_path = os.path.join(os.path.dirname(__file__), "..", "step_function.json")
+bucket = "ai-conversation-frontend"
+stages = ("speaker", "history", "stop", "greeting", "conversation_full", "end_flag")
+
+def load_state_machine(path: str) -> tuple:
+    # (agents and ConversationParams from the Variables state, last debate turn)
+    with open(path) as f:
+        states = json.load(f)["States"]
+    variables = states["Variables"]["Assign"]
+    return variables, int(variables["MaxTurn"])
+
+def resolve(value, UUID: str):
+    # the only JSONata expression in the Variables state is the execution name
+    if isinstance(value, dict):
+        return {k: resolve(v, UUID) for k, v in value.items()}
+    if value == "{% $states.context.Execution.Name %}":
+        return UUID
+    return value
+
+def new_services(args, rng: random.Random, roles: dict) -> dict:
+    scale = args.time_scale
+    return {
+        "s3": StubS3(latency=args.s3_latency * scale),
+        "bedrock-agent-runtime": StubBedrockAgentRuntime(
+            roles,
+            ttfc=Latency(args.agent_ttfc, time_scale=scale, rng=rng),
+            chunk_interval=Latency(args.agent_chunk_interval, time_scale=scale, rng=rng),
+            retrieve=Latency(args.retrieve_latency, time_scale=scale, rng=rng),
+            chunk_chars=args.chunk_chars,
+            sentences_per_answer=args.sentences,
+            throttle_rate=args.throttle_rate,
+            invalid_ssml_rate=args.invalid_ssml_rate,
+            stop_from=args.stop_from,
+            rng=rng
+        ),
+        "polly": StubPolly(Latency(args.polly_latency, time_scale=scale, rng=rng)),
+        "dynamodb": StubDynamoDB({"ai-conversation-catalog": ("id", None, {"random-index": ("shard", "rand")})}, latency=args.dynamodb_latency * scale)
+    }
+
+def import_handlers():
+    import conversation_full
+    import lambda_function
+    import stop
+    import transcript
+    return {"speaker": lambda_function, "history": conversation_full, "stop": stop, "transcript": transcript}
+
+class Recorder:
+    def __init__(self):
+        self.stages = {stage: [] for stage in stages}
+        self.turns = []
+
+    def timed(self, stage: str, fn, *args):
+        start = time.perf_counter()
+        result = fn(*args)
+        elapsed = time.perf_counter() - start
+        self.stages[stage].append(elapsed)
+        return result, elapsed
+
+def run_conversation(handlers: dict, variables: dict, max_turn: int, topic: str, recorder: Recorder, s3) -> int:
+    # Returns the number of turns spoken
+    UUID = str(uuid.uuid4())
+    conversation_params = resolve(variables["ConversationParams"], UUID)
+    speaker_handler = handlers["speaker"].lambda_handler
+    handlers["transcript"].append_turn(s3, bucket, UUID, handlers["transcript"].topic_turn, "Topic", topic)
+
+    speaker, speaker_input, turn = variables["Speaker1"], topic, 0
+    while True:
+        # Speaker -> Validation (Retry keeps speaker and turn)
+        next_speaker = None if turn >= max_turn else variables["Speaker2"] if "Speaker1" in speaker["name"] else variables["Speaker1"]
+        payload = {"Speaker": speaker, "NextSpeaker": next_speaker,
+                   "Ssml": variables["Ssml"], "Abstract": variables["Abstract"], "ConversationParams": conversation_params,
+                   "Input": speaker_input, "Turn": turn, "UUID": UUID}
+        response, speaker_seconds = recorder.timed("speaker", speaker_handler, payload, None)
+        if not response["validation"]:
+            speaker_input = f"SSML error: {response['response_error']} Generate a new response from scratch that continues the discussion based on this topic: {topic}"
+            continue
+
+        history, history_seconds = recorder.timed("history", handlers["history"].lambda_handler, {"UUID": UUID}, None)
+        stop_response, stop_seconds = recorder.timed("stop", handlers["stop"].lambda_handler, {
+            "Stop": variables["Stop"], "ConversationParams": conversation_params, "Turn": turn, "UUID": UUID, "ConversationHistory": history
+        }, None)
+        recorder.turns.append(speaker_seconds + history_seconds + stop_seconds)
+        if stop_response["stop"] or turn >= max_turn:
+            break
+        point_of_view = "optimistic" if "Speaker1" in speaker["name"] else "skeptical"
+        speaker_input = f"Based on the history of the conversation, continue the discussion providing your {point_of_view} point of view: {response['response_text']}"
+        speaker = variables["Speaker2"] if "Speaker1" in speaker["name"] else variables["Speaker1"]
+        turn += 1
+
+    # GreetingVariables -> NextGreeting -> Greeting? -> Greeting ... -> ConversationFull -> EndFlag
+    greeting_count = turn + 2
+    while True:
+        speaker = variables["Greeting1"] if "Speaker1" in speaker["name"] or "Greeting2" in speaker["name"] else variables["Greeting2"]
+        speaker_input = response["response_text"] + stop_response["reasoning"]
+        turn += 1
+        if turn > greeting_count:
+            break
+        payload = {"Speaker": speaker, "Ssml": variables["Ssml"], "ConversationParams": conversation_params, "Input": speaker_input, "Turn": turn, "UUID": UUID}
+        response, _ = recorder.timed("greeting", speaker_handler, payload, None)
+
+    recorder.timed("conversation_full", handlers["history"].lambda_handler, {"UUID": UUID, "CreatedAt": "2025-01-01T00:00:00Z", "Finalize": True}, None)
+    # EndFlag is an aws-sdk:s3:putObject step
+    recorder.timed("end_flag", lambda: s3.put_object(Body=b"", Bucket=bucket, Key=f"outputs/{UUID}/end"))
+    return turn
+
+def percentile(values: list, q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))] if values else 0.0
+
+def summarize(recorder: Recorder, s3, turns: int) -> dict:
+    summary = {"stages": {}, "turn": {}, "s3": {}}
+    for stage, values in list(recorder.stages.items()) + [("turn", recorder.turns)]:
+        if values:
+            stats = {"count": len(values), "p50_ms": percentile(values, 0.5) * 1000, "p95_ms": percentile(values, 0.95) * 1000, "max_ms": max(values) * 1000}
+            if stage == "turn":
+                summary["turn"] = stats
+            else:
+                summary["stages"][stage] = stats
+    summary["s3"] = {
+        "requests": dict(sorted(s3.requests.items())),
+        "requests_per_turn": s3.request_count() / max(1, turns),
+        "bytes_in": s3.bytes_in,
+        "bytes_out": s3.bytes_out
+    }
+    return summary
+
+def regressions(summary: dict, baseline: dict, threshold: float, min_delta_ms: float) -> list:
+    found = []
+    for stage, stats in list(summary["stages"].items()) + [("turn", summary["turn"])]:
+        reference = baseline["turn"] if stage == "turn" else baseline["stages"].get(stage)
+        if not reference:
+            continue
+        for metric in ("p50_ms", "p95_ms"):
+            if stats[metric] > reference[metric] * (1 + threshold) and stats[metric] - reference[metric] > min_delta_ms:
+                found.append(f"{stage} {metric} {stats[metric]:.1f} > {reference[metric]:.1f} (+{threshold:.0%}, +{min_delta_ms:g} ms)")
+    if summary["s3"]["requests_per_turn"] > baseline["s3"]["requests_per_turn"] * (1 + threshold):
+        found.append(f"S3 requests/turn {summary['s3']['requests_per_turn']:.1f} > {baseline['s3']['requests_per_turn']:.1f} (+{threshold:.0%})")
+    return found
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--conversations", type=int, default=3)
+    parser.add_argument("--time-scale", type=float, default=0.05, help="multiplier applied to every stand-in latency")
+    parser.add_argument("--agent-ttfc", type=float, default=1.5, help="median seconds to the first agent chunk")
+    parser.add_argument("--agent-chunk-interval", type=float, default=0.05, help="median seconds between agent chunks")
+    parser.add_argument("--chunk-chars", type=int, default=40)
+    parser.add_argument("--sentences", type=int, default=5, help="sentences per speaker answer")
+    parser.add_argument("--retrieve-latency", type=float, default=0.4)
+    parser.add_argument("--polly-latency", type=float, default=0.3, help="median seconds per synthesize_speech, plus a per-character cost")
+    parser.add_argument("--s3-latency", type=float, default=0.02)
+    parser.add_argument("--dynamodb-latency", type=float, default=0.01)
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="probability that an invoke_agent call is throttled")
+    parser.add_argument("--invalid-ssml-rate", type=float, default=0.0, help="probability that the Ssml agent returns invalid SSML")
+    parser.add_argument("--stop-from", type=int, default=6, help="turn from which the Stop agent answers true")
+    parser.add_argument("--state-machine", default=state_machine_path)
+    parser.add_argument("--seed", type=int, default=11)
+    parser.add_argument("--baseline", help="summary JSON to compare against")
+    parser.add_argument("--save-baseline", help="write this run's summary JSON here")
+    parser.add_argument("--threshold", type=float, default=0.25, help="allowed relative regression")
+    parser.add_argument("--min-delta-ms", type=float, default=2.0, help="allowed absolute latency regression")
+    parser.add_argument("--verbose", action="store_true", help="keep the handlers' logging and EMF metric lines")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    variables, max_turn = load_state_machine(args.state_machine)
+    roles = {variables[name]["agentId"]: role for name, role in (("Ssml", "ssml"), ("Stop", "stop"), ("Abstract", "abstract"))}
+    services = new_services(args, rng, roles)
+    aws_stub.install(services)
+    os.environ.setdefault("s3_bucket", bucket)
+    # the handlers' EMF lines would bury the report: metrics are off unless --verbose
+    os.environ["metrics_enabled"] = "true" if args.verbose else "false"
+    handlers = import_handlers()
+    if not args.verbose:
+        logging.disable(logging.CRITICAL)
+
+    recorder = Recorder()
+    turns = 0
+    start = time.perf_counter()
+    for n in range(args.conversations):
+        turns += run_conversation(handlers, variables, max_turn, f"Benchmark topic {n}: should Europe double its nuclear investment?", recorder, services["s3"])
+    elapsed = time.perf_counter() - start
+
+    summary = summarize(recorder, services["s3"], turns)
+    print(f"{args.conversations} conversations, {turns} turns in {elapsed:.2f}s (time scale {args.time_scale})")
+    print(f"{'stage':<20} | {'count':>5} {'p50 ms':>8} {'p95 ms':>8} {'max ms':>8}")
+    for stage, stats in list(summary["stages"].items()) + [("turn (spk+hist+stop)", summary["turn"])]:
+        print(f"{stage:<20} | {stats['count']:>5} {stats['p50_ms']:>8.1f} {stats['p95_ms']:>8.1f} {stats['max_ms']:>8.1f}")
+    print(f"S3: {summary['s3']['requests_per_turn']:.1f} requests/turn, {summary['s3']['bytes_in']} bytes in, {summary['s3']['bytes_out']} bytes out, {summary['s3']['requests']}")
+    print(f"Bedrock: {services['bedrock-agent-runtime'].requests}, Polly: {services['polly'].requests} requests")
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump(summary, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            found = regressions(summary, json.load(f), args.threshold, args.min_delta_ms)
+        for regression in found:
+            print(f"REGRESSION: {regression}")
+        if found:
+            sys.exit(1)
+        print(f"No regression beyond {args.threshold:.0%} and {args.min_delta_ms:g} ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+import argparse
+import http.client
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "lambda_code"))
+
+import elevenlabs
+from elevenlabs_stub import StubElevenLabs
+
+# Fresh connection per call (the previous synthesize()) vs the pooled keep-alive
+# client, against a local ElevenLabs stand-in. Also checks retry on 429/5xx.
+# The stand-in speaks plain HTTP, so the saving shown is the TCP connect only;
+# against api.elevenlabs.io each fresh connection also pays a TLS handshake.
+#   python benchmarks/bench_elevenlabs.py --calls 50
+
+def fresh_connection_call(port: int):
+    conn = http.client.HTTPConnection("127.0.0.1", port)
+    conn.request("POST", "/v1/text-to-speech/voice/stream?output_format=mp3_44100_128", json.dumps({"text": "hi"}), {'Content-Type': 'application/json'})
+    data = conn.getresponse().read()  # previous behaviour: whole body buffered
+    conn.close()
+    return len(data)
+
+def pooled_call(client):
+    with client.text_to_speech("voice", "hi", "eleven_multilingual_v2", "mp3_44100_128") as res:
+        total = 0
+        while True:
+            chunk = res.read(8192)
+            if not chunk:
+                return total
+            total += len(chunk)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", type=int, default=50)
+    parser.add_argument("--audio-bytes", type=int, default=64 * 1024)
+    args = parser.parse_args()
+
+    with StubElevenLabs(audio_bytes=args.audio_bytes) as stub:
+        start = time.perf_counter()
+        for _ in range(args.calls):
+            fresh_connection_call(stub.port)
+        fresh = time.perf_counter() - start
+        fresh_connections = stub.connections
+
+        client = elevenlabs.ElevenLabsClient(host="127.0.0.1", port=stub.port, use_tls=False)
+        stub.connections = 0
+        start = time.perf_counter()
+        for _ in range(args.calls):
+            assert pooled_call(client) == args.audio_bytes
+        pooled = time.perf_counter() - start
+        print(f"fresh connection: {fresh / args.calls * 1000:.2f} ms/call, {fresh_connections} connections")
+        print(f"pooled keep-alive: {pooled / args.calls * 1000:.2f} ms/call, {stub.connections} connections {client.stats}")
+
+    with StubElevenLabs(fail_with=[429, 503]) as stub:
+        client = elevenlabs.ElevenLabsClient(host="127.0.0.1", port=stub.port, use_tls=False, backoff_seconds=0.01)
+        assert pooled_call(client) > 0
+        print(f"retry on 429/503: {stub.requests} requests, {client.stats}")
+
+if __name__ == "__main__":
+    main()
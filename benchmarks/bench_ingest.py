@@ -0,0 +1,82 @@
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "lambda_code"))
+
+import ingest
+from s3_stub import StubS3
+
+# Topic ingestion cost (requests and time for an uploaded file of --topics lines) against an
+# in-memory S3 stand-in whose ETags are content MD5s, as on real S3, plus the checkpoint
+# behaviour the upload handlers rely on. Exits 1 if:
+#   - a redelivered event (same sequencer) is processed twice
+#   - a re-put of the same bytes (new sequencer, same ETag: start_simple's topic recycling)
+#     is not processed again
+#   - an interrupted ingestion does not resume where it stopped
+#   python benchmarks/bench_ingest.py --topics 5000 --latency 0.005
+
+bucket = "bench"
+source_key = "uploads/topics.txt"
+prefix = "inputs/"
+
+def ingest_file(s3_client, sequencer: str, max_batches: int = None) -> dict:
+    # upload_simple's loop; stops early after max_batches as a timed-out invocation would
+    checkpoint = ingest.open_source(s3_client, bucket, source_key, sequencer)
+    if checkpoint["done"]:
+        return checkpoint
+    index = ingest.load_index(s3_client, bucket, prefix)
+    for n, batch in enumerate(ingest.iter_batches(s3_client, bucket, source_key, checkpoint, lambda topic_hash: f"{prefix}{topic_hash}.txt" in index)):
+        ingest.write_topics(s3_client, bucket, prefix, batch["topics"])
+        ingest.commit_batch(s3_client, bucket, source_key, checkpoint, batch)
+        if max_batches is not None and n + 1 >= max_batches:
+            return checkpoint
+    ingest.finish(s3_client, bucket, source_key, checkpoint)
+    return checkpoint
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--topics", type=int, default=2000)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds per S3 request")
+    args = parser.parse_args()
+
+    s3_client = StubS3(latency=args.latency, content_etags=True)
+    body = "".join(f"Debate topic number {n}: is it worth it?\n" for n in range(args.topics)).encode("utf-8")
+    failures = []
+
+    s3_client.put_object(Bucket=bucket, Key=source_key, Body=body)
+    s3_client.reset_counters()
+    start = time.perf_counter()
+    first = ingest_file(s3_client, "0001")
+    print(f"ingest: {args.topics} topics in {time.perf_counter() - start:.2f}s, {s3_client.request_count()} S3 requests {dict(sorted(s3_client.requests.items()))}")
+    if first["written"] != args.topics:
+        failures.append(f"first ingestion wrote {first['written']} of {args.topics} topics")
+
+    # the same event delivered again: nothing to do
+    if not ingest_file(s3_client, "0001")["done"]:
+        failures.append("a redelivered event was processed again")
+
+    # same bytes put again (same ETag), new event: processed again, every topic already exists
+    s3_client.put_object(Bucket=bucket, Key=source_key, Body=body)
+    again = ingest_file(s3_client, "0002")
+    if again["line"] != args.topics or again["skipped"] != args.topics:
+        failures.append(f"a re-put of the same bytes was not processed again ({again['skipped']} of {args.topics} topics seen)")
+
+    # interrupted after one batch, resumed by the re-invocation with the same event
+    for n in range(args.topics):
+        s3_client.objects.pop(f"{prefix}{ingest.content_hash(f'Debate topic number {n}: is it worth it?')}.txt", None)
+    s3_client.put_object(Bucket=bucket, Key=source_key, Body=body)
+    partial = ingest_file(s3_client, "0003", max_batches=1)
+    resumed = ingest_file(s3_client, "0003")
+    if partial["done"] or not resumed["done"] or resumed["written"] != args.topics:
+        failures.append(f"interrupted ingestion not resumed (done after one batch: {partial['done']}, then {resumed['written']} of {args.topics} topics written)")
+
+    for failure in failures:
+        print(f"FAILED: {failure}")
+    if failures:
+        sys.exit(1)
+    print("checkpoints: redelivery skipped, re-put reprocessed, interrupted run resumed")
+
+if __name__ == "__main__":
+    main()
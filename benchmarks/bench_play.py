@@ -0,0 +1,72 @@
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "lambda_code"))
+
+import play_index
+from dynamodb_stub import StubDynamoDB
+
+# Replay pick cost as a function of archive size, against an in-memory DynamoDB
+# stand-in with a fixed per-request latency: the previous full-scan pick (one page,
+# as it was, and fully paginated, as it should have been) vs the random-sampling index.
+#   python benchmarks/bench_play.py --latency 0.002 --sizes 10000 100000 --picks 20
+
+table = "ai-conversation-play"
+
+def new_client(latency):
+    return StubDynamoDB({table: ("id", None, {play_index.random_index: ("shard", "rand")})}, latency=latency)
+
+def populate(client, size):
+    for n in range(size):
+        client.tables[table].put(play_index.play_item(f"conversation-{n:06d}"))
+
+def legacy_pick(client, paginate):
+    # The previous get_random_id_and_delete: scan the ids, choose one, delete it
+    items = []
+    scan_kwargs = {"TableName": table, "ProjectionExpression": "id"}
+    while True:
+        response = client.scan(**scan_kwargs)
+        items.extend(response.get("Items", []))
+        if not paginate or "LastEvaluatedKey" not in response:
+            break
+        scan_kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+    chosen_id = random.choice(items)["id"]["S"]
+    client.delete_item(TableName=table, Key={"id": {"S": chosen_id}})
+    return chosen_id, len(items)
+
+def indexed_pick(client):
+    return play_index.claim_random_id(client, table), None
+
+def measure(pick, client, picks):
+    client.reset_counters()
+    reachable = 0
+    start = time.perf_counter()
+    for _ in range(picks):
+        _, seen = pick(client)
+        reachable = max(reachable, seen or 0)
+    elapsed = (time.perf_counter() - start) / picks
+    return elapsed, client.request_count() / picks, client.items_read / picks, reachable
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--latency", type=float, default=0.002, help="seconds per DynamoDB request")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--picks", type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"{'size':>7} | {'pick':<16} | {'ms/pick':>8} {'reqs/pick':>9} {'items read':>10} | candidates")
+    for size in args.sizes:
+        for name, pick in (("scan, one page", lambda client: legacy_pick(client, False)),
+                           ("scan, paginated", lambda client: legacy_pick(client, True)),
+                           ("random index", indexed_pick)):
+            client = new_client(args.latency)
+            populate(client, size)
+            elapsed, requests, items_read, reachable = measure(pick, client, args.picks)
+            candidates = f"{reachable} of {size}" if reachable else f"{size} of {size}"
+            print(f"{size:>7} | {name:<16} | {elapsed * 1000:>8.2f} {requests:>9.1f} {items_read:>10.0f} | {candidates}")
+
+if __name__ == "__main__":
+    main()
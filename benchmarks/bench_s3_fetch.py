@@ -0,0 +1,58 @@
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "lambda_code"))
+
+import s3_fetch
+from s3_stub import StubS3
+
+# Transcript fetch latency as a function of turn count, against an in-memory
+# S3 stand-in with a fixed per-request latency.
+#   python benchmarks/bench_s3_fetch.py --latency 0.01 --turns 10 100 1000 2000
+
+bucket = "bench"
+folder = "outputs/bench-conversation"
+
+def legacy_fetch(s3_client):
+    # The previous get_conversation_history: one unpaginated listing, sequential GETs
+    contents = []
+    response = s3_client.list_objects_v2(Bucket=bucket, Prefix=folder)
+    for obj in response.get('Contents', []):
+        if obj['Key'].endswith('.txt'):
+            contents.append(s3_client.get_object(Bucket=bucket, Key=obj['Key'])['Body'].read().decode('utf-8'))
+    return contents
+
+def shared_fetch(s3_client, workers):
+    _, contents = s3_fetch.fetch_transcripts(s3_client, bucket, f"{folder}/", workers=workers)
+    return contents
+
+def populate(s3_client, turns):
+    for turn in range(turns):
+        s3_client._store(f"{folder}/{turn}.txt", f"<speak>Turn {turn} of the debate.</speak>".encode('utf-8'))
+        s3_client._store(f"{folder}/{turn}.mp3", b"\xff\xfb" * 64)
+
+def measure(fetch, s3_client):
+    s3_client.reset_counters()
+    start = time.perf_counter()
+    contents = fetch(s3_client)
+    return time.perf_counter() - start, len(contents), s3_client.request_count()
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--latency", type=float, default=0.005, help="seconds per S3 request")
+    parser.add_argument("--workers", type=int, default=s3_fetch.max_workers)
+    parser.add_argument("--turns", type=int, nargs="+", default=[10, 50, 200, 1000, 2000])
+    args = parser.parse_args()
+
+    print(f"{'turns':>6} | {'legacy s':>9} {'fetched':>8} {'reqs':>6} | {'shared s':>9} {'fetched':>8} {'reqs':>6} | speedup")
+    for turns in args.turns:
+        s3_client = StubS3(latency=args.latency)
+        populate(s3_client, turns)
+        legacy = measure(legacy_fetch, s3_client)
+        shared = measure(lambda client: shared_fetch(client, args.workers), s3_client)
+        print(f"{turns:>6} | {legacy[0]:>9.3f} {legacy[1]:>8} {legacy[2]:>6} | {shared[0]:>9.3f} {shared[1]:>8} {shared[2]:>6} | {legacy[0] / shared[0]:>6.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+import argparse
+import json
+import os
+import re
+import sys
+import time
+from xml.etree import ElementTree as ET
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "lambda_code"))
+
+import ssml
+
+# Validator cost per turn over a corpus of agent outputs (one JSON object per line with
+# a "response_text" field), comparing the shared single-pass validator with the previous
+# tree-walking one. Fails if the two ever disagree on validity or error messages.
+#   python benchmarks/bench_ssml.py --corpus benchmarks/ssml_corpus.jsonl --repeat 500
+
+def legacy_extract_speak_content(input_text):
+    match = re.search(r"<speak>(.*?)</speak>", input_text, re.DOTALL)
+    if match:
+        return f"<speak>{match.group(1).strip()}</speak>"
+    return None
+
+def legacy_validate_ssml(ssml_text):
+    # Verbatim copy of the validator previously duplicated in the Lambdas
+    error_messages = []
+
+    try:
+        tree = ET.ElementTree(ET.fromstring(ssml_text))
+        root = tree.getroot()
+    except ET.ParseError:
+        error_messages.append("Invalid XML structure.")
+        return False, error_messages
+
+    if root.tag != "speak":
+        error_messages.append("<speak> and </speak> tags must wrap all text.")
+        return False, error_messages
+
+    def validate_prosody_attributes(attributes):
+        valid_attributes = {"volume", "rate"}
+        valid_volume = {"silent", "x-soft", "soft", "medium", "loud", "x-loud"}
+        valid_rate = {"x-slow", "slow", "medium", "fast", "x-fast"}
+
+        for attr_name in attributes.keys():
+            if attr_name not in valid_attributes:
+                error_messages.append(f"Invalid attribute '{attr_name}' in <prosody>. Only 'rate' and 'volume' are allowed.")
+
+        has_rate = "rate" in attributes
+        has_volume = "volume" in attributes
+
+        if not has_rate and not has_volume:
+            error_messages.append("<prosody> must have at least one attribute: 'rate' or 'volume'.")
+            return
+
+        if "volume" in attributes:
+            attr_value = attributes["volume"]
+            if not (attr_value in valid_volume or re.match(r"^[+-]\d+dB$", attr_value)):
+                error_messages.append(f"Invalid volume value: {attr_value}")
+
+        if "rate" in attributes:
+            attr_value = attributes["rate"]
+            if not (attr_value in valid_rate or re.match(r"^\d+%$", attr_value)):
+                error_messages.append(f"Invalid rate value: {attr_value}")
+
+    def validate_break_structure(elem):
+        if elem.text is not None or len(elem) > 0:
+            error_messages.append("<break> must be a self-closing tag.")
+            return
+
+        attributes = elem.attrib
+        if "time" in attributes:
+            if not re.match(r"^\d+(ms|s)$", attributes["time"]):
+                error_messages.append(f"Invalid time value in <break>: {attributes['time']}")
+        else:
+            error_messages.append("Missing required 'time' attribute in <break>.")
+
+    for elem in tree.iter():
+        if elem.tag == "p":
+            if elem.text is None and len(elem) == 0:
+                error_messages.append("<p> element must not be empty.")
+        if elem.tag == "prosody":
+            validate_prosody_attributes(elem.attrib)
+        if elem.tag == "break":
+            validate_break_structure(elem)
+
+    is_valid = len(error_messages) == 0
+    return is_valid, error_messages
+
+def load_corpus(path):
+    with open(path, encoding='utf-8') as f:
+        return [json.loads(line)["response_text"] for line in f if line.strip()]
+
+def run(extract, validate, corpus, repeat, rounds=5):
+    # best of several rounds: the minimum is the least disturbed by other load on the host
+    best = None
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            for response_text in corpus:
+                validate(str(extract(response_text)))
+        elapsed = (time.perf_counter() - start) / (repeat * len(corpus))
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--corpus", default=os.path.join(os.path.dirname(__file__), "ssml_corpus.jsonl"))
+    parser.add_argument("--repeat", type=int, default=500)
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.corpus)
+    mismatches = 0
+    for response_text in corpus:
+        speak_text = str(legacy_extract_speak_content(response_text))
+        expected = legacy_validate_ssml(speak_text)
+        actual = ssml.validate_ssml(str(ssml.extract_speak_content(response_text)))
+        if expected != actual:
+            mismatches += 1
+            print(f"MISMATCH {speak_text[:60]!r}: legacy={expected} shared={actual}")
+
+    legacy = run(legacy_extract_speak_content, legacy_validate_ssml, corpus, args.repeat)
+    shared = run(ssml.extract_speak_content, ssml.validate_ssml, corpus, args.repeat)
+    invalid = sum(1 for response_text in corpus if not ssml.validate_ssml(str(ssml.extract_speak_content(response_text)))[0])
+    print(f"corpus: {len(corpus)} agent outputs ({invalid} invalid)")
+    print(f"legacy validator: {legacy * 1e6:8.1f} us/turn")
+    print(f"shared validator: {shared * 1e6:8.1f} us/turn ({legacy / shared:.2f}x)")
+    if mismatches:
+        sys.exit(f"{mismatches} outputs validated differently")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+import argparse
+import os
+import random
+import re
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "lambda_code"))
+
+import stop_context
+import transcript
+from s3_stub import StubS3
+
+# Stop context per turn, full history vs rolling summary + last K turns, over synthetic
+# debates. The Stop agent is replaced by a stand-in whose latency grows with the prompt
+# (base + per-token cost, the shape of a model prefill) and whose verdict only uses what is
+# in its context: stop on closing remarks in the last turn, or when the last turn repeats
+# an argument it can still see. Agreement between the modes is reported per turn.
+#   python benchmarks/bench_stop_context.py --turns 40 --conversations 20 --recent 4 --budget 2000
+
+bucket = "ai-conversation"
+word_pattern = re.compile(r"[a-z']+")
+syllables = "ba ce di fo gu ka le mi no pu ra se ti vo zu".split()
+vocabulary = sorted({a + b + c for a in syllables for b in syllables for c in syllables[:4]})
+closings = ("To conclude, I think we have covered the ground.", "In closing, we clearly agree on the essentials.")
+
+def sentence(rng):
+    return " ".join(rng.choice(vocabulary) for _ in range(rng.randint(8, 18))).capitalize() + "."
+
+def conversation(rng, turns):
+    # Speakers argue new points, sometimes restate an earlier one, and close near the end
+    history = ["Should Europe double its investment in nuclear energy?"]
+    for turn in range(turns):
+        if turn > 4 and rng.random() < 0.1:
+            history.append(rng.choice(history[1:]))
+        else:
+            history.append(" ".join(sentence(rng) for _ in range(rng.randint(4, 9))))
+        if turn >= turns - 2:
+            history[-1] += " " + rng.choice(closings)
+    return history
+
+def words(text):
+    return set(word_pattern.findall(text.lower()))
+
+def stand_in_stop(context, base, per_token):
+    time.sleep(base + per_token * stop_context.estimate_tokens(context))
+    sections = stop_context.split_history(context[len("<conversation_history>"):-len("</conversation_history>")])
+    last = sections[-1]
+    if any(closing in last for closing in closings):
+        return True
+    # a restated claim (the lead of the last turn) only counts if the earlier copy is
+    # visible, verbatim or as a summary line
+    claim = words(stop_context.summarize_turn(last))
+    visible = [line for section in sections[1:-1] for line in section.splitlines()]
+    return any(len(claim & words(line)) / max(1, len(claim)) > 0.9 for line in visible)
+
+def evaluate(history, mode, s3, UUID, args):
+    decisions, latencies, tokens = [], [], []
+    for turn in range(3, len(history)):
+        full_conversation = "".join(text + transcript.separator for text in history[:turn + 1])
+        start = time.perf_counter()
+        if mode == "incremental":
+            full_conversation = stop_context.bounded_history(s3, bucket, UUID, full_conversation, args.recent, args.budget)
+        context = f"<conversation_history>{full_conversation}</conversation_history>"
+        decisions.append(stand_in_stop(context, args.base, args.per_token))
+        latencies.append(time.perf_counter() - start)
+        tokens.append(stop_context.estimate_tokens(context))
+    return decisions, latencies, tokens
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--turns", type=int, default=40)
+    parser.add_argument("--conversations", type=int, default=20)
+    parser.add_argument("--recent", type=int, default=stop_context.default_recent_turns, help="K turns sent verbatim")
+    parser.add_argument("--budget", type=int, default=stop_context.default_token_budget, help="token budget of the incremental context")
+    parser.add_argument("--base", type=float, default=0.002, help="stand-in Stop agent seconds per call")
+    parser.add_argument("--per-token", type=float, default=0.000002, help="stand-in Stop agent seconds per prompt token")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds per S3 request")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    s3 = StubS3(latency=args.latency)
+    results = {"full": ([], [], []), "incremental": ([], [], [])}
+    for n in range(args.conversations):
+        history = conversation(rng, args.turns)
+        for mode, (decisions, latencies, tokens) in results.items():
+            d, l, t = evaluate(history, mode, s3, f"conversation-{n}", args)
+            decisions.append(d)
+            latencies.extend(l)
+            tokens.extend(t)
+
+    print(f"{'mode':<12} | {'tokens/call':>11} {'max tokens':>10} {'tokens/conv':>11} | {'ms p50':>7} {'ms p95':>7}")
+    for mode, (_, latencies, tokens) in results.items():
+        latencies = sorted(latencies)
+        print(f"{mode:<12} | {statistics.mean(tokens):>11.0f} {max(tokens):>10} {sum(tokens) / args.conversations:>11.0f} | "
+              f"{latencies[len(latencies) // 2] * 1000:>7.2f} {latencies[int(len(latencies) * 0.95)] * 1000:>7.2f}")
+
+    full, incremental = results["full"][0], results["incremental"][0]
+    agree = sum(a == b for f, i in zip(full, incremental) for a, b in zip(f, i))
+    calls = sum(len(f) for f in full)
+    first_stop = lambda decisions: [d.index(True) if True in d else None for d in decisions]
+    same_first = sum(a == b for a, b in zip(first_stop(full), first_stop(incremental)))
+    print(f"decisions agree on {agree}/{calls} calls, first stop turn matches in {same_first}/{args.conversations} conversations")
+    print(f"summary requests: {s3.requests}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,253 @@
+import bisect
+import json
+import re
+import threading
+import time
+
+# In-memory stand-in for the subset of the boto3 DynamoDB client used by lambda_code.
+# Items keep the typed attribute format ({"S": ...}, {"N": ...}); each partition is a
+# sorted list so Query costs what it would on the service: a seek plus the page read,
+# while Scan reads items in 1 MB pages. Global secondary indexes are kept in sync on every
+# write and may be sparse. Only the expression shapes lambda_code issues are understood.
+
+class ClientError(Exception):
+    def __init__(self, code: str, operation: str):
+        super().__init__(f"An error occurred ({code}) when calling the {operation} operation")
+        self.response = {"Error": {"Code": code}}
+
+key_clause_pattern = re.compile(r"^\s*(#?\w+)\s*(=|<=|>=|<|>)\s*(:\w+)\s*$")
+exists_pattern = re.compile(r"^\s*attribute_(not_)?exists\((#?\w+)\)\s*$")
+equals_pattern = re.compile(r"^\s*(#?\w+)\s*=\s*(:\w+)\s*$")
+set_pattern = re.compile(r"^\s*SET\s+(.*)$")
+scan_page_bytes = 1024 * 1024
+
+def value_of(attribute: dict):
+    if "N" in attribute:
+        return float(attribute["N"])
+    return next(iter(attribute.values()))
+
+class Partitions:
+    # {partition value: (sorted sort values, items)}; sort values may repeat in an index
+    def __init__(self, partition_key: str, sort_key: str = None):
+        self.partition_key = partition_key
+        self.sort_key = sort_key
+        self.partitions = {}
+
+    def keys_of(self, item: dict):
+        if self.partition_key not in item or (self.sort_key and self.sort_key not in item):
+            return None
+        return value_of(item[self.partition_key]), value_of(item[self.sort_key]) if self.sort_key else ""
+
+    def find(self, item: dict, primary_key):
+        # position of item among entries with the same sort value, -1 if absent
+        keys = self.keys_of(item)
+        if keys is None or keys[0] not in self.partitions:
+            return None, -1
+        sort_values, items = self.partitions[keys[0]]
+        position = bisect.bisect_left(sort_values, keys[1])
+        while position < len(sort_values) and sort_values[position] == keys[1]:
+            if primary_key(items[position]) == primary_key(item):
+                return self.partitions[keys[0]], position
+            position += 1
+        return None, -1
+
+    def insert(self, item: dict):
+        keys = self.keys_of(item)
+        if keys is None:
+            return
+        sort_values, items = self.partitions.setdefault(keys[0], ([], []))
+        position = bisect.bisect_right(sort_values, keys[1])
+        sort_values.insert(position, keys[1])
+        items.insert(position, item)
+
+    def remove(self, item: dict, primary_key):
+        partition, position = self.find(item, primary_key)
+        if partition is not None:
+            del partition[0][position]
+            del partition[1][position]
+
+class Table(Partitions):
+    def __init__(self, partition_key: str, sort_key: str = None, indexes: dict = None):
+        super().__init__(partition_key, sort_key)
+        self.indexes = {name: Partitions(*schema) for name, schema in (indexes or {}).items()}
+
+    def primary_key(self, item: dict):
+        return self.keys_of(item)
+
+    def get(self, key: dict):
+        partition, position = self.find(key, self.primary_key)
+        return partition[1][position] if partition is not None else None
+
+    def put(self, item: dict):
+        self.delete(item)
+        for partitions in (self, *self.indexes.values()):
+            partitions.insert(item)
+
+    def delete(self, key: dict):
+        current = self.get(key)
+        if current is not None:
+            for partitions in (self, *self.indexes.values()):
+                partitions.remove(current, self.primary_key)
+        return current
+
+    def items(self):
+        for partition_value in sorted(self.partitions, key=str):
+            yield from self.partitions[partition_value][1]
+
+class StubDynamoDB:
+    def __init__(self, tables: dict, latency: float = 0.0):
+        # tables: {name: (partition key, sort key or None[, {index name: (partition key, sort key)}])}
+        self.latency = latency
+        self.tables = {name: Table(*schema) for name, schema in tables.items()}
+        self.requests = {}
+        self.items_read = 0
+        self.lock = threading.Lock()
+
+    def _request(self, operation: str):
+        with self.lock:
+            self.requests[operation] = self.requests.get(operation, 0) + 1
+        time.sleep(self.latency)
+
+    def request_count(self) -> int:
+        return sum(self.requests.values())
+
+    def reset_counters(self):
+        self.requests = {}
+        self.items_read = 0
+
+    def _check(self, condition, names, values, current, operation):
+        if not condition:
+            return
+        names = names or {}
+        match = exists_pattern.match(condition)
+        if match:
+            exists = current is not None and names.get(match.group(2), match.group(2)) in current
+            passed = bool(match.group(1)) != exists
+        else:
+            match = equals_pattern.match(condition)
+            if not match:
+                raise NotImplementedError(condition)
+            name = names.get(match.group(1), match.group(1))
+            passed = current is not None and current.get(name) == values[match.group(2)]
+        if not passed:
+            raise ClientError("ConditionalCheckFailedException", operation)
+
+    # -- API
+    def put_item(self, TableName, Item, ConditionExpression=None, ExpressionAttributeNames=None, **kwargs):
+        self._request("PutItem")
+        table = self.tables[TableName]
+        with self.lock:
+            self._check(ConditionExpression, ExpressionAttributeNames, None, table.get(Item), "PutItem")
+            table.put(dict(Item))
+        return {}
+
+    def batch_write_item(self, RequestItems, **kwargs):
+        self._request("BatchWriteItem")
+        with self.lock:
+            for table_name, requests in RequestItems.items():
+                if len(requests) > 25:
+                    raise ClientError("ValidationException", "BatchWriteItem")
+                for request in requests:
+                    if "PutRequest" in request:
+                        self.tables[table_name].put(dict(request["PutRequest"]["Item"]))
+                    else:
+                        self.tables[table_name].delete(request["DeleteRequest"]["Key"])
+        return {"UnprocessedItems": {}}
+
+    def update_item(self, TableName, Key, UpdateExpression, ConditionExpression=None, ExpressionAttributeNames=None, ExpressionAttributeValues=None, **kwargs):
+        # SET only: "SET #a = :a, #b = :b"
+        self._request("UpdateItem")
+        table = self.tables[TableName]
+        names = ExpressionAttributeNames or {}
+        with self.lock:
+            current = table.get(Key)
+            self._check(ConditionExpression, names, ExpressionAttributeValues, current, "UpdateItem")
+            item = dict(current if current is not None else Key)
+            for assignment in set_pattern.match(UpdateExpression).group(1).split(","):
+                name, placeholder = equals_pattern.match(assignment).groups()
+                item[names.get(name, name)] = ExpressionAttributeValues[placeholder]
+            table.put(item)
+        return {}
+
+    def get_item(self, TableName, Key, **kwargs):
+        self._request("GetItem")
+        with self.lock:
+            item = self.tables[TableName].get(Key)
+            self.items_read += item is not None
+        return {"Item": dict(item)} if item is not None else {}
+
+    def delete_item(self, TableName, Key, ConditionExpression=None, ExpressionAttributeNames=None, ReturnValues="NONE", **kwargs):
+        self._request("DeleteItem")
+        table = self.tables[TableName]
+        with self.lock:
+            self._check(ConditionExpression, ExpressionAttributeNames, None, table.get(Key), "DeleteItem")
+            current = table.delete(Key)
+        return {"Attributes": current} if ReturnValues == "ALL_OLD" and current is not None else {}
+
+    def query(self, TableName, KeyConditionExpression, ExpressionAttributeValues, ExpressionAttributeNames=None, IndexName=None, Limit=None, ScanIndexForward=True, ExclusiveStartKey=None, **kwargs):
+        self._request("Query")
+        table = self.tables[TableName]
+        partitions = table.indexes[IndexName] if IndexName else table
+        names = ExpressionAttributeNames or {}
+        partition_value, low, high = None, None, None
+        for clause in KeyConditionExpression.split(" AND "):
+            name, operator, placeholder = key_clause_pattern.match(clause).groups()
+            name = names.get(name, name)
+            value = value_of(ExpressionAttributeValues[placeholder])
+            if name == partitions.partition_key:
+                partition_value = value
+            elif operator == "=":
+                low, high = (value, True), (value, True)
+            elif operator in (">", ">="):
+                low = (value, operator == ">=")
+            else:
+                high = (value, operator == "<=")
+
+        with self.lock:
+            sort_values, items = partitions.partitions.get(partition_value, ([], []))
+            start = 0 if low is None else (bisect.bisect_left if low[1] else bisect.bisect_right)(sort_values, low[0])
+            end = len(sort_values) if high is None else (bisect.bisect_right if high[1] else bisect.bisect_left)(sort_values, high[0])
+            if ExclusiveStartKey is not None and partitions.sort_key:
+                # entries sharing the last sort value are skipped together: good enough for a stand-in
+                after = value_of(ExclusiveStartKey[partitions.sort_key])
+                if ScanIndexForward:
+                    start = max(start, bisect.bisect_right(sort_values, after))
+                else:
+                    end = min(end, bisect.bisect_left(sort_values, after))
+            indexes = range(start, end) if ScanIndexForward else range(end - 1, start - 1, -1)
+            selected = indexes[:Limit] if Limit else indexes
+            page = [dict(items[i]) for i in selected]
+            self.items_read += len(page)
+
+        response = {"Items": page, "Count": len(page)}
+        if Limit and len(page) == Limit and len(indexes) > Limit:
+            last = page[-1]
+            response["LastEvaluatedKey"] = {key: last[key] for key in {table.partition_key, table.sort_key, partitions.partition_key, partitions.sort_key} if key and key in last}
+        return response
+
+    def scan(self, TableName, Limit=None, ExclusiveStartKey=None, ProjectionExpression=None, ExpressionAttributeNames=None, **kwargs):
+        # Pages end at Limit items or after 1 MB has been read, like the service
+        self._request("Scan")
+        table = self.tables[TableName]
+        names = ExpressionAttributeNames or {}
+        projection = [names.get(name.strip(), name.strip()) for name in ProjectionExpression.split(",")] if ProjectionExpression else None
+        with self.lock:
+            ordered = list(table.items())
+            start = 0
+            if ExclusiveStartKey is not None:
+                last_key = table.primary_key(ExclusiveStartKey)
+                start = next(i for i, item in enumerate(ordered) if table.primary_key(item) == last_key) + 1
+            page, size = [], 0
+            for item in ordered[start:]:
+                if (Limit and len(page) >= Limit) or size >= scan_page_bytes:
+                    break
+                size += len(json.dumps(item))
+                page.append({key: value for key, value in item.items() if projection is None or key in projection})
+            self.items_read += len(page)
+            more = start + len(page) < len(ordered)
+
+        response = {"Items": page, "Count": len(page)}
+        if more and page:
+            last = ordered[start + len(page) - 1]
+            response["LastEvaluatedKey"] = {key: last[key] for key in (table.partition_key, table.sort_key) if key}
+        return response
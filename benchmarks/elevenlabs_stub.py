@@ -0,0 +1,69 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Local stand-in for the ElevenLabs text-to-speech API: keep-alive HTTP/1.1,
+# chunked audio on /stream, optional failures (status codes to return first).
+
+class StubElevenLabs:
+    def __init__(self, audio_bytes: int = 64 * 1024, chunk_bytes: int = 4096, chunk_delay: float = 0.0, fail_with: list = None):
+        self.audio_bytes = audio_bytes
+        self.chunk_bytes = chunk_bytes
+        self.chunk_delay = chunk_delay
+        self.fail_with = list(fail_with or [])
+        self.requests = 0
+        self.connections = 0
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def setup(self):
+                super().setup()
+                stub.connections += 1
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                stub.requests += 1
+                self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                if stub.fail_with:
+                    status = stub.fail_with.pop(0)
+                    body = b'{"detail": "stub failure"}'
+                    self.send_response(status)
+                    self.send_header('Content-Length', str(len(body)))
+                    self.send_header('Retry-After', '0')
+                    self.end_headers()
+                    self.wfile.write(body)
+                    return
+
+                audio = b"\xff\xfb\x90\x00" * (stub.audio_bytes // 4)
+                self.send_response(200)
+                self.send_header('Content-Type', 'audio/mpeg')
+                if self.path.split('?')[0].endswith('/stream'):
+                    self.send_header('Transfer-Encoding', 'chunked')
+                    self.end_headers()
+                    for start in range(0, len(audio), stub.chunk_bytes):
+                        chunk = audio[start:start + stub.chunk_bytes]
+                        self.wfile.write(f"{len(chunk):x}\r\n".encode() + chunk + b"\r\n")
+                        self.wfile.flush()
+                        time.sleep(stub.chunk_delay)
+                    self.wfile.write(b"0\r\n\r\n")
+                else:
+                    self.send_header('Content-Length', str(len(audio)))
+                    self.end_headers()
+                    self.wfile.write(audio)
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.port = self.server.server_address[1]
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
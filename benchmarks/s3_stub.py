@@ -0,0 +1,159 @@
+import hashlib
+import io
+import threading
+import time
+from datetime import datetime, timezone
+
+# In-memory stand-in for the subset of the boto3 S3 client used by lambda_code.
+# Every request sleeps `latency` seconds (GIL released, like a real network call)
+# and is counted, so benchmarks can report request counts and bytes moved.
+
+class ClientError(Exception):
+    def __init__(self, code: str, operation: str):
+        super().__init__(f"An error occurred ({code}) when calling the {operation} operation")
+        self.response = {"Error": {"Code": code}}
+
+class StubBody(io.BytesIO):
+    def iter_chunks(self, chunk_size: int = 1024):
+        while True:
+            chunk = self.read(chunk_size)
+            if not chunk:
+                return
+            yield chunk
+
+class Paginator:
+    def __init__(self, client, operation: str):
+        self.client = client
+        self.operation = operation
+
+    def paginate(self, **kwargs):
+        token = None
+        while True:
+            request = dict(kwargs)
+            if token:
+                request["ContinuationToken"] = token
+            page = getattr(self.client, self.operation)(**request)
+            yield page
+            token = page.get("NextContinuationToken")
+            if not token:
+                return
+
+class StubS3:
+    page_size = 1000
+
+    # content_etags: ETag is the MD5 of the body, as on real S3 for single-part puts, so
+    # re-putting the same bytes keeps it; by default every put gets a new one
+    def __init__(self, latency: float = 0.0, content_etags: bool = False):
+        self.latency = latency
+        self.content_etags = content_etags
+        self.objects = {}
+        self.requests = {}
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.lock = threading.Lock()
+        self.version = 0
+
+    # -- bookkeeping
+    def _request(self, operation: str, latency: float = None):
+        with self.lock:
+            self.requests[operation] = self.requests.get(operation, 0) + 1
+        time.sleep(self.latency if latency is None else latency)
+
+    def request_count(self) -> int:
+        return sum(self.requests.values())
+
+    def reset_counters(self):
+        self.requests = {}
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    def _store(self, key: str, body: bytes, **metadata):
+        with self.lock:
+            self.version += 1
+            etag = f'"{hashlib.md5(body).hexdigest()}"' if self.content_etags else f'"{hashlib.md5(body).hexdigest()}-{self.version}"'
+            self.objects[key] = {"Body": body, "ETag": etag, "LastModified": datetime.now(timezone.utc), **metadata}
+            self.bytes_in += len(body)
+        return etag
+
+    # -- API
+    def get_paginator(self, operation: str) -> Paginator:
+        return Paginator(self, operation)
+
+    def list_objects_v2(self, Bucket, Prefix="", Delimiter=None, MaxKeys=None, ContinuationToken=None, StartAfter=None):
+        self._request("ListObjectsV2")
+        limit = min(MaxKeys or self.page_size, self.page_size)
+        after = ContinuationToken or StartAfter or ""
+        contents, prefixes, last = [], [], None
+        for key in sorted(k for k in self.objects if k.startswith(Prefix) and k > after):
+            if len(contents) + len(prefixes) >= limit:
+                return self._page(contents, prefixes, last)
+            if Delimiter and Delimiter in key[len(Prefix):]:
+                common = key[:key.index(Delimiter, len(Prefix)) + 1]
+                if not prefixes or prefixes[-1]["Prefix"] != common:
+                    prefixes.append({"Prefix": common})
+                last = common + "￿"
+                continue
+            contents.append({"Key": key, "Size": len(self.objects[key]["Body"]), "ETag": self.objects[key]["ETag"]})
+            last = key
+        return self._page(contents, prefixes, None)
+
+    def _page(self, contents, prefixes, token):
+        page = {"KeyCount": len(contents) + len(prefixes), "IsTruncated": token is not None}
+        if contents:
+            page["Contents"] = contents
+        if prefixes:
+            page["CommonPrefixes"] = prefixes
+        if token:
+            page["NextContinuationToken"] = token
+        return page
+
+    def get_object(self, Bucket, Key, Range=None, IfNoneMatch=None):
+        self._request("GetObject")
+        obj = self.objects.get(Key)
+        if obj is None:
+            raise ClientError("NoSuchKey", "GetObject")
+        if IfNoneMatch and IfNoneMatch == obj["ETag"]:
+            raise ClientError("304", "GetObject")
+        body = obj["Body"]
+        if Range:
+            start, _, end = Range.replace("bytes=", "").partition("-")
+            body = body[int(start):int(end) + 1 if end else None]
+        self.bytes_out += len(body)
+        return {"Body": StubBody(body), "ETag": obj["ETag"], "ContentLength": len(body)}
+
+    def head_object(self, Bucket, Key):
+        self._request("HeadObject")
+        obj = self.objects.get(Key)
+        if obj is None:
+            raise ClientError("404", "HeadObject")
+        return {"ETag": obj["ETag"], "ContentLength": len(obj["Body"]), "LastModified": obj["LastModified"]}
+
+    def put_object(self, Bucket, Key, Body=b"", IfMatch=None, IfNoneMatch=None, **kwargs):
+        self._request("PutObject")
+        if isinstance(Body, str):
+            Body = Body.encode("utf-8")
+        elif hasattr(Body, "read"):
+            Body = Body.read()
+        current = self.objects.get(Key)
+        if IfNoneMatch == "*" and current is not None:
+            raise ClientError("PreconditionFailed", "PutObject")
+        if IfMatch and (current is None or current["ETag"] != IfMatch):
+            raise ClientError("PreconditionFailed", "PutObject")
+        return {"ETag": self._store(Key, bytes(Body), **kwargs)}
+
+    def upload_fileobj(self, Fileobj, Bucket, Key, ExtraArgs=None, Config=None):
+        self.put_object(Bucket=Bucket, Key=Key, Body=Fileobj.read(), **(ExtraArgs or {}))
+
+    def copy_object(self, CopySource, Bucket, Key, **kwargs):
+        self._request("CopyObject")
+        source = self.objects.get(CopySource["Key"])
+        if source is None:
+            raise ClientError("NoSuchKey", "CopyObject")
+        self._store(Key, source["Body"])
+        self.bytes_in -= len(source["Body"])  # server-side: nothing crosses the wire
+        return {}
+
+    def delete_object(self, Bucket, Key):
+        self._request("DeleteObject")
+        self.objects.pop(Key, None)
+        return {}
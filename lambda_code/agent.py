@@ -1,38 +1,16 @@
 import json
-import boto3
+import aws_clients
 import logging
+import bedrock_agent
 
 logging.basicConfig(format='[%(asctime)s] {%(filename)s:%(lineno)d} %(levelname)s - %(message)s', level=logging.INFO)
 logger = logging.getLogger(__name__)
-bedrock_agent_runtime_client = boto3.client('bedrock-agent-runtime')
-polly_client = boto3.client('polly')
-s3_client = boto3.client('s3')
+bedrock_agent_runtime_client = aws_clients.lazy('bedrock-agent-runtime', profile=aws_clients.agent_profile)
+polly_client = aws_clients.lazy('polly')
+s3_client = aws_clients.lazy('s3')
 
 def speaker(input: str, agent: dict, conversation_params: dict) -> str:
-    agentResponse = bedrock_agent_runtime_client.invoke_agent(
-        inputText=input,
-        agentId=agent['agentId'],
-        agentAliasId=agent['agentAliasId'],
-        sessionId=conversation_params['session_id'],
-        enableTrace=conversation_params['enable_trace'], 
-        endSession=conversation_params['end_session']
-    )
-
-    event_stream = agentResponse['completion']
-    agent_answer = ""
-    try:
-        for event in event_stream:        
-            if 'chunk' in event:
-                data = event['chunk']['bytes']
-                agent_answer += data.decode('utf8')  # Accumulate response chunks
-            elif 'trace' in event:
-                logger.info(json.dumps(event['trace'], indent=2))
-            else:
-                raise Exception("Unexpected event.", event)
-    except Exception as e:
-        raise Exception("Unexpected event.", e)
-
-    return agent_answer.strip()
+    return bedrock_agent.complete(bedrock_agent_runtime_client, bedrock_agent.agent_request(input, agent, conversation_params, prompt_creation=False))
 
 def synthesize(body: str, voice: str, audio_name: str):
     response = polly_client.synthesize_speech(
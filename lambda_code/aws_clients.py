@@ -0,0 +1,64 @@
+import os
+import threading
+
+import boto3
+from botocore.config import Config
+
+# Shared boto3 clients, built on first use and memoized per service and region for the life
+# of the container: a handler only pays for the clients its invocation path needs (no Polly
+# client for ElevenLabs voices, no Lambda client when an upload triggers no follow-up), and
+# every handler gets the same connection pool, keep-alive, timeout and retry settings.
+# lazy() returns a handle that can be created at import and passed around like a client.
+# A profile selects other settings for the same service: a separate client, with its own
+# pool, for calls that need them (service_settings["service#profile"]).
+# boto3 is imported here eagerly on purpose: every handler needs it, and Lambda runs the
+# init phase at full CPU. boto3 clients are thread safe.
+max_pool_connections = int(os.environ.get('aws_max_pool_connections', '32'))
+connect_timeout = float(os.environ.get('aws_connect_timeout', '5'))
+read_timeout = float(os.environ.get('aws_read_timeout', '60'))
+max_attempts = int(os.environ.get('aws_max_attempts', '3'))
+
+# invoke_agent retries throttling itself (bedrock_agent) and streams answers that can take
+# as long as its deadline: no retries stacked on top, and a read timeout that outlasts it.
+# retrieve on the same service keeps the standard retries.
+agent_profile = "invoke_agent"
+service_settings = {
+    f"bedrock-agent-runtime#{agent_profile}": {"read_timeout": 120, "max_attempts": 1}
+}
+
+_clients = {}
+_lock = threading.Lock()
+
+def config(service_name: str, profile: str = None) -> Config:
+    settings = service_settings.get(f"{service_name}#{profile}" if profile else service_name, {})
+    return Config(
+        max_pool_connections=max_pool_connections,
+        tcp_keepalive=True,
+        connect_timeout=settings.get("connect_timeout", connect_timeout),
+        read_timeout=settings.get("read_timeout", read_timeout),
+        retries={"mode": "standard", "total_max_attempts": settings.get("max_attempts", max_attempts)}
+    )
+
+def client(service_name: str, region_name: str = None, profile: str = None):
+    region_name = region_name or os.environ.get('AWS_REGION')
+    key = (service_name, region_name, profile)
+    built = _clients.get(key)
+    if built is None:
+        # boto3's default session is not safe to build clients from concurrently
+        with _lock:
+            built = _clients.get(key)
+            if built is None:
+                built = _clients[key] = boto3.client(service_name, region_name=region_name, config=config(service_name, profile))
+    return built
+
+class LazyClient:
+    def __init__(self, service_name: str, region_name: str = None, profile: str = None):
+        self.service_name = service_name
+        self.region_name = region_name
+        self.profile = profile
+
+    def __getattr__(self, name):
+        return getattr(client(self.service_name, self.region_name, self.profile), name)
+
+def lazy(service_name: str, region_name: str = None, profile: str = None) -> LazyClient:
+    return LazyClient(service_name, region_name, profile)
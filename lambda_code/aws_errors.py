@@ -0,0 +1,4 @@
+# Error code of a botocore ClientError (S3, DynamoDB, Bedrock, Polly...); "" for any other
+# exception, so callers can compare codes without importing botocore.
+def error_code(e: Exception) -> str:
+    return str(getattr(e, 'response', {}).get('Error', {}).get('Code', ''))
@@ -0,0 +1,109 @@
+import logging
+import os
+import random
+import time
+
+import rate_limit
+import trace_capture
+
+logger = logging.getLogger(__name__)
+
+# One invoke_agent completion loop for every handler. stream() yields text chunks as Bedrock
+# sends them, complete() returns the whole answer; both record time to first chunk, total
+# latency, bytes and attempts, enforce a per-call deadline (checked between events: socket
+# stalls are bounded by the client's read timeout) and retry throttling with jittered
+# exponential backoff, as long as no chunk has reached the caller yet. on_metrics receives
+# the metrics of every completed call; trace events go to on_trace and to the trace capture
+# of a sampled turn.
+timeout_seconds = float(os.environ.get('agent_timeout_seconds', '120'))
+max_attempts = int(os.environ.get('agent_max_attempts', '3'))
+backoff_seconds = 0.5
+
+class AgentError(Exception):
+    pass
+
+class AgentTimeout(AgentError):
+    pass
+
+def agent_request(input: str, agent: dict, conversation_params: dict = None, session_id: str = None, session_state: dict = None, stream_final_response: bool = False, prompt_creation: bool = True) -> dict:
+    # invoke_agent arguments; conversation_params supplies session, trace and prompt settings
+    conversation_params = conversation_params or {}
+    request = {
+        "inputText": input,
+        "agentId": agent['agentId'],
+        "agentAliasId": agent['agentAliasId'],
+        "sessionId": session_id or conversation_params['session_id'],
+        "enableTrace": trace_capture.capturing(),
+        "endSession": conversation_params.get('end_session', False)
+    }
+    if prompt_creation and 'prompt_creation_configurations' in conversation_params:
+        request["promptCreationConfigurations"] = conversation_params['prompt_creation_configurations']
+    if session_state:
+        request["sessionState"] = session_state
+    if stream_final_response:
+        request["streamingConfigurations"] = {"streamFinalResponse": True}
+    return request
+
+class AgentCall:
+    # Iterating yields the completion as text chunks; metrics are filled in as it goes
+    def __init__(self, client, request: dict, timeout: float = None, attempts: int = None, on_trace=None, on_metrics=None):
+        self.client = client
+        self.request = request
+        self.timeout = timeout_seconds if timeout is None else timeout
+        self.attempts = max_attempts if attempts is None else attempts
+        self.on_trace = on_trace
+        self.on_metrics = on_metrics
+        self.metrics = {"agent": request['agentId'], "attempts": 0, "ttfc_ms": None, "latency_ms": None, "bytes": 0, "chunks": 0}
+
+    def _events(self, deadline: float):
+        response = self.client.invoke_agent(**self.request)
+        for event in response['completion']:
+            if time.monotonic() > deadline:
+                raise AgentTimeout(f"Agent {self.request['agentId']} exceeded its {self.timeout:g}s deadline")
+            yield event
+
+    def __iter__(self):
+        start = time.monotonic()
+        deadline = start + self.timeout
+        for attempt in range(self.attempts):
+            self.metrics["attempts"] = attempt + 1
+            try:
+                for event in self._events(deadline):
+                    if 'chunk' in event:
+                        data = event['chunk']['bytes']
+                        if self.metrics["ttfc_ms"] is None:
+                            self.metrics["ttfc_ms"] = round((time.monotonic() - start) * 1000)
+                        self.metrics["bytes"] += len(data)
+                        self.metrics["chunks"] += 1
+                        yield data.decode('utf8')
+                    elif 'trace' in event:
+                        logger.debug("Agent trace: %s", event['trace'])
+                        trace_capture.add(self.request['agentId'], event['trace'])
+                        if self.on_trace is not None:
+                            self.on_trace(event['trace'])
+                    else:
+                        raise AgentError(f"Unexpected event from agent {self.request['agentId']}: {list(event)}")
+                self.metrics["latency_ms"] = round((time.monotonic() - start) * 1000)
+                logger.info("Agent call %s", self.metrics)
+                if self.on_metrics is not None:
+                    self.on_metrics(self.metrics)
+                return
+            except AgentError:
+                raise
+            except Exception as e:
+                # once a chunk is out, the caller has acted on it: never replay the stream
+                retryable = rate_limit.is_throttling(e) and self.metrics["chunks"] == 0 and attempt < self.attempts - 1
+                delay = random.uniform(0, backoff_seconds * 2 ** attempt)
+                if not retryable or time.monotonic() + delay > deadline:
+                    raise AgentError(f"Agent {self.request['agentId']} failed after {attempt + 1} attempts: {e}") from e
+                logger.warning("Agent %s throttled, retrying in %.2fs", self.request['agentId'], delay)
+                time.sleep(delay)
+
+    def text(self) -> str:
+        return "".join(self).strip()
+
+def stream(client, request: dict, **kwargs):
+    return AgentCall(client, request, **kwargs)
+
+def complete(client, request: dict, **kwargs) -> str:
+    return AgentCall(client, request, **kwargs).text()
@@ -4,17 +4,25 @@ from cryptography.hazmat.primitives import serialization
 from cryptography.hazmat.primitives.asymmetric import padding
 from cryptography.hazmat.primitives import hashes
 from base64 import b64encode
-import boto3
+import aws_clients
 import os
 
-client_ssm = boto3.client('ssm')
+client_ssm = aws_clients.lazy('ssm')
 private_key_ssm = os.getenv('PRIVATE_KEY_SSM')
 resource_url = f"https://{os.getenv('CLOUDFRONT_DOMAIN')}/*"
-expiration = int(time.time()) + os.getenv('COOKIE_EXPIRATION', '86400')  # Default to 24 hours
+cookie_expiration = int(os.getenv('COOKIE_EXPIRATION', '86400'))  # Default to 24 hours
+cookie_window = int(os.getenv('COOKIE_WINDOW', '300'))  # Signed cookies reused for 5 minutes
 key_pair_id = os.getenv('KEY_PAIR_ID')
 auth_user = os.getenv('AUTH_USER')
 auth_pass = os.getenv('AUTH_PASS')
 
+# The private key and the signed cookies are cached per container: only the first login in a
+# cookie window pays for the SSM round trip and the RSA signature. Every login in the same
+# window gets the same cookies, expiring COOKIE_EXPIRATION seconds after the window ends, so
+# they are never valid for less than COOKIE_EXPIRATION.
+_private_key = None
+_cookies = None
+
 def load_private_key():
     response = client_ssm.get_parameter(
         Name=private_key_ssm,
@@ -49,11 +57,32 @@ def sign_policy(policy, private_key):
     )
     return b64encode(signature).decode('utf-8')
 
-def set_signed_cookie():
-    private_key = load_private_key()
-    policy = create_policy(resource_url, expiration)
-    signature = sign_policy(policy, private_key)
+def get_private_key():
+    global _private_key
+    if _private_key is None:
+        _private_key = load_private_key()
+    return _private_key
+
+def signed_cookies(now: float = None) -> list:
+    global _cookies
+    window = int(now if now is not None else time.time()) // cookie_window
+    if _cookies is None or _cookies[0] != window:
+        expiration = (window + 1) * cookie_window + cookie_expiration
+        policy = create_policy(resource_url, expiration)
+        signature = sign_policy(policy, get_private_key())
+        _cookies = (window, [{
+                "key": "Set-Cookie",
+                "value": f"CloudFront-Policy={b64encode(policy.encode('utf-8')).decode('utf-8')}"
+            }, {
+                "key": "Set-Cookie",
+                "value": f"CloudFront-Key-Pair-Id={key_pair_id}"
+            }, {
+                "key": "Set-Cookie",
+                "value": f"CloudFront-Signature={signature}"
+            }])
+    return _cookies[1]
 
+def set_signed_cookie():
     return {
         "status": "302",
         "statusDescription": 'Found',
@@ -66,16 +95,7 @@ def set_signed_cookie():
                 "key": "Cache-Control",
                 "value": "no-cache, no-store, must-revalidate"
             }],
-            'set-cookie': [{
-                "key": "Set-Cookie",
-                "value": f"CloudFront-Policy={b64encode(policy.encode('utf-8')).decode('utf-8')}"
-            }, {
-                "key": "Set-Cookie",
-                "value": f"CloudFront-Key-Pair-Id={key_pair_id}"
-            }, {
-                "key": "Set-Cookie",
-                "value": f"CloudFront-Signature={signature}"
-            }]
+            'set-cookie': [dict(cookie) for cookie in signed_cookies()]
         }
     }
 
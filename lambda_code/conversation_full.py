@@ -1,51 +1,77 @@
 import json
-import boto3
+import os
+import aws_clients
 import logging
 import re
+import transcript
+import s3_fetch
+import replay_catalog
+import manifest
+import hls
+import spans
 
-logging.basicConfig(format='[%(asctime)s] {%(filename)s:%(lineno)d} %(levelname)s - %(message)s', level=logging.ERROR)
+logging.basicConfig(format='[%(asctime)s] {%(filename)s:%(lineno)d} %(levelname)s - %(message)s', level=os.environ.get('log_level', 'INFO'))
 logger = logging.getLogger(__name__)
-s3_client = boto3.client('s3')
+s3_client = aws_clients.lazy('s3')
+dynamodb_client = aws_clients.lazy('dynamodb', region_name=replay_catalog.region)
 
 def get_conversation_history(s3_bucket_name, s3_folder_name):
 
-    # Initialize an empty string to hold the concatenated content
-    all_content = ""
-
-    # List objects in the specified bucket and folder
-    response = s3_client.list_objects_v2(Bucket=s3_bucket_name, Prefix=s3_folder_name)
-
-    if 'Contents' in response:
-        # Loop through all files in the folder
-        for obj in response['Contents']:
-            file_key = obj['Key']
-            # Check if the file has a .txt extension
-            if file_key.endswith('.txt') and file_key != f"{s3_folder_name}/full_conversation.txt":
-                # Fetch the file content
-                file_obj = s3_client.get_object(Bucket=s3_bucket_name, Key=file_key)
-                file_content = file_obj['Body'].read().decode('utf-8')
-                # Remove XML tags using a regular expression
-                file_content_no_tags = re.sub(r'<[^>]*>', '', file_content)
-                # Append content to the variable
-                all_content += file_content_no_tags.strip() + "\n--------------------\n"  # Add a separator between files
-    else:
-        print("No files found in the folder.")
+    # Fetch every turn transcript (paginated listing, concurrent GETs, turn order)
+    keys, contents = s3_fetch.fetch_transcripts(s3_client, s3_bucket_name, f"{s3_folder_name}/", exclude=(f"{s3_folder_name}/full_conversation.txt",))
+
+    if not keys:
+        logger.warning("No files found in %s", s3_folder_name)
 
-    return all_content
+    # Remove XML tags and add a separator between files
+    return "".join(transcript.strip_tags(content) + "\n--------------------\n" for content in contents)
 
 def text_push_s3(body: str, bucket: str, text_name: str, UUID: str):
     s3_client.put_object(Body=body, Bucket=bucket, Key=f"outputs/{UUID}/{text_name}")
 
 def lambda_handler(event, context):
+    #per-stage timings of this invocation, one metrics line at the end
+    spans.start("conversation_history", UUID=event.get('UUID'), Finalize=event.get('Finalize', False))
+    try:
+        return conversation_history(event)
+    finally:
+        spans.emit()
+
+def conversation_history(event):
     #print input
-    logger.error(f"EVENT: {event}")
+    logger.debug("EVENT: %s", event)
 
     #vars
     s3_bucket_name = 'ai-conversation-matteo-mus-eu-west-1-992382403092'
     s3_folder_name = f"outputs/{event['UUID']}"
 
-    #get conversation history
-    full_conversation = get_conversation_history(s3_bucket_name, s3_folder_name)
-    text_push_s3(full_conversation, s3_bucket_name, 'full_conversation.txt', event['UUID'])
+    #get conversation history: one GET of the transcript log
+    with spans.span("transcript_read"):
+        turns = transcript.read_turns(s3_client, s3_bucket_name, event['UUID'])
+    if turns is not None:
+        full_conversation = transcript.render_history(turns)
+    else:
+        #conversation started before the transcript log existed
+        with spans.span("legacy_fetch"):
+            full_conversation = get_conversation_history(s3_bucket_name, s3_folder_name)
+
+    #finalize once at ConversationFull instead of rewriting every turn
+    if event.get('Finalize', False):
+        with spans.span("s3_upload"):
+            text_push_s3(full_conversation, s3_bucket_name, 'full_conversation.txt', event['UUID'])
+
+        #the conversation is complete: make it available for replay
+        try:
+            with spans.span("replay_catalog"):
+                replay_catalog.record_conversation(dynamodb_client, s3_client, s3_bucket_name, event['UUID'], turns or [], event.get('CreatedAt', ''))
+        except Exception as e:
+            logger.error("Error updating the replay catalog: %s", e)
+
+        #players polling the manifest, and the HLS playlist when there is one, learn the
+        #conversation is over; the EndFlag step then writes the legacy end marker. Both are idempotent.
+        with spans.span("manifest"):
+            conversation_manifest = manifest.mark_ended(s3_client, s3_bucket_name, event['UUID'])
+            hls.end_playlist(s3_client, s3_bucket_name, event['UUID'])
+        logger.info("Conversation %s ended: %d turns, manifest version %s", event['UUID'], len(conversation_manifest['turns']), conversation_manifest['version'])
     
     return full_conversation
\ No newline at end of file
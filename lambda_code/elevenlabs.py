@@ -0,0 +1,145 @@
+import http.client
+import json
+import logging
+import os
+import queue
+import random
+import socket
+import time
+
+logger = logging.getLogger(__name__)
+
+# Keep-alive connection pool for the ElevenLabs API, shared across warm invocations.
+# Host, port and TLS are configurable so the client can run against a local stand-in.
+host = os.environ.get('elevenlabs_host', 'api.elevenlabs.io')
+port = int(os.environ.get('elevenlabs_port', '443'))
+use_tls = os.environ.get('elevenlabs_tls', 'true').lower() == 'true'
+api_key = os.environ.get('elevenlabs_api_key', '')
+pool_size = int(os.environ.get('elevenlabs_pool_size', '4'))
+connect_timeout = float(os.environ.get('elevenlabs_connect_timeout', '5'))
+read_timeout = float(os.environ.get('elevenlabs_read_timeout', '60'))
+max_retries = int(os.environ.get('elevenlabs_max_retries', '3'))
+backoff_seconds = float(os.environ.get('elevenlabs_backoff_seconds', '0.5'))
+retry_statuses = {429, 500, 502, 503, 504}
+
+class PooledResponse:
+    # File-like response body; the connection goes back to the pool once the body is consumed
+    def __init__(self, client, conn, response):
+        self.client = client
+        self.conn = conn
+        self.response = response
+        self.status = response.status
+
+    def getheader(self, name: str, default=None):
+        return self.response.getheader(name, default)
+
+    def read(self, size: int = -1) -> bytes:
+        data = self.response.read(size) if size is not None and size >= 0 else self.response.read()
+        if not data or self.response.isclosed():
+            self.close()
+        return data
+
+    def close(self):
+        if self.conn is not None:
+            self.client.release(self.conn, self.response)
+            self.conn = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+class ElevenLabsClient:
+    def __init__(self, host: str = host, port: int = port, use_tls: bool = use_tls, api_key: str = api_key,
+                 pool_size: int = pool_size, connect_timeout: float = connect_timeout, read_timeout: float = read_timeout,
+                 max_retries: int = max_retries, backoff_seconds: float = backoff_seconds):
+        self.host = host
+        self.port = port
+        self.use_tls = use_tls
+        self.api_key = api_key
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.idle = queue.LifoQueue(maxsize=pool_size)
+        self.stats = {"connections": 0, "reused": 0, "retries": 0}
+
+    def _connect(self):
+        connection_class = http.client.HTTPSConnection if self.use_tls else http.client.HTTPConnection
+        conn = connection_class(self.host, self.port, timeout=self.connect_timeout)
+        conn.connect()
+        conn.sock.settimeout(self.read_timeout)
+        # http.client sends headers and body in separate writes: avoid Nagle / delayed-ACK stalls
+        conn.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.stats["connections"] += 1
+        return conn
+
+    def _acquire(self):
+        try:
+            conn = self.idle.get_nowait()
+            self.stats["reused"] += 1
+            return conn, True
+        except queue.Empty:
+            return self._connect(), False
+
+    def release(self, conn, response):
+        if response.isclosed() and not response.will_close:
+            try:
+                self.idle.put_nowait(conn)
+                return
+            except queue.Full:
+                pass
+        conn.close()
+
+    def _backoff(self, attempt: int, retry_after: str = None):
+        self.stats["retries"] += 1
+        delay = self.backoff_seconds * 2 ** attempt
+        if retry_after and retry_after.isdigit():
+            delay = max(delay, float(retry_after))
+        time.sleep(random.uniform(delay / 2, delay))
+
+    def request(self, method: str, path: str, body: bytes = None, headers: dict = None) -> PooledResponse:
+        headers = {'xi-api-key': self.api_key, **(headers or {})}
+        attempt = 0
+        while True:
+            conn, reused = self._acquire()
+            try:
+                conn.request(method, path, body, headers)
+                response = conn.getresponse()
+            except (http.client.HTTPException, OSError) as e:
+                conn.close()
+                if reused:
+                    # idle keep-alive connection closed by the server: retry at once on a fresh one
+                    continue
+                if attempt >= self.max_retries:
+                    raise
+                logger.warning("ElevenLabs request failed (%s), retrying", e)
+                self._backoff(attempt)
+                attempt += 1
+                continue
+
+            if response.status in retry_statuses and attempt < self.max_retries:
+                retry_after = response.getheader('Retry-After')
+                response.read()
+                self.release(conn, response)
+                logger.warning("ElevenLabs returned %s, retrying", response.status)
+                self._backoff(attempt, retry_after)
+                attempt += 1
+                continue
+
+            return PooledResponse(self, conn, response)
+
+    def text_to_speech(self, voice_id: str, text: str, model_id: str, output_format: str, stream: bool = True) -> PooledResponse:
+        # The /stream endpoint sends audio with chunked encoding while it is being generated
+        path = f"/v1/text-to-speech/{voice_id}{'/stream' if stream else ''}?output_format={output_format}"
+        payload = json.dumps({"text": text, "model_id": model_id}).encode('utf-8')
+        return self.request("POST", path, payload, {'Content-Type': 'application/json'})
+
+_client = None
+
+def get_client() -> ElevenLabsClient:
+    global _client
+    if _client is None:
+        _client = ElevenLabsClient()
+    return _client
@@ -0,0 +1,205 @@
+import hashlib
+import math
+import os
+import struct
+
+import s3_cas
+
+# HLS output: every turn is cut into ~segment_seconds MP3 segments on frame boundaries,
+# written as immutable objects under outputs/{UUID}/hls/, and appended to one live
+# playlist (EVENT type) per conversation; ending the conversation appends #EXT-X-ENDLIST.
+# Segments are packed audio: each starts with the ID3 PRIV timestamp HLS requires, taken
+# from the playlist time so far. Segment names carry turn, index and a content hash: a
+# retried turn never changes an object a CDN may have cached. An EVENT playlist may only
+# grow, so a turn that already has entries keeps them: a retry publishes nothing new.
+# A streamed turn is appended sentence by sentence as each one's audio lands; its names also
+# carry the speaker invocation ("attempt") and sentence, so a retried turn continues the
+# playlist after the entries of the failed attempt instead of repeating any.
+playlist_name = "playlist.m3u8"
+segment_seconds = float(os.environ.get('hls_segment_seconds', '4'))
+segment_cache_control = "max-age=31536000, immutable"
+# about half a segment: listeners share one origin fetch per refresh
+playlist_cache_control = "max-age=1"
+timestamp_owner = b"com.apple.streaming.transportStreamTimestamp\x00"
+timestamp_clock = 90000
+
+# Layer III: kbit/s by bitrate index for MPEG-1 and MPEG-2/2.5, Hz by sample rate index per version bits
+bitrates = {
+    3: (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    2: (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160)
+}
+sample_rates = {3: (44100, 48000, 32000), 2: (22050, 24000, 16000), 0: (11025, 12000, 8000)}
+
+def hls_prefix(UUID: str) -> str:
+    return f"outputs/{UUID}/hls/"
+
+def playlist_key(UUID: str) -> str:
+    return hls_prefix(UUID) + playlist_name
+
+def segment_name(turn: int, index: int, body: bytes, tag: str = "") -> str:
+    return f"{int(turn)}-{index}-{tag}{hashlib.md5(body).hexdigest()[:8]}.mp3"
+
+def sentence_tag(attempt: str, sentence: int) -> str:
+    return f"{attempt}.{int(sentence)}."
+
+def entry_tag(entry: dict) -> str:
+    # "" for a turn appended whole
+    parts = entry["uri"].split("-")[2].split(".")
+    return f"{parts[0]}.{parts[1]}." if len(parts) == 4 else ""
+
+def id3_size(data: bytes) -> int:
+    if data[:3] != b"ID3" or len(data) < 10:
+        return 0
+    return 10 + ((data[6] & 0x7f) << 21 | (data[7] & 0x7f) << 14 | (data[8] & 0x7f) << 7 | (data[9] & 0x7f))
+
+def frame_info(data: bytes, i: int):
+    # (frame length in bytes, duration in seconds) of the Layer III frame at i, None if there is none
+    if i + 4 > len(data) or data[i] != 0xff or data[i + 1] & 0xe0 != 0xe0:
+        return None
+    version = (data[i + 1] >> 3) & 3
+    layer = (data[i + 1] >> 1) & 3
+    bitrate_index = data[i + 2] >> 4
+    rate_index = (data[i + 2] >> 2) & 3
+    if layer != 1 or version == 1 or not 0 < bitrate_index < 15 or rate_index == 3:
+        return None
+    bitrate = bitrates[3 if version == 3 else 2][bitrate_index] * 1000
+    sample_rate = sample_rates[version][rate_index]
+    padding = (data[i + 2] >> 1) & 1
+    samples = 1152 if version == 3 else 576
+    return samples // 8 * bitrate // sample_rate + padding, samples / sample_rate
+
+def split_frames(audio: bytes, target_seconds: float = segment_seconds) -> list:
+    # [(bytes, seconds)]: consecutive frames up to target_seconds each; bytes between frames are dropped
+    segments = []
+    start, seconds = None, 0.0
+    i = id3_size(audio)
+    while i < len(audio):
+        info = frame_info(audio, i)
+        if info is None:
+            i += 1
+            continue
+        length, duration = info
+        if i + length > len(audio):
+            # truncated last frame
+            break
+        if start is None:
+            start = i
+        elif seconds + duration > target_seconds:
+            segments.append((audio[start:i], seconds))
+            start, seconds = i, 0.0
+        seconds += duration
+        i += length
+    if start is not None:
+        segments.append((audio[start:i], seconds))
+    return segments
+
+def synchsafe(size: int) -> bytes:
+    return bytes(((size >> 21) & 0x7f, (size >> 14) & 0x7f, (size >> 7) & 0x7f, size & 0x7f))
+
+def timestamp_tag(seconds: float) -> bytes:
+    # ID3v2.4 tag with one PRIV frame: the 33-bit 90 kHz timestamp of the segment's first sample
+    payload = timestamp_owner + struct.pack(">Q", round(seconds * timestamp_clock) & (2 ** 33 - 1))
+    frame = b"PRIV" + synchsafe(len(payload)) + b"\x00\x00" + payload
+    return b"ID3\x04\x00\x00" + synchsafe(len(frame)) + frame
+
+def parse_playlist(body: bytes) -> tuple:
+    # ([{"uri", "seconds"}], ended)
+    entries = []
+    seconds = None
+    for line in body.decode('utf-8').splitlines():
+        if line.startswith("#EXTINF:"):
+            seconds = float(line[len("#EXTINF:"):].split(",")[0])
+        elif line and not line.startswith("#"):
+            entries.append({"uri": line, "seconds": seconds})
+    return entries, "#EXT-X-ENDLIST" in body.decode('utf-8')
+
+def entry_turn(entry: dict) -> int:
+    return int(entry["uri"].split("-")[0])
+
+def entry_order(entry: dict) -> tuple:
+    turn, index = entry["uri"].split("-")[:2]
+    return int(turn), int(index)
+
+def render_playlist(entries: list, ended: bool) -> bytes:
+    target = max([math.ceil(segment_seconds)] + [math.ceil(e["seconds"]) for e in entries])
+    lines = ["#EXTM3U", "#EXT-X-VERSION:3", "#EXT-X-PLAYLIST-TYPE:EVENT", f"#EXT-X-TARGETDURATION:{target}", "#EXT-X-MEDIA-SEQUENCE:0"]
+    for n, entry in enumerate(entries):
+        # voices may be encoded differently: every turn starts a new discontinuity
+        if n and entry_turn(entry) != entry_turn(entries[n - 1]):
+            lines.append("#EXT-X-DISCONTINUITY")
+        lines.append(f"#EXTINF:{entry['seconds']:.3f},")
+        lines.append(entry["uri"])
+    if ended:
+        lines.append("#EXT-X-ENDLIST")
+    return ("\n".join(lines) + "\n").encode('utf-8')
+
+def read_playlist(s3_client, bucket: str, UUID: str) -> tuple:
+    body, _ = s3_cas.read_object(s3_client, bucket, playlist_key(UUID))
+    return parse_playlist(body) if body is not None else ([], False)
+
+def put_playlist(s3_client, bucket: str, UUID: str, mutate) -> bytes:
+    # mutate(entries, ended) -> (entries, ended)
+    def update(body):
+        entries, ended = parse_playlist(body) if body is not None else ([], False)
+        return render_playlist(*mutate(entries, ended))
+
+    return s3_cas.read_modify_write(s3_client, bucket, playlist_key(UUID), update, ContentType="application/vnd.apple.mpegurl", CacheControl=playlist_cache_control)
+
+def write_segments(s3_client, bucket: str, UUID: str, turn: int, audio: bytes, start: float, first_index: int = 0, tag: str = "") -> list:
+    # uploads the audio as ~segment_seconds segments timestamped from start; returns their entries
+    written = []
+    for index, (frames, seconds) in enumerate(split_frames(audio), first_index):
+        body = timestamp_tag(start) + frames
+        name = segment_name(turn, index, body, tag)
+        s3_client.put_object(Body=body, Bucket=bucket, Key=hls_prefix(UUID) + name, ContentType="audio/mpeg", CacheControl=segment_cache_control)
+        written.append({"uri": name, "seconds": round(seconds, 3)})
+        start += seconds
+    return written
+
+def append_sentence(s3_client, bucket: str, UUID: str, turn: int, attempt: str, sentence: int, audio: bytes) -> list:
+    # Streamed turns: called in sentence order. Returns the playlist entries of this sentence.
+    tag = sentence_tag(attempt, sentence)
+    entries, _ = read_playlist(s3_client, bucket, UUID)
+    published = [e for e in entries if entry_turn(e) == int(turn) and entry_tag(e) == tag]
+    if published:
+        return published
+    turn_entries = [e for e in entries if entry_turn(e) == int(turn)]
+    if any(entry_tag(e) == "" for e in turn_entries):
+        # the turn was appended whole
+        return []
+    start = sum(e["seconds"] for e in entries if entry_turn(e) <= int(turn))
+    written = write_segments(s3_client, bucket, UUID, turn, audio, start, len(turn_entries), tag)
+
+    def mutate(entries, ended):
+        if any(entry_turn(e) == int(turn) and entry_tag(e) in (tag, "") for e in entries):
+            return entries, ended
+        return sorted(entries + written, key=entry_order), ended
+
+    put_playlist(s3_client, bucket, UUID, mutate)
+    return written
+
+def append_turn(s3_client, bucket: str, UUID: str, turn: int, audio: bytes) -> list:
+    # Returns the playlist entries of this turn, the published ones when it is a retry
+    entries, _ = read_playlist(s3_client, bucket, UUID)
+    published = [e for e in entries if entry_turn(e) == int(turn)]
+    if published:
+        return published
+    start = sum(e["seconds"] for e in entries if entry_turn(e) < int(turn))
+    written = write_segments(s3_client, bucket, UUID, turn, audio, start)
+
+    def mutate(entries, ended):
+        # a concurrent retry published the turn first: players may have fetched its entries
+        if any(entry_turn(e) == int(turn) for e in entries):
+            return entries, ended
+        return sorted(entries + written, key=entry_order), ended
+
+    put_playlist(s3_client, bucket, UUID, mutate)
+    return written
+
+def end_playlist(s3_client, bucket: str, UUID: str) -> bool:
+    # False when the conversation has no playlist (HLS output was not enabled)
+    body, _ = s3_cas.read_object(s3_client, bucket, playlist_key(UUID))
+    if body is None:
+        return False
+    put_playlist(s3_client, bucket, UUID, lambda entries, ended: (entries, True))
+    return True
@@ -0,0 +1,133 @@
+import hashlib
+import json
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import s3_cas
+import s3_fetch
+
+logger = logging.getLogger(__name__)
+
+# Streaming topic ingestion: an uploaded file is read line by line with ranged GETs,
+# topics already under the destination prefix are skipped, new ones are written in
+# concurrent batches, and the byte offset reached is checkpointed after every batch.
+# An invocation close to its timeout stops after a batch and the next one resumes there.
+checkpoint_prefix = os.environ.get('ingest_checkpoint_prefix', 'ingest-checkpoints/')
+batch_size = int(os.environ.get('ingest_batch_size', '50'))
+write_workers = int(os.environ.get('ingest_write_workers', '8'))
+reserve_seconds = float(os.environ.get('ingest_reserve_seconds', '60'))
+read_chunk_bytes = 1024 * 1024
+
+def content_hash(content: str) -> str:
+    return hashlib.md5(content.encode('utf-8')).hexdigest()
+
+def load_index(s3_client, bucket: str, prefix: str) -> set:
+    # One paginated listing (1000 keys per request) instead of a HEAD per topic
+    return set(s3_fetch.list_keys(s3_client, bucket, prefix))
+
+def checkpoint_key(source_key: str) -> str:
+    return f"{checkpoint_prefix}{source_key}.json"
+
+def source_version(head: dict, sequencer: str = None) -> str:
+    # Identifies one put of the source key. The ETag alone does not: re-putting the same bytes
+    # (start_simple recycles topics that way) keeps it. The S3 event's sequencer changes on
+    # every put and stays the same when the handler re-invokes itself with the event; without
+    # one (manual runs) the modification time tells puts apart.
+    return sequencer or f"{head['ETag']}@{head.get('LastModified')}"
+
+def load_checkpoint(s3_client, bucket: str, source_key: str, version: str) -> dict:
+    body, _ = s3_cas.read_object(s3_client, bucket, checkpoint_key(source_key))
+    if body is not None:
+        checkpoint = json.loads(body)
+        # a re-uploaded file under the same key starts over
+        if checkpoint.get("version") == version:
+            return checkpoint
+    return {"version": version, "offset": 0, "line": 0, "written": 0, "skipped": 0, "done": False}
+
+def save_checkpoint(s3_client, bucket: str, source_key: str, checkpoint: dict):
+    s3_client.put_object(Bucket=bucket, Key=checkpoint_key(source_key), Body=json.dumps(checkpoint), ContentType='application/json')
+
+def iter_lines(s3_client, bucket: str, key: str, offset: int = 0):
+    # Yields (offset after the line, line) without holding the file in memory
+    try:
+        response = s3_client.get_object(Bucket=bucket, Key=key, Range=f"bytes={offset}-")
+    except Exception as e:
+        # offset at the end of the file (or an empty file)
+        if s3_cas.error_code(e) == "InvalidRange":
+            return
+        raise
+    pending = b""
+    for chunk in response['Body'].iter_chunks(read_chunk_bytes):
+        pending += chunk
+        start = 0
+        while True:
+            end = pending.find(b"\n", start)
+            if end < 0:
+                break
+            offset += end + 1 - start
+            yield offset, pending[start:end].rstrip(b"\r").decode('utf-8')
+            start = end + 1
+        pending = pending[start:]
+    if pending:
+        yield offset + len(pending), pending.rstrip(b"\r").decode('utf-8')
+
+def iter_batches(s3_client, bucket: str, source_key: str, checkpoint: dict, skip, size: int = batch_size):
+    # Batches of new topics as {"topics": [(line number, content, hash)], "offset", "line"};
+    # skip(hash) drops topics that need no work, duplicates within the file are dropped too.
+    seen = set()
+    topics = []
+    line = checkpoint["line"]
+    offset = checkpoint["offset"]
+    for offset, text in iter_lines(s3_client, bucket, source_key, checkpoint["offset"]):
+        line += 1
+        content = text.strip()
+        if not content:
+            continue
+        topic_hash = content_hash(content)
+        if topic_hash in seen or skip(topic_hash):
+            checkpoint["skipped"] += 1
+            continue
+        seen.add(topic_hash)
+        topics.append((line, content, topic_hash))
+        if len(topics) >= size:
+            yield {"topics": topics, "offset": offset, "line": line}
+            topics = []
+    yield {"topics": topics, "offset": offset, "line": line}
+
+def write_topics(s3_client, bucket: str, prefix: str, topics: list, workers: int = write_workers, queue=None):
+    # queue: optional topic_queue.TopicQueue that also gets each topic, text inline
+    def write(topic):
+        _, content, topic_hash = topic
+        s3_client.put_object(Bucket=bucket, Key=f"{prefix}{topic_hash}.txt", Body=content.encode('utf-8'))
+        if queue is not None:
+            queue.enqueue(topic_hash, content)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        list(executor.map(write, topics))
+
+def open_source(s3_client, bucket: str, source_key: str, sequencer: str = None) -> dict:
+    head = s3_client.head_object(Bucket=bucket, Key=source_key)
+    checkpoint = load_checkpoint(s3_client, bucket, source_key, source_version(head, sequencer))
+    if checkpoint["offset"]:
+        logger.info("Resuming s3://%s/%s at byte %d (line %d)", bucket, source_key, checkpoint['offset'], checkpoint['line'])
+    return checkpoint
+
+def commit_batch(s3_client, bucket: str, source_key: str, checkpoint: dict, batch: dict):
+    checkpoint["offset"] = batch["offset"]
+    checkpoint["line"] = batch["line"]
+    checkpoint["written"] += len(batch["topics"])
+    save_checkpoint(s3_client, bucket, source_key, checkpoint)
+
+def finish(s3_client, bucket: str, source_key: str, checkpoint: dict):
+    checkpoint["done"] = True
+    save_checkpoint(s3_client, bucket, source_key, checkpoint)
+    logger.info("Ingested s3://%s/%s: %d lines, %d new topics, %d skipped", bucket, source_key, checkpoint['line'], checkpoint['written'], checkpoint['skipped'])
+
+def out_of_time(context) -> bool:
+    return context is not None and context.get_remaining_time_in_millis() < reserve_seconds * 1000
+
+def continue_later(lambda_client, event: dict, context):
+    # Async self-invocation with the same S3 event: the next run resumes from the checkpoint
+    lambda_client.invoke(FunctionName=context.invoked_function_arn, InvocationType='Event', Payload=json.dumps(event).encode('utf-8'))
+    logger.info("Time budget reached, continuing in a new invocation")
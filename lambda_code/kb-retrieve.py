@@ -1,79 +1,50 @@
 import json
-import boto3
+import aws_clients
 import logging
+import os
 import re
+import kb_cache
+import bedrock_agent
 
 
-logging.basicConfig(format='[%(asctime)s] {%(filename)s:%(lineno)d} %(levelname)s - %(message)s', level=logging.INFO)
+logging.basicConfig(format='[%(asctime)s] {%(filename)s:%(lineno)d} %(levelname)s - %(message)s', level=os.environ.get('log_level', 'INFO'))
 logger = logging.getLogger(__name__)
-bedrock_agent_runtime_client = boto3.client('bedrock-agent-runtime')
+bedrock_agent_runtime_client = aws_clients.lazy('bedrock-agent-runtime')
+bedrock_agent_client = aws_clients.lazy('bedrock-agent-runtime', profile=aws_clients.agent_profile)
 
 def retrieve_knowledge(knowledge_base_id, query):
     try:
-      response = bedrock_agent_runtime_client.retrieve(
-          knowledgeBaseId=knowledge_base_id,
-          retrievalQuery={
-            'text': query
-          },
-          retrievalConfiguration={
-              "vectorSearchConfiguration": {
-                "numberOfResults": 5    
-              }
-              
-          }
-      )
-      logger.info(f"Retrived knowledge: {response}")
-      texts = [item["content"]["text"] for item in response["retrievalResults"]]
+      texts = kb_cache.retrieve(bedrock_agent_runtime_client, knowledge_base_id, query, 5)
+      logger.info("Retrieved %d knowledge passages", len(texts))
+      logger.debug("Retrieved knowledge: %s", texts)
       all_text = "\n\n".join(texts)
 
       return all_text
     except Exception as e:
-      logger.info(f"Error retrieving knowledge: {e}")
+      logger.warning("Error retrieving knowledge: %s", e)
       return "Error retrieving knowledge"
 
 def generate( input: str, agent: dict, conversation_params: dict, knowledge: str):
-    agentResponse = bedrock_agent_runtime_client.invoke_agent(
-        inputText=input,
-        agentId=agent['agentId'],
-        agentAliasId=agent['agentAliasId'],
-        sessionId=conversation_params['session_id'],
-        enableTrace=conversation_params['enable_trace'], 
-        endSession=conversation_params['end_session'],
-        sessionState={
-            "promptSessionAttributes": {
-                "context": knowledge
-            }
+    session_state = {
+        "promptSessionAttributes": {
+            "context": knowledge
         }
-    )
-    event_stream = agentResponse['completion']
-    agent_answer = ""
-    try:
-        for event in event_stream:        
-            if 'chunk' in event:
-                data = event['chunk']['bytes']
-                agent_answer += data.decode('utf8')  # Accumulate response chunks
-            elif 'trace' in event:
-                logger.info(json.dumps(event['trace'], indent=2))
-            else:
-                raise Exception("Unexpected event.", event)
-    except Exception as e:
-        raise Exception("Unexpected event.", e)
-
-    return agent_answer.strip()
+    }
+    return bedrock_agent.complete(bedrock_agent_client, bedrock_agent.agent_request(input, agent, conversation_params, session_state=session_state, prompt_creation=False))
 
 
 def lambda_handler(event, context):
-    logger.info(f"EVENT: {event}")
+    logger.debug("EVENT: %s", event)
     knowledge_base_id = event['knowledge_base_id']
     input = event['input']
     agent = event['agent'] 
     conversation_params = event['conversation_params']
     
     knowledge = retrieve_knowledge(knowledge_base_id, input)
-    logger.info(f"knowledge: {knowledge}")
+    logger.debug("knowledge: %s", knowledge)
 
     response = generate(input, agent, conversation_params, knowledge)
-    print(f"Response: {response}")
+    logger.debug("Response: %s", response)
     return {
         'statusCode': 200,
         'body': json.dumps(response)
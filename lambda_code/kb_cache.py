@@ -0,0 +1,116 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+import s3_cas
+
+logger = logging.getLogger(__name__)
+
+# Knowledge-base retrieval cache keyed on (knowledgeBaseId, normalized query, numberOfResults).
+# Level 1 is a module-level LRU that survives warm invocations; level 2 is an optional
+# S3 prefix shared by every container (enabled by setting kb_cache_bucket).
+# Entries expire after kb_cache_ttl_seconds, so a re-synced KB is picked up within one TTL;
+# invalidate() drops a KB immediately.
+max_entries = int(os.environ.get('kb_cache_max_entries', '256'))
+ttl_seconds = int(os.environ.get('kb_cache_ttl_seconds', '3600'))
+persist_bucket = os.environ.get('kb_cache_bucket', '')
+persist_prefix = os.environ.get('kb_cache_prefix', 'kb-cache/')
+
+whitespace_pattern = re.compile(r'\s+')
+entries = OrderedDict()
+stats = {"hit": 0, "persistent_hit": 0, "miss": 0, "expired": 0}
+lock = threading.Lock()
+
+def normalize_query(query: str) -> str:
+    return whitespace_pattern.sub(' ', query).strip().strip('.!?').lower()
+
+def cache_key(knowledge_base_id: str, query: str, number_of_results: int) -> tuple:
+    return (knowledge_base_id, normalize_query(query), number_of_results)
+
+def persist_key(key: tuple) -> str:
+    digest = hashlib.sha256(json.dumps(key, ensure_ascii=False).encode('utf-8')).hexdigest()
+    return f"{persist_prefix}{key[0]}/{digest}.json"
+
+def get_local(key: tuple):
+    with lock:
+        entry = entries.get(key)
+        if entry is None:
+            return None
+        if time.time() - entry["stored_at"] > ttl_seconds:
+            del entries[key]
+            stats["expired"] += 1
+            return None
+        entries.move_to_end(key)
+        return entry["texts"]
+
+def put_local(key: tuple, texts: list, stored_at: float):
+    with lock:
+        entries[key] = {"texts": texts, "stored_at": stored_at}
+        entries.move_to_end(key)
+        while len(entries) > max_entries:
+            entries.popitem(last=False)
+
+def get_persistent(s3_client, key: tuple):
+    body, _ = s3_cas.read_object(s3_client, persist_bucket, persist_key(key))
+    if body is None:
+        return None
+    entry = json.loads(body)
+    if time.time() - entry["stored_at"] > ttl_seconds:
+        stats["expired"] += 1
+        return None
+    put_local(key, entry["texts"], entry["stored_at"])
+    return entry["texts"]
+
+def invalidate(knowledge_base_id: str = None):
+    # Local level only: persistent entries age out with the TTL
+    with lock:
+        for key in [key for key in entries if knowledge_base_id is None or key[0] == knowledge_base_id]:
+            del entries[key]
+
+def retrieve(bedrock_agent_runtime_client, knowledge_base_id: str, query: str, number_of_results: int = 5, s3_client=None) -> list:
+    key = cache_key(knowledge_base_id, query, number_of_results)
+
+    texts = get_local(key)
+    if texts is not None:
+        stats["hit"] += 1
+        logger.info("KB cache hit %s %s", knowledge_base_id, stats)
+        return texts
+
+    if persist_bucket and s3_client is not None:
+        try:
+            texts = get_persistent(s3_client, key)
+        except Exception as e:
+            logger.warning("KB cache persistent read failed: %s", e)
+        if texts is not None:
+            stats["persistent_hit"] += 1
+            logger.info("KB cache persistent hit %s %s", knowledge_base_id, stats)
+            return texts
+
+    stats["miss"] += 1
+    logger.info("KB cache miss %s %s", knowledge_base_id, stats)
+    response = bedrock_agent_runtime_client.retrieve(
+        knowledgeBaseId=knowledge_base_id,
+        retrievalQuery={
+            'text': query
+        },
+        retrievalConfiguration={
+            "vectorSearchConfiguration": {
+                "numberOfResults": number_of_results
+            }
+        }
+    )
+    texts = [item["content"]["text"] for item in response["retrievalResults"]]
+
+    stored_at = time.time()
+    put_local(key, texts, stored_at)
+    if persist_bucket and s3_client is not None:
+        try:
+            s3_client.put_object(Bucket=persist_bucket, Key=persist_key(key), Body=json.dumps({"stored_at": stored_at, "texts": texts}, ensure_ascii=False))
+        except Exception as e:
+            logger.warning("KB cache persistent write failed: %s", e)
+    return texts
@@ -1,113 +1,90 @@
-import json
-import boto3
+import aws_clients
 import logging
 import io
 import re
 import os
-from xml.etree import ElementTree as ET
-import http.client
-
-logging.basicConfig(format='[%(asctime)s] {%(filename)s:%(lineno)d} %(levelname)s - %(message)s', level=logging.ERROR)
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+import transcript
+import manifest
+import hls
+import tts
+from ssml import extract_speak_content, validate_ssml, generate_ssml, generation_mode, escape
+import kb_cache
+import prefetch
+import bedrock_agent
+import spans
+import trace_capture
+
+logging.basicConfig(format='[%(asctime)s] {%(filename)s:%(lineno)d} %(levelname)s - %(message)s', level=os.environ.get('log_level', 'INFO'))
 logger = logging.getLogger(__name__)
-bedrock_agent_runtime_client = boto3.client('bedrock-agent-runtime')
-polly_client = boto3.client('polly')
-s3_client = boto3.client('s3')
-elevenlabsa_api_key = os.environ['elevenlabs_api_key']
+bedrock_agent_runtime_client = aws_clients.lazy('bedrock-agent-runtime')
+bedrock_agent_client = aws_clients.lazy('bedrock-agent-runtime', profile=aws_clients.agent_profile)
+polly_client = aws_clients.lazy('polly')
+s3_client = aws_clients.lazy('s3')
+
+# Streaming TTS: a sentence ends at terminal punctuation (plus closing quotes/brackets) followed by whitespace
+sentence_end_pattern = re.compile(r'[.!?…]+["\')\]]*\s+')
+min_sentence_chars = int(os.environ.get('stream_min_sentence_chars', '40'))
+stream_tts_workers = int(os.environ.get('stream_tts_workers', '4'))
 
-def retrieve_knowledge(knowledge_base_id, input, agent_abstract, conversation_params):
+def retrieve_knowledge(knowledge_base_id, input, agent_abstract, conversation_params, stage_prefix: str = ""):
 
     try:
-        abstract = agent(input, agent_abstract, conversation_params)
-        logger.error(f"Abstract for knowledge base: {abstract}")
+        with spans.span(f"{stage_prefix}abstract"):
+            abstract = agent(input, agent_abstract, conversation_params)
+        logger.debug("Abstract for knowledge base: %s", abstract)
     except Exception as e:
-        logger.error(f"Error generating abstract: {e}")
+        logger.warning("Error generating abstract: %s", e)
         abstract = ""
 
     try:
-      response = bedrock_agent_runtime_client.retrieve(
-          knowledgeBaseId=knowledge_base_id,
-          retrievalQuery={
-            'text': abstract
-          },
-          retrievalConfiguration={
-              "vectorSearchConfiguration": {
-                "numberOfResults": 5    
-              }
-              
-          }
-      )
-      logger.error(f"Retrived knowledge: {response}")
-      texts = [item["content"]["text"] for item in response["retrievalResults"]]
+      with spans.span(f"{stage_prefix}kb_retrieve"):
+        texts = kb_cache.retrieve(bedrock_agent_runtime_client, knowledge_base_id, abstract, 5, s3_client)
+      logger.debug("Retrieved knowledge: %s", texts)
+      logger.info("KB cache stats: %s", kb_cache.stats)
       all_text = "\n\n".join(texts)
 
       return all_text
     
     except Exception as e:
-      logger.error(f"Error retrieving knowledge: {e}")
+      logger.error("Error retrieving knowledge: %s", e)
       return "Error retrieving knowledge"
 
-def agent_with_knowledge(input: str, agent: dict, conversation_params: dict, agent_abstract: dict) -> str:
-    
-    agentResponse = bedrock_agent_runtime_client.invoke_agent(
-        inputText=input,
-        agentId=agent['agentId'],
-        agentAliasId=agent['agentAliasId'],
-        sessionId=conversation_params['session_id'],
-        enableTrace=conversation_params['enable_trace'], 
-        endSession=conversation_params['end_session'],
-        promptCreationConfigurations=conversation_params['prompt_creation_configurations'],
-        sessionState={
-            "promptSessionAttributes": {
-                "context": retrieve_knowledge(agent['knowledgeBaseId'], input, agent_abstract, conversation_params)
-            }
-        }
-    )
-    logger.error(f"AGENT RESPONSE: {agentResponse}")
-
-    event_stream = agentResponse['completion']
-    agent_answer = ""
-    try:
-        for event in event_stream:        
-            if 'chunk' in event:
-                data = event['chunk']['bytes']
-                agent_answer += data.decode('utf8')  # Accumulate response chunks
-            elif 'trace' in event:
-                logger.error(json.dumps(event['trace'], indent=2))
-            else:
-                raise Exception("Unexpected event.", event)
-    except Exception as e:
-        raise Exception("Unexpected event.", e)
+def agent_with_knowledge(input: str, agent: dict, conversation_params: dict, agent_abstract: dict, knowledge: str = None, on_metrics=None) -> str:
+    if knowledge is None:
+        knowledge = retrieve_knowledge(agent['knowledgeBaseId'], input, agent_abstract, conversation_params)
 
-    return agent_answer.strip()
+    session_state = {
+        "promptSessionAttributes": {
+            "context": knowledge
+        }
+    }
+    return bedrock_agent.complete(bedrock_agent_client, bedrock_agent.agent_request(input, agent, conversation_params, session_state=session_state), on_metrics=on_metrics)
 
 #with no knowledge
-def agent(input: str, agent: dict, conversation_params: dict) -> str:
-    agentResponse = bedrock_agent_runtime_client.invoke_agent(
-        inputText=input,
-        agentId=agent['agentId'],
-        agentAliasId=agent['agentAliasId'],
-        sessionId=conversation_params['session_id'],
-        enableTrace=conversation_params['enable_trace'], 
-        endSession=conversation_params['end_session'],
-        promptCreationConfigurations=conversation_params['prompt_creation_configurations'],
-    )
-    logger.error(f"AGENT RESPONSE: {agentResponse}")
-
-    event_stream = agentResponse['completion']
-    agent_answer = ""
-    try:
-        for event in event_stream:        
-            if 'chunk' in event:
-                data = event['chunk']['bytes']
-                agent_answer += data.decode('utf8')  # Accumulate response chunks
-            elif 'trace' in event:
-                logger.error(json.dumps(event['trace'], indent=2))
-            else:
-                raise Exception("Unexpected event.", event)
-    except Exception as e:
-        raise Exception("Unexpected event.", e)
-
-    return agent_answer.strip()
+def agent(input: str, agent: dict, conversation_params: dict, on_metrics=None) -> str:
+    return bedrock_agent.complete(bedrock_agent_client, bedrock_agent.agent_request(input, agent, conversation_params), on_metrics=on_metrics)
+
+#streaming: yields completion chunks as soon as Bedrock sends them
+def agent_stream(input: str, agent: dict, conversation_params: dict, session_state: dict = None, on_metrics=None):
+    request = bedrock_agent.agent_request(input, agent, conversation_params, session_state=session_state, stream_final_response=True)
+    return bedrock_agent.stream(bedrock_agent_client, request, on_metrics=on_metrics)
+
+def split_sentences(chunks, min_chars: int = min_sentence_chars):
+    # Re-chunk a stream of text at sentence boundaries; short sentences are merged with the next one
+    buffer = ""
+    for chunk in chunks:
+        buffer += chunk
+        cut = 0
+        for match in sentence_end_pattern.finditer(buffer):
+            if match.end() - cut >= min_chars:
+                yield buffer[cut:match.end()].strip()
+                cut = match.end()
+        buffer = buffer[cut:]
+
+    if buffer.strip():
+        yield buffer.strip()
 
 def get_stop_from_tags(input_str):
     # Define the regex pattern to match content inside <STOP> and </STOP> tags
@@ -135,171 +112,230 @@ def extract_reasoning(text: str) -> str:
     outside_text = re.sub(r'<STOP>.*?</STOP>', '', text, flags=re.DOTALL).strip()
     return outside_text
 
-def synthesize(body: str, agent: dict, audio_name: str):
-    filename = f"/tmp/{audio_name}"
-
-    if "voice_elevenlabs" in agent and agent["voice_elevenlabs"] != "":
-        conn = http.client.HTTPSConnection("api.elevenlabs.io")
-
-        payload = json.dumps({
-            "text": body,
-            "model_id": "eleven_multilingual_v2"
-        })
-
-        headers = {
-            'xi-api-key': 'sk_01dcae060a644561ae2b4feaa0007090c5ad869d4299eb8d',
-            'Content-Type': 'application/json'
-        }
-
-        conn.request("POST", f"/v1/text-to-speech/{agent["voice_elevenlabs"]}?output_format=mp3_44100_128", payload, headers)
-
-        res = conn.getresponse()
-        data = res.read()
-
-        # Save the mp3 response content to a file
-        with open(filename, "wb") as f:
-            f.write(data)
-
-        return filename
-    else:
-        response = polly_client.synthesize_speech(
-            Text=body,
-            OutputFormat='mp3',
-            Engine="neural",
-            TextType='ssml',
-            VoiceId=agent['voice']
-        )
-        
-        if 'AudioStream' in response:
-            with open(filename, 'wb') as file:
-                file.write(response['AudioStream'].read())        
-            return filename
-        else:
-            raise Exception("Could not synthesize speech from text.")
-
-def audio_push_s3(filename: str, bucket: str, audio_name: str, UUID: str):
-    with open(filename, 'rb') as data:
-        s3_client.upload_fileobj(data, bucket, f"outputs/{UUID}/{audio_name}")
-
 def text_push_s3(body: str, bucket: str, text_name: str, UUID: str):
     s3_client.put_object(Body=body, Bucket=bucket, Key=f"outputs/{UUID}/{text_name}")
 
-def extract_speak_content(input_text):
-    match = re.search(r"<speak>(.*?)</speak>", input_text, re.DOTALL)
-    if match:
-        return f"<speak>{match.group(1).strip()}</speak>"
-    return None
-
-def validate_ssml(ssml_text):
-    error_messages = []
+def prefetched_knowledge(event, s3_bucket_name: str):
+    #context prefetched by the previous speaker invocation, None on a miss; a retried turn's
+    #Input does not carry the previous speaker's text and always misses
+    answered = extract_speak_content(event['Input'])
+    knowledge = None
+    if answered is not None:
+        knowledge = prefetch.load(s3_client, s3_bucket_name, event['UUID'], event['Turn'], event['Speaker']['knowledgeBaseId'], answered)
+    logger.info("PREFETCH %s for turn %s", "HIT" if knowledge is not None else "MISS", event['Turn'])
+    return knowledge
+
+def prefetch_next_speaker(event, speaker_text: str, s3_bucket_name: str):
+    #abstract + retrieve for the next speaker, off its critical path
+    next_speaker = event['NextSpeaker']
+    knowledge = retrieve_knowledge(next_speaker['knowledgeBaseId'], speaker_text, event['Abstract'], event['ConversationParams'], stage_prefix="prefetch_")
+    if knowledge != "Error retrieving knowledge":
+        prefetch.store(s3_client, s3_bucket_name, event['UUID'], int(event['Turn']) + 1, next_speaker['knowledgeBaseId'], knowledge, speaker_text)
+
+def start_prefetch(event, speaker_text: str, s3_bucket_name: str, pending: list):
+    #no NextSpeaker on the last debate turn and on greetings: no speaker with a knowledge base follows
+    if "knowledgeBaseId" in (event.get('NextSpeaker') or {}) and 'Abstract' in event:
+        pending.append(prefetch.submit(prefetch_next_speaker, event, speaker_text, s3_bucket_name))
+
+def add_ssml_tags(response_text: str, event) -> str:
+    #deterministic local markup when configured for this speaker, the SSML agent otherwise or as fallback
+    if generation_mode(event['ConversationParams'], event['Speaker']['name']) == "local":
+        with spans.span("ssml_local"):
+            local_text = generate_ssml(response_text)
+            local_valid = local_text is not None and validate_ssml(local_text)[0]
+        if local_valid:
+            logger.info("SSML generated locally")
+            return local_text
+        logger.warning("Local SSML generation failed, falling back to the SSML agent")
+    with spans.span("ssml_llm"):
+        return agent(response_text, event['Ssml'], event['ConversationParams'], on_metrics=spans.agent_metrics("ssml_llm"))
+
+def segment_ssml(sentence: str, local: bool) -> str:
+    if local:
+        speak_text = generate_ssml(sentence)
+        if speak_text is not None:
+            return speak_text
+    return f"<speak>{escape(sentence)}</speak>"
+
+def synthesize_segment(speak_text: str, agent: dict, bucket: str, segment_name: str, UUID: str) -> bytes:
+    with spans.span("validation"):
+        ssml_is_valid, ssml_validation_errors = validate_ssml(speak_text)
+    if not ssml_is_valid:
+        raise ValueError(f"SSML validation failed: {ssml_validation_errors}")
+
+    #a sentence is small: keep a copy of its audio for the HLS playlist and the whole-turn file
+    key = f"outputs/{UUID}/segments/{segment_name}"
+    audio = io.BytesIO()
+    with spans.span("tts_segment"):
+        synthesized = tts.synthesize_to_s3(polly_client, s3_client, speak_text, agent, bucket, key, tee=audio)
+    if synthesized:
+        return audio.getvalue()
+    #server-side S3 cache hit
+    return s3_client.get_object(Bucket=bucket, Key=key)['Body'].read()
+
+def publish_segment(event, s3_bucket_name: str, attempt: str, index: int, segments: list):
+    #runs on a single publisher thread in sentence order: a sentence is listed in the manifest
+    #(and the HLS playlist) as soon as it and every sentence before it are uploaded, so players
+    #start the turn while the rest is still being generated and synthesized
+    audio = segments[index].result()
+    if any(segment.exception() is not None for segment in segments[:index]):
+        return
+    segment_key = f"outputs/{event['UUID']}/segments/{event['Turn']}-{attempt}-{index}.mp3"
+    with spans.span("manifest"):
+        manifest.add_segment(s3_client, s3_bucket_name, event['UUID'], event['Turn'], event['Speaker']['name'], attempt, index, segment_key, len(audio))
+    if event['ConversationParams'].get('hls_output', False):
+        with spans.span("hls"):
+            hls.append_sentence(s3_client, s3_bucket_name, event['UUID'], event['Turn'], attempt, index, audio)
+
+def speak_streaming(event, s3_bucket_name: str, pending: list):
+    #TTS starts on the first complete sentence while the agent is still generating, and each
+    #sentence is published as it lands. Segment keys carry this invocation's attempt id: a
+    #retried turn never overwrites audio a player may be fetching.
+    audio_name = str(event['Turn']) + ".mp3"
+    text_name = str(event['Turn']) + ".txt"
+    sentences = []
+    segments = []
+    local_ssml = generation_mode(event['ConversationParams'], event['Speaker']['name']) == "local"
+    segment_texts = []
+    published = []
+    attempt = uuid.uuid4().hex[:8]
 
     try:
-        # Parse the SSML text into an XML tree
-        tree = ET.ElementTree(ET.fromstring(ssml_text))
-        root = tree.getroot()
-    except ET.ParseError:
-        error_messages.append("Invalid XML structure.")
-        return False, error_messages
-
-    # 1. Verify presence of <speak> tag wrapping all text
-    if root.tag != "speak":
-        error_messages.append("<speak> and </speak> tags must wrap all text.")
-        return False, error_messages
-
-    # Define helper functions for validation
-    def validate_prosody_attributes(attributes):
-        valid_attributes = {"volume", "rate"}
-        valid_volume = {"silent", "x-soft", "soft", "medium", "loud", "x-loud"}
-        valid_rate = {"x-slow", "slow", "medium", "fast", "x-fast"}
-
-        # Check if <prosody> has unexpected attributes
-        for attr_name in attributes.keys():
-            if attr_name not in valid_attributes:
-                error_messages.append(f"Invalid attribute '{attr_name}' in <prosody>. Only 'rate' and 'volume' are allowed.")
-
-        has_rate = "rate" in attributes
-        has_volume = "volume" in attributes
-
-        # If neither or both attributes are missing, add error
-        if not has_rate and not has_volume:
-            error_messages.append("<prosody> must have at least one attribute: 'rate' or 'volume'.")
-            return
-
-        if "volume" in attributes:
-            attr_value = attributes["volume"]
-            if not (attr_value in valid_volume or re.match(r"^[+-]\d+dB$", attr_value)):
-                error_messages.append(f"Invalid volume value: {attr_value}")
-
-        if "rate" in attributes:
-            attr_value = attributes["rate"]
-            if not (attr_value in valid_rate or re.match(r"^\d+%$", attr_value)):
-                error_messages.append(f"Invalid rate value: {attr_value}")
-
-    def validate_break_structure(elem):
-        # Ensure <break> is self-closing
-        if elem.text is not None or len(elem) > 0:
-            error_messages.append("<break> must be a self-closing tag.")
-            return
-
-        # Validate <break> attributes
-        attributes = elem.attrib
-        if "time" in attributes:
-            if not re.match(r"^\d+(ms|s)$", attributes["time"]):
-                error_messages.append(f"Invalid time value in <break>: {attributes['time']}")
-        else:
-            error_messages.append("Missing required 'time' attribute in <break>.")
+        session_state = None
+        if "knowledgeBaseId" in event['Speaker']:
+            knowledge = prefetched_knowledge(event, s3_bucket_name)
+            if knowledge is None:
+                knowledge = retrieve_knowledge(event['Speaker']['knowledgeBaseId'], event['Input'], event['Abstract'], event['ConversationParams'])
+            session_state = {
+                "promptSessionAttributes": {
+                    "context": knowledge
+                }
+            }
 
-    # 2. Traverse the tree and validate elements
-    for elem in tree.iter():
-        # Validate <speak> content (already verified by the root check)
+        with ThreadPoolExecutor(max_workers=stream_tts_workers) as executor, ThreadPoolExecutor(max_workers=1) as publisher:
+            chunks = agent_stream(event['Input'], event['Speaker'], event['ConversationParams'], session_state, on_metrics=spans.agent_metrics("speaker_llm", latency=True))
+            for index, sentence in enumerate(split_sentences(chunks)):
+                logger.debug("SENTENCE %d: %s", index, sentence)
+                sentences.append(sentence)
+                segment_texts.append(segment_ssml(sentence, local_ssml))
+                segment_name = f"{event['Turn']}-{attempt}-{index}.mp3"
+                segments.append(executor.submit(synthesize_segment, segment_texts[-1], event['Speaker'], s3_bucket_name, segment_name, event['UUID']))
+                published.append(publisher.submit(publish_segment, event, s3_bucket_name, attempt, index, segments))
+
+            #the text is complete: prepare the next speaker and write the agent traces while the last segments synthesize
+            start_prefetch(event, " ".join(sentences), s3_bucket_name, pending)
+            trace_capture.flush()
+
+            #keep turn order regardless of completion order
+            segment_audio = [segment.result() for segment in segments]
+            for publication in published:
+                publication.result()
+    except Exception as e:
+        logger.error("Error in streaming generation: %s", e)
+        return {
+            "validation": False,
+            "response_error": str(e),
+            "response_text": " ".join(sentences)
+        }
 
-        # Check for <p> tag
-        if elem.tag == "p":
-            if elem.text is None and len(elem) == 0:
-                error_messages.append("<p> element must not be empty.")
+    if not sentences:
+        logger.error("No text generated by the agent.")
+        return {
+            "validation": False,
+            "response_error": "No text included in <speak> and </speak> tags.",
+            "response_text": ""
+        }
 
-        # Check for <prosody> tag
-        if elem.tag == "prosody":
-            validate_prosody_attributes(elem.attrib)
+    speak_text = f"<speak>{' '.join(text[len('<speak>'):-len('</speak>')] for text in segment_texts)}</speak>"
+    with spans.span("s3_upload"):
+        text_push_s3(speak_text, s3_bucket_name, text_name, event['UUID'])
 
-        # Check for <break> tag
-        if elem.tag == "break":
-            validate_break_structure(elem)
+    #MP3 frames can be concatenated: the whole turn is also written as {Turn}.mp3, which replays,
+    #the replay catalog (audio duration) and players from before the manifest read. S3 cannot
+    #join objects under 5 MB server side, hence the copy of the turn's audio kept in memory.
+    audio = b"".join(segment_audio)
+    try:
+        with spans.span("s3_upload"):
+            s3_client.put_object(Body=audio, Bucket=s3_bucket_name, Key=f"outputs/{event['UUID']}/{audio_name}")
+    except Exception as e:
+        logger.error("Error in audio generation: %s", e)
+        return {
+            "validation": False,
+            "response_error": str(e),
+            "response_text": speak_text
+        }
+
+    with spans.span("transcript"):
+        transcript.append_turn(s3_client, s3_bucket_name, event['UUID'], event['Turn'], event['Speaker']['name'], speak_text)
+    with spans.span("manifest"):
+        manifest.add_turn(s3_client, s3_bucket_name, event['UUID'], event['Turn'], event['Speaker']['name'], f"outputs/{event['UUID']}/{audio_name}", len(audio), attempt)
 
-    # Return final validation result
-    is_valid = len(error_messages) == 0
-    return is_valid, error_messages
+    logger.info("TURN %s SUCCESS (%d streamed segments)", event['Turn'], len(sentences))
+    return {
+            "validation": True,
+            "response_error": "",
+            "response_text": speak_text
+        }
 
 def lambda_handler(event, context):
     #print input
-    logger.error(f"EVENT: {event}")
+    logger.debug("EVENT: %s", event)
+
+    #per-stage timings of this turn, one metrics line at the end
+    spans.start("speaker", UUID=event.get('UUID'), Turn=event.get('Turn'), Speaker=event.get('Speaker', {}).get('name'))
+    #agent traces of a sampled turn, one compressed object at the end
+    trace_capture.start(s3_client, os.environ['s3_bucket'], event.get('UUID'), event.get('Turn'), "speaker", event.get('ConversationParams', {}))
 
+    #speculative work started during this turn
+    pending = []
+    try:
+        return speak(event, pending)
+    finally:
+        with spans.span("prefetch_drain"):
+            prefetch.drain(pending)
+        with spans.span("trace_drain"):
+            trace_capture.finish()
+        spans.emit()
+
+def speak(event, pending: list):
     #vars
     s3_bucket_name = os.environ['s3_bucket']
     audio_name = str(event['Turn']) + ".mp3"
     text_name = str(event['Turn']) + ".txt"
 
+    #sentence-level streaming TTS
+    if event['ConversationParams'].get('stream_tts', False):
+        return speak_streaming(event, s3_bucket_name, pending)
+
     #LLM text generation
     try:
         if "knowledgeBaseId" in event['Speaker']:
-            response_text = agent_with_knowledge(event['Input'], event['Speaker'], event['ConversationParams'], event['Abstract'])
+            knowledge = prefetched_knowledge(event, s3_bucket_name)
+            if knowledge is None:
+                knowledge = retrieve_knowledge(event['Speaker']['knowledgeBaseId'], event['Input'], event['Abstract'], event['ConversationParams'])
+            with spans.span("speaker_llm"):
+                response_text = agent_with_knowledge(event['Input'], event['Speaker'], event['ConversationParams'], event['Abstract'], knowledge, on_metrics=spans.agent_metrics("speaker_llm"))
         else:
-            response_text = agent(event['Input'], event['Speaker'], event['ConversationParams'])
-        logger.error(f"RESPONSE TEXT: {response_text}")
+            with spans.span("speaker_llm"):
+                response_text = agent(event['Input'], event['Speaker'], event['ConversationParams'], on_metrics=spans.agent_metrics("speaker_llm"))
+        logger.debug("RESPONSE TEXT: %s", response_text)
     except Exception  as e:
-        logger.error(f"Error in text generation: {e}")
+        logger.error("Error in text generation: %s", e)
         return {
             "validation": False,
             "response_error": str(e),
             "response_text": ""
         }
 
+    #next speaker's abstract + retrieve runs during SSML, validation and TTS
+    start_prefetch(event, response_text, s3_bucket_name, pending)
+
     #SSML tags generation
     try:
-        response_text = agent(response_text, event['Ssml'], event['ConversationParams'])
-        logger.error(f"RESPONSE TEXT: {response_text}")
+        response_text = add_ssml_tags(response_text, event)
+        logger.debug("RESPONSE TEXT: %s", response_text)
     except Exception  as e:
-        logger.error(f"Error in SSML tags generation: {e}")
+        logger.error("Error in SSML tags generation: %s", e)
         return {
             "validation": False,
             "response_error": str(e),
@@ -307,12 +343,16 @@ def lambda_handler(event, context):
         }
 
 
+    #agent calls are done: the trace write overlaps validation and TTS
+    trace_capture.flush()
+
     #save text to S3
-    text_push_s3(response_text, s3_bucket_name, text_name, event['UUID'])
+    with spans.span("s3_upload"):
+        text_push_s3(response_text, s3_bucket_name, text_name, event['UUID'])
 
     #get <speak></speak> content
     speak_text = str(extract_speak_content(response_text))
-    logger.error(f"SPEAK TEXT: {speak_text}")
+    logger.debug("SPEAK TEXT: %s", speak_text)
 
     #check <speak></speak> content
     if speak_text is None:
@@ -324,9 +364,10 @@ def lambda_handler(event, context):
         }
     
     #check SSML
-    ssml_is_valid, ssml_validation_errors = validate_ssml(speak_text)
+    with spans.span("validation"):
+        ssml_is_valid, ssml_validation_errors = validate_ssml(speak_text)
     if not ssml_is_valid:
-        logger.error(f"SSML validation failed: {ssml_validation_errors}")
+        logger.error("SSML validation failed: %s", ssml_validation_errors)
         return {
             "validation": False,
             "response_error": ssml_validation_errors,
@@ -335,19 +376,38 @@ def lambda_handler(event, context):
     
     #audio from text generation
     #save audio to S3
+    #HLS output needs the audio bytes: keep a copy when they pass through this container
+    hls_output = event['ConversationParams'].get('hls_output', False)
+    audio = io.BytesIO() if hls_output else None
     try:
-        response_audio = synthesize(speak_text, event['Speaker'], audio_name)
-        audio_push_s3(response_audio, s3_bucket_name, audio_name, event['UUID'])
+        with spans.span("tts"):
+            audio_in_container = tts.synthesize_to_s3(polly_client, s3_client, speak_text, event['Speaker'], s3_bucket_name, f"outputs/{event['UUID']}/{audio_name}", tee=audio)
     except Exception as e:
-        logger.error(f"Error in audio generation: {e}")
+        logger.error("Error in audio generation: %s", e)
         return {
             "validation": False,
             "response_error": str(e),
             "response_text": response_text
         }
 
+    #append turn to the conversation transcript
+    with spans.span("transcript"):
+        transcript.append_turn(s3_client, s3_bucket_name, event['UUID'], event['Turn'], event['Speaker']['name'], response_text)
+
+    #list the audio as ready in the conversation manifest
+    with spans.span("manifest"):
+        audio_key = f"outputs/{event['UUID']}/{audio_name}"
+        audio_size = s3_client.head_object(Bucket=s3_bucket_name, Key=audio_key)['ContentLength']
+        manifest.add_turn(s3_client, s3_bucket_name, event['UUID'], event['Turn'], event['Speaker']['name'], audio_key, audio_size)
+
+    #fixed-duration segments appended to the conversation playlist
+    if hls_output:
+        with spans.span("hls"):
+            audio_bytes = audio.getvalue() if audio_in_container else s3_client.get_object(Bucket=s3_bucket_name, Key=audio_key)['Body'].read()
+            hls.append_turn(s3_client, s3_bucket_name, event['UUID'], event['Turn'], audio_bytes)
+
     #END
-    logger.error(f"TURN {event['Turn']} SUCCESS")
+    logger.info("TURN %s SUCCESS", event['Turn'])
     return {
             "validation": True,
             "response_error": "",
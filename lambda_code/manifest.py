@@ -0,0 +1,76 @@
+import json
+from datetime import datetime, timezone
+
+import s3_cas
+
+# Per-conversation manifest: outputs/{UUID}/manifest.json lists the turns whose audio is ready
+# (turn, speaker, audio key, byte size) and whether the conversation has ended. Players poll
+# this one small object, cacheable for `max_age_seconds`, instead of HEAD-probing every
+# {Turn}.mp3 and the end marker. "version" grows by one on every change, so a player can
+# skip a manifest it has already seen; a retried write that changes nothing leaves it as is.
+# A streamed turn is listed before it is complete: "segments" grows as each sentence's audio
+# lands (in sentence order), and "audio" appears once the whole turn is written. Segments
+# belong to one speaker invocation ("attempt"): a retried turn starts a new list.
+manifest_name = "manifest.json"
+max_age_seconds = 2
+put_kwargs = {"ContentType": "application/json", "CacheControl": f"max-age={max_age_seconds}"}
+
+def manifest_key(UUID: str) -> str:
+    return f"outputs/{UUID}/{manifest_name}"
+
+def empty_manifest(UUID: str) -> dict:
+    return {"id": UUID, "version": 0, "turns": [], "ended": False}
+
+def update(s3_client, bucket: str, UUID: str, change) -> dict:
+    # change(manifest) mutates the manifest in place; it may run more than once
+    def mutate(body):
+        manifest = json.loads(body) if body is not None else empty_manifest(UUID)
+        before = json.dumps(manifest, sort_keys=True)
+        change(manifest)
+        if body is not None and json.dumps(manifest, sort_keys=True) == before:
+            return body
+        manifest["version"] += 1
+        manifest["updated_at"] = datetime.now(timezone.utc).isoformat(timespec="seconds")
+        return json.dumps(manifest, ensure_ascii=False).encode('utf-8')
+
+    return json.loads(s3_cas.read_modify_write(s3_client, bucket, manifest_key(UUID), mutate, **put_kwargs))
+
+def put_entry(manifest: dict, entry: dict):
+    # a retried turn replaces its previous entry
+    turns = [t for t in manifest["turns"] if t["turn"] != entry["turn"]] + [entry]
+    manifest["turns"] = sorted(turns, key=lambda t: t["turn"])
+
+def turn_entry(manifest: dict, turn: int):
+    return next((t for t in manifest["turns"] if t["turn"] == int(turn)), None)
+
+def add_segment(s3_client, bucket: str, UUID: str, turn: int, speaker: str, attempt: str, index: int, audio_key: str, size: int) -> dict:
+    segment = {"index": int(index), "audio": audio_key, "bytes": int(size)}
+
+    def change(manifest):
+        entry = turn_entry(manifest, turn)
+        if entry is None or entry.get("attempt") != attempt:
+            entry = {"turn": int(turn), "speaker": speaker, "attempt": attempt, "segments": []}
+            put_entry(manifest, entry)
+        if all(s["index"] != segment["index"] for s in entry["segments"]):
+            entry["segments"] = sorted(entry["segments"] + [segment], key=lambda s: s["index"])
+
+    return update(s3_client, bucket, UUID, change)
+
+def add_turn(s3_client, bucket: str, UUID: str, turn: int, speaker: str, audio_key: str, size: int, attempt: str = None) -> dict:
+    # attempt: the streamed turn whose segments stay listed next to the whole-turn audio
+    entry = {"turn": int(turn), "speaker": speaker, "audio": audio_key, "bytes": int(size)}
+
+    def change(manifest):
+        listed = turn_entry(manifest, turn)
+        if attempt is not None and listed is not None and listed.get("attempt") == attempt:
+            put_entry(manifest, {**listed, **entry})
+        else:
+            put_entry(manifest, entry)
+
+    return update(s3_client, bucket, UUID, change)
+
+def mark_ended(s3_client, bucket: str, UUID: str) -> dict:
+    def change(manifest):
+        manifest["ended"] = True
+
+    return update(s3_client, bucket, UUID, change)
@@ -1,9 +1,9 @@
-import boto3
+import aws_clients
 import logging
 
 # Initialize the API Gateway client
-apigateway_client = boto3.client('apigateway')
-cloudfront_client = boto3.client('cloudfront')
+apigateway_client = aws_clients.lazy('apigateway')
+cloudfront_client = aws_clients.lazy('cloudfront')
 distribution_id = 'EJTPZSTF964T0'
 api_key_name = 'ai-conversation-api-key'
 
@@ -1,62 +1,68 @@
-import boto3
-import random
+from concurrent.futures import ThreadPoolExecutor
+
+import aws_clients
+import aws_errors
+import play_index
+import replay_catalog
+import s3_fetch
 
 # Config
 bucket = "ai-conversation-frontend"
 outputs_prefix = "outputs/"
-table_name = "ai-conversation-play"  # Extracted from the ARN
-region = "us-east-1"                 # Extracted from the ARN
+table_name = replay_catalog.table_name
 
 # AWS clients/resources
-dynamodb = boto3.resource('dynamodb', region_name=region)
-table = dynamodb.Table(table_name)
-s3 = boto3.client('s3')
-
-def dynamo_table_empty():
-    response = table.scan(Limit=1)
-    return 'Items' not in response or len(response['Items']) == 0
-
-def list_s3_folders(prefix):
-    paginator = s3.get_paginator('list_objects_v2')
-    folders = set()
-    for page in paginator.paginate(Bucket=bucket, Prefix=prefix, Delimiter='/'):
-        if 'CommonPrefixes' in page:
-            for cp in page['CommonPrefixes']:
-                # Remove prefix and trailing slashes for folder name
-                folder = cp['Prefix'][len(prefix):].strip('/')
-                if folder:
-                    folders.add(folder)
-    return list(folders)
-
-def populate_dynamo_with_s3_folders():
-    folders = list_s3_folders(outputs_prefix)
-    print(f"Putting {len(folders)} folders in DynamoDB...")
-    with table.batch_writer() as batch:
-        for folder in folders:
-            batch.put_item(Item={'id': folder})
-
-def get_random_id_and_delete():
-    # DynamoDB scan to get all IDs. (For large tables, use pagination!)
-    all_items = []
-    response = table.scan(ProjectionExpression='id')
-    all_items.extend(response.get('Items', []))
-    # If table is big, we should handle pagination (not needed here)
-    
-    if not all_items:
-        print("No ids found in DynamoDB table.")
-        return None
+dynamodb = aws_clients.lazy('dynamodb', region_name=replay_catalog.region)
+s3 = aws_clients.lazy('s3')
+
+def has_end_marker(key):
+    try:
+        s3.head_object(Bucket=bucket, Key=key)
+        return True
+    except Exception as e:
+        if aws_errors.error_code(e) in ("NoSuchKey", "404"):
+            return False
+        raise
+
+def list_finished_conversations(prefix):
+    # Only conversations with an end marker: one delimited listing of the conversation
+    # folders (not of every turn, segment and trace object), then one HEAD per folder
+    folders = s3_fetch.list_prefixes(s3, bucket, prefix)
+    with ThreadPoolExecutor(max_workers=s3_fetch.max_workers) as executor:
+        return [folder for folder, ended in zip(folders, executor.map(lambda folder: has_end_marker(f"{prefix}{folder}/end"), folders)) if ended]
 
-    chosen = random.choice(all_items)
-    chosen_id = chosen['id']
-    table.delete_item(Key={'id': chosen_id})
+def populate_catalog_with_s3_folders():
+    # One-off migration for conversations finished before the catalog existed:
+    # ConversationFull records every new conversation as it completes
+    folders = list_finished_conversations(outputs_prefix)
+    print(f"Putting {len(folders)} finished conversations in the replay catalog...")
+    play_round = play_index.current_round(dynamodb, table_name)
+    play_index.batch_write(dynamodb, table_name, [{'PutRequest': {'Item': play_index.play_item(folder, play_round)}} for folder in folders])
+
+def get_random_id():
+    # O(1) pick through the random-sampling index (see play_index), no table scan;
+    # when every conversation has been played, a new round starts by bumping one counter
+    chosen_id = play_index.claim_random_id(dynamodb, table_name)
+    if chosen_id is None:
+        # a miss on a populated catalog is usually index propagation lag or a lost race: pick again
+        chosen_id = play_index.claim_random_id(dynamodb, table_name)
+    if chosen_id is None and not play_index.is_migrated(dynamodb, table_name):
+        # items from before the index: index them once; an empty catalog is migrated from S3
+        total, indexed = play_index.backfill_random_keys(dynamodb, table_name)
+        print(f"Catalog has {total} conversations, {indexed} added to the index")
+        if total == 0:
+            populate_catalog_with_s3_folders()
+        play_index.mark_migrated(dynamodb, table_name)
+        chosen_id = play_index.claim_random_id(dynamodb, table_name)
+
+    if chosen_id is None:
+        print("No ids found in DynamoDB table.")
     return chosen_id
 
 def lambda_handler(event, context):
-    if dynamo_table_empty():
-        populate_dynamo_with_s3_folders()
-    chosen_id = get_random_id_and_delete()
+    chosen_id = get_random_id()
     print(f"id: {chosen_id}")
     return {'id': chosen_id}
 
 if __name__ == "__main__":
-    print(lambda_handler({}, {}))
\ No newline at end of file
+    print(lambda_handler({}, {}))
@@ -0,0 +1,163 @@
+import random
+import time
+
+import aws_errors
+
+# Random-sampling index over the replay catalog: every conversation carries a "shard"
+# ("{round}#{n}", n one of `shards`) and a random "rand" key, indexed by the GSI
+# random_index (shard HASH, rand RANGE). A pick queries one random shard of the current
+# round from a random point with Limit=1, wrapping to the shard start, so its cost does not
+# depend on how many conversations are archived. Playing a conversation moves it to the
+# next round; once the current round is empty, bumping the round counter (one item) makes
+# the whole catalog playable again, without rewriting or relisting anything.
+random_index = "random-index"
+shards = 8
+pick_attempts = 8
+batch_size = 25
+round_id = "#round"
+# present once the catalog has been migrated to the index: the O(N) backfill runs at most once
+migrated_id = "#migrated"
+
+def random_rank() -> str:
+    return f"{random.getrandbits(64):016x}"
+
+def shard_key(play_round: int) -> str:
+    return f"{play_round}#{random.randrange(shards)}"
+
+def play_item(conversation_id: str, play_round: int = 0, **attributes) -> dict:
+    return {'id': {'S': conversation_id}, 'shard': {'S': shard_key(play_round)}, 'rand': {'S': random_rank()}, **attributes}
+
+def current_round(dynamodb_client, table: str) -> int:
+    response = dynamodb_client.get_item(TableName=table, Key={'id': {'S': round_id}}, ConsistentRead=True)
+    return int(response['Item']['round']['N']) if 'Item' in response else 0
+
+def advance_round(dynamodb_client, table: str, play_round: int):
+    # Conditional on the round we saw: concurrent pickers advance it once
+    try:
+        if play_round == 0:
+            dynamodb_client.put_item(TableName=table, Item={'id': {'S': round_id}, 'round': {'N': '1'}}, ConditionExpression="attribute_not_exists(id)")
+        else:
+            dynamodb_client.update_item(
+                TableName=table,
+                Key={'id': {'S': round_id}},
+                UpdateExpression="SET #round = :next",
+                ConditionExpression="#round = :current",
+                ExpressionAttributeNames={"#round": "round"},
+                ExpressionAttributeValues={":next": {'N': str(play_round + 1)}, ":current": {'N': str(play_round)}}
+            )
+    except Exception as e:
+        if aws_errors.error_code(e) != "ConditionalCheckFailedException":
+            raise
+
+def batch_write(dynamodb_client, table: str, requests: list):
+    # BatchWriteItem takes 25 requests; unprocessed ones are retried with backoff
+    for start in range(0, len(requests), batch_size):
+        pending = {table: requests[start:start + batch_size]}
+        attempt = 0
+        while pending:
+            response = dynamodb_client.batch_write_item(RequestItems=pending)
+            pending = response.get('UnprocessedItems') or {}
+            if pending:
+                time.sleep(random.uniform(0, 0.05 * 2 ** attempt))
+                attempt += 1
+
+def backfill_random_keys(dynamodb_client, table: str) -> tuple:
+    # Items written before the index existed are invisible to it: give them a shard and a rank.
+    # Returns (conversations in the table, conversations indexed now).
+    play_round = current_round(dynamodb_client, table)
+    requests = []
+    total = 0
+    scan_kwargs = {'TableName': table}
+    while True:
+        response = dynamodb_client.scan(**scan_kwargs)
+        for item in response.get('Items', []):
+            if item['id']['S'] in (round_id, migrated_id):
+                continue
+            total += 1
+            if 'rand' not in item:
+                requests.append({'PutRequest': {'Item': {**item, **play_item(item['id']['S'], play_round)}}})
+        if 'LastEvaluatedKey' not in response:
+            break
+        scan_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+    batch_write(dynamodb_client, table, requests)
+    return total, len(requests)
+
+def is_migrated(dynamodb_client, table: str) -> bool:
+    response = dynamodb_client.get_item(TableName=table, Key={'id': {'S': migrated_id}}, ConsistentRead=True)
+    return 'Item' in response
+
+def mark_migrated(dynamodb_client, table: str):
+    dynamodb_client.put_item(TableName=table, Item={'id': {'S': migrated_id}})
+
+def index_head(dynamodb_client, table: str, shard: str, start: str = None):
+    condition = "#shard = :shard"
+    values = {":shard": {"S": shard}}
+    if start is not None:
+        condition += " AND #rand >= :start"
+        values[":start"] = {"S": start}
+    response = dynamodb_client.query(
+        TableName=table,
+        IndexName=random_index,
+        KeyConditionExpression=condition,
+        ExpressionAttributeNames={"#shard": "shard", **({"#rand": "rand"} if start is not None else {})},
+        ExpressionAttributeValues=values,
+        Limit=1
+    )
+    items = response.get('Items', [])
+    return items[0] if items else None
+
+def pick_random_item(dynamodb_client, table: str, play_round: int):
+    # empty shards are skipped; None only when every shard of the round is empty
+    for shard in random.sample(range(shards), shards):
+        item = index_head(dynamodb_client, table, f"{play_round}#{shard}", random_rank()) or index_head(dynamodb_client, table, f"{play_round}#{shard}")
+        if item is not None:
+            return item
+    return None
+
+def claim(dynamodb_client, table: str, item: dict, play_round: int) -> bool:
+    # Moving the item to the next round is the claim: the index is eventually consistent
+    # and pickers race, the condition on its current shard decides who wins
+    try:
+        dynamodb_client.update_item(
+            TableName=table,
+            Key={'id': item['id']},
+            UpdateExpression="SET #shard = :next, #rand = :rand",
+            ConditionExpression="#shard = :current",
+            ExpressionAttributeNames={"#shard": "shard", "#rand": "rand"},
+            ExpressionAttributeValues={":next": {'S': shard_key(play_round + 1)}, ":rand": {'S': random_rank()}, ":current": item['shard']}
+        )
+        return True
+    except Exception as e:
+        if aws_errors.error_code(e) != "ConditionalCheckFailedException":
+            raise
+        return False
+
+def claim_random_id(dynamodb_client, table: str):
+    play_round = current_round(dynamodb_client, table)
+    advanced = False
+    for attempt in range(pick_attempts):
+        item = pick_random_item(dynamodb_client, table, play_round)
+        if item is None:
+            if advanced:
+                # the next round is empty too: nothing in the catalog
+                return None
+            # every conversation has been played this round: start the next one
+            advance_round(dynamodb_client, table, play_round)
+            play_round = current_round(dynamodb_client, table)
+            advanced = True
+            continue
+        if claim(dynamodb_client, table, item, play_round):
+            return item['id']['S']
+    return None
+
+def add_conversation(dynamodb_client, table: str, conversation_id: str, **attributes) -> bool:
+    # New conversations join the current round, so they are playable right away. Conditional:
+    # a conversation already in the catalog keeps its round and play state; False then.
+    play_round = current_round(dynamodb_client, table)
+    try:
+        dynamodb_client.put_item(TableName=table, Item=play_item(conversation_id, play_round, **attributes), ConditionExpression="attribute_not_exists(id)")
+    except Exception as e:
+        if aws_errors.error_code(e) != "ConditionalCheckFailedException":
+            raise
+        return False
+    return True
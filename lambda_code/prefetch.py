@@ -0,0 +1,59 @@
+import hashlib
+import html
+import json
+import logging
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import s3_cas
+
+logger = logging.getLogger(__name__)
+
+# Speculative prefetch of the next speaker's knowledge context, stored under the
+# conversation so the next speaker invocation can pick it up instead of running
+# abstract + retrieve on its critical path. A missing or mismatching record is a miss: the
+# record carries a digest of the text it was built from, and the next speaker only uses it
+# when that is the text it answers. A speaker turn rejected by Validation and retried may
+# leave a record built from the rejected text behind.
+wait_seconds = float(os.environ.get('prefetch_wait_seconds', '30'))
+executor = ThreadPoolExecutor(max_workers=2)
+
+def source_digest(text: str) -> str:
+    # words only: the next speaker's Input carries the text with SSML tags and escapes
+    words = re.findall(r"\w+", html.unescape(re.sub(r"<[^>]+>", " ", text)).lower())
+    return hashlib.md5(" ".join(words).encode('utf-8')).hexdigest()
+
+def prefetch_key(UUID: str, turn: int) -> str:
+    return f"outputs/{UUID}/prefetch/{turn}.json"
+
+def submit(fn, *args):
+    return executor.submit(fn, *args)
+
+def drain(futures: list):
+    # Lambda freezes the container once the handler returns: pending work must land first
+    done, not_done = wait(futures, timeout=wait_seconds)
+    for future in done:
+        if future.exception():
+            logger.warning("Prefetch failed: %s", future.exception())
+    if not_done:
+        logger.warning("%d prefetch task(s) still running after %ss, abandoned", len(not_done), wait_seconds)
+
+def store(s3_client, bucket: str, UUID: str, turn: int, knowledge_base_id: str, context: str, source: str):
+    # source: the speaker text the context was built from
+    record = {"turn": int(turn), "knowledgeBaseId": knowledge_base_id, "source": source_digest(source), "context": context}
+    s3_client.put_object(Bucket=bucket, Key=prefetch_key(UUID, turn), Body=json.dumps(record, ensure_ascii=False))
+
+def load(s3_client, bucket: str, UUID: str, turn: int, knowledge_base_id: str, answered: str):
+    # answered: the previous speaker's text, as the next speaker receives it
+    try:
+        body, _ = s3_cas.read_object(s3_client, bucket, prefetch_key(UUID, turn))
+    except Exception as e:
+        logger.warning("Prefetch read failed: %s", e)
+        return None
+    if body is None:
+        return None
+    record = json.loads(body)
+    if record.get("knowledgeBaseId") != knowledge_base_id or record.get("source") != source_digest(answered):
+        return None
+    return record["context"]
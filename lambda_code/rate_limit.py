@@ -0,0 +1,87 @@
+import logging
+import random
+import threading
+import time
+
+import aws_errors
+
+logger = logging.getLogger(__name__)
+
+# Client-side rate limiting for Bedrock / Polly calls shared by worker threads.
+# The refill rate adapts AIMD-style: halved on every throttling error, raised by a
+# fixed step after each success up to max_rate, so the pool settles just under the account
+# quota. Without a max_rate the limiter never goes above its starting rate.
+throttling_codes = {"ThrottlingException", "throttlingException", "Throttling", "TooManyRequestsException", "ServiceQuotaExceededException", "SlowDown", "429"}
+
+def is_throttling(e: BaseException) -> bool:
+    # Agent and stream errors may arrive wrapped: follow args and chained exceptions
+    seen = set()
+    pending = [e]
+    while pending:
+        error = pending.pop()
+        if error is None or id(error) in seen:
+            continue
+        seen.add(id(error))
+        if aws_errors.error_code(error) in throttling_codes or type(error).__name__ in throttling_codes:
+            return True
+        pending.extend(arg for arg in error.args if isinstance(arg, BaseException))
+        pending.extend([error.__cause__, error.__context__])
+    return False
+
+class AdaptiveTokenBucket:
+    def __init__(self, rate: float, burst: float = 1, min_rate: float = 0.1, max_rate: float = None, increase: float = 0.05, max_attempts: int = 5, backoff_seconds: float = 1.0):
+        self.rate = rate
+        self.burst = burst
+        self.min_rate = min_rate
+        self.max_rate = max_rate if max_rate is not None else rate
+        self.increase = increase
+        self.max_attempts = max_attempts
+        self.backoff_seconds = backoff_seconds
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+        self.stats = {"calls": 0, "throttled": 0, "waited_seconds": 0.0}
+
+    def _refill(self, now: float):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    self.stats["calls"] += 1
+                    return
+                delay = (1 - self.tokens) / self.rate
+                self.stats["waited_seconds"] += delay
+            time.sleep(delay)
+
+    def on_success(self):
+        with self.lock:
+            self.rate = min(self.max_rate, self.rate + self.increase)
+
+    def on_throttle(self):
+        with self.lock:
+            self.rate = max(self.min_rate, self.rate / 2)
+            # drop the burst as well: the other workers should slow down right away
+            self.tokens = min(self.tokens, 0)
+            self.stats["throttled"] += 1
+            logger.warning("Throttled, rate lowered to %.2f/s", self.rate)
+
+    def call(self, fn, *args, **kwargs):
+        for attempt in range(self.max_attempts):
+            self.acquire()
+            try:
+                result = fn(*args, **kwargs)
+            except Exception as e:
+                if not is_throttling(e) or attempt == self.max_attempts - 1:
+                    raise
+                self.on_throttle()
+                delay = self.backoff_seconds * 2 ** attempt
+                time.sleep(random.uniform(delay / 2, delay))
+                continue
+            self.on_success()
+            return result
@@ -0,0 +1,88 @@
+import logging
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+import play_index
+import s3_fetch
+import transcript
+
+logger = logging.getLogger(__name__)
+
+# Replay catalog: one compact record per finished conversation, written once by the
+# ConversationFull step (id, topic, turns, audio bytes and duration, created_at). Conversations
+# that never finish are never listed; play.py picks from it through play_index. The table
+# lives in one region: the writer and the player build their clients from `region`.
+table_name = os.environ.get('replay_catalog_table', 'ai-conversation-catalog')
+region = os.environ.get('replay_catalog_region', 'us-east-1')
+audio_key_pattern = re.compile(r'^outputs/[^/]+/(\d+)\.mp3$')
+header_bytes = 4096
+
+# Layer III bitrates in kbit/s by bitrate index: MPEG-1, then MPEG-2 / 2.5
+mp3_bitrates = {
+    3: (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    2: (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160)
+}
+
+def mp3_bitrate(data: bytes):
+    # Bitrate in bit/s of the first frame (providers encode CBR), None if none is found
+    start = 0
+    if data[:3] == b"ID3" and len(data) >= 10:
+        start = 10 + ((data[6] & 0x7f) << 21 | (data[7] & 0x7f) << 14 | (data[8] & 0x7f) << 7 | (data[9] & 0x7f))
+    for i in range(start, len(data) - 3):
+        if data[i] == 0xff and data[i + 1] & 0xe0 == 0xe0:
+            version = (data[i + 1] >> 3) & 3
+            layer = (data[i + 1] >> 1) & 3
+            index = data[i + 2] >> 4
+            if layer == 1 and version != 1 and 0 < index < 15:
+                return mp3_bitrates[3 if version == 3 else 2][index] * 1000
+    return None
+
+def audio_seconds(s3_client, bucket: str, sizes: dict, speakers: dict) -> float:
+    # One ranged GET per voice, not per turn: each speaker's turns share an encoding
+    first_keys = {}
+    for key in sorted(sizes):
+        first_keys.setdefault(speakers.get(key), key)
+
+    def bitrate(key):
+        response = s3_client.get_object(Bucket=bucket, Key=key, Range=f"bytes=0-{header_bytes - 1}")
+        return mp3_bitrate(response['Body'].read())
+
+    with ThreadPoolExecutor(max_workers=max(1, len(first_keys))) as executor:
+        bitrates = dict(zip(first_keys, executor.map(bitrate, first_keys.values())))
+
+    seconds = 0.0
+    for key, size in sizes.items():
+        rate = bitrates.get(speakers.get(key))
+        if rate:
+            seconds += size * 8 / rate
+    return round(seconds, 1)
+
+def build_record(s3_client, bucket: str, UUID: str, turns: list, created_at: str) -> dict:
+    # turns: transcript entries, the topic included
+    sizes = {key: size for key, size in s3_fetch.list_sizes(s3_client, bucket, f"outputs/{UUID}/", suffix='.mp3').items() if audio_key_pattern.match(key)}
+    speakers = {f"outputs/{UUID}/{t['turn']}.mp3": t["speaker"] for t in turns}
+    topic = next((t["text"] for t in turns if t["turn"] == transcript.topic_turn), "")
+    return {
+        "id": UUID,
+        "topic": topic,
+        # conversations older than the transcript log: one audio file per turn
+        "turns": sum(1 for t in turns if t["turn"] != transcript.topic_turn) or len(sizes),
+        "audio_bytes": sum(sizes.values()),
+        "audio_seconds": audio_seconds(s3_client, bucket, sizes, speakers) if sizes else 0.0,
+        "created_at": created_at
+    }
+
+def record_conversation(dynamodb_client, s3_client, bucket: str, UUID: str, turns: list, created_at: str, table: str = table_name) -> dict:
+    # Idempotent: a retried ConversationFull leaves the existing record and its play state alone
+    record = build_record(s3_client, bucket, UUID, turns, created_at)
+    added = play_index.add_conversation(
+        dynamodb_client, table, UUID,
+        topic={'S': record["topic"]},
+        turns={'N': str(record["turns"])},
+        audio_bytes={'N': str(record["audio_bytes"])},
+        audio_seconds={'N': str(record["audio_seconds"])},
+        created_at={'S': record["created_at"]}
+    )
+    logger.info("Replay catalog%s: %s", "" if added else " (already recorded)", record)
+    return record
@@ -0,0 +1,34 @@
+import random
+import time
+
+from aws_errors import error_code
+
+# Conditional writes (If-Match / If-None-Match) make read-modify-write of small
+# shared objects safe when the step function retries or two writers race.
+max_attempts = 5
+conflict_codes = {"PreconditionFailed", "ConditionalRequestConflict", "412", "409"}
+
+def read_object(s3_client, bucket: str, key: str):
+    try:
+        response = s3_client.get_object(Bucket=bucket, Key=key)
+    except Exception as e:
+        if error_code(e) in ("NoSuchKey", "404"):
+            return None, None
+        raise
+    return response['Body'].read(), response['ETag']
+
+def read_modify_write(s3_client, bucket: str, key: str, mutate, **put_kwargs) -> bytes:
+    # mutate(body or None) -> new body (bytes); it may run more than once
+    for attempt in range(max_attempts):
+        body, etag = read_object(s3_client, bucket, key)
+        new_body = mutate(body)
+        condition = {"IfMatch": etag} if etag else {"IfNoneMatch": "*"}
+        try:
+            s3_client.put_object(Bucket=bucket, Key=key, Body=new_body, **condition, **put_kwargs)
+            return new_body
+        except Exception as e:
+            if error_code(e) not in conflict_codes:
+                raise
+            time.sleep(random.uniform(0, 0.05 * 2 ** attempt))
+
+    raise RuntimeError(f"Concurrent updates on s3://{bucket}/{key}, gave up after {max_attempts} attempts")
@@ -0,0 +1,61 @@
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+# Shared S3 fetch layer: paginated listings (no silent truncation at 1000 keys)
+# and concurrent GETs from a bounded thread pool; boto3 clients are thread safe.
+max_workers = 8
+turn_number_pattern = re.compile(r'/(\d+)\.[^/]*$')
+
+def list_keys(s3_client, bucket: str, prefix: str, suffix: str = None) -> list:
+    keys = []
+    paginator = s3_client.get_paginator('list_objects_v2')
+    for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+        for obj in page.get('Contents', []):
+            key = obj['Key']
+            if not key.endswith('/') and (suffix is None or key.endswith(suffix)):
+                keys.append(key)
+    return keys
+
+def list_sizes(s3_client, bucket: str, prefix: str, suffix: str = None) -> dict:
+    # {key: size in bytes}, from the same paginated listing as list_keys
+    sizes = {}
+    paginator = s3_client.get_paginator('list_objects_v2')
+    for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+        for obj in page.get('Contents', []):
+            key = obj['Key']
+            if not key.endswith('/') and (suffix is None or key.endswith(suffix)):
+                sizes[key] = obj['Size']
+    return sizes
+
+def list_prefixes(s3_client, bucket: str, prefix: str) -> list:
+    # Immediate "sub-folders" of prefix, without the prefix and trailing slash
+    folders = []
+    paginator = s3_client.get_paginator('list_objects_v2')
+    for page in paginator.paginate(Bucket=bucket, Prefix=prefix, Delimiter='/'):
+        for cp in page.get('CommonPrefixes', []):
+            folder = cp['Prefix'][len(prefix):].strip('/')
+            if folder:
+                folders.append(folder)
+    return folders
+
+def turn_order(key: str):
+    # Named objects (topic.txt) first, then numbered turns in numeric order (2 before 10)
+    match = turn_number_pattern.search(key)
+    if match:
+        return (1, int(match.group(1)), key)
+    return (0, 0, key)
+
+def fetch_objects(s3_client, bucket: str, keys: list, workers: int = max_workers) -> list:
+    # Bodies are returned in the order of keys, whatever order the GETs complete in
+    def fetch(key):
+        return s3_client.get_object(Bucket=bucket, Key=key)['Body'].read()
+
+    if len(keys) <= 1:
+        return [fetch(key) for key in keys]
+    with ThreadPoolExecutor(max_workers=min(workers, len(keys))) as executor:
+        return list(executor.map(fetch, keys))
+
+def fetch_transcripts(s3_client, bucket: str, prefix: str, exclude: tuple = (), workers: int = max_workers):
+    keys = sorted((key for key in list_keys(s3_client, bucket, prefix, suffix='.txt') if key not in exclude), key=turn_order)
+    bodies = fetch_objects(s3_client, bucket, keys, workers)
+    return keys, [body.decode('utf-8') for body in bodies]
@@ -0,0 +1,91 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# Per-stage timing for one handler invocation, emitted as a single CloudWatch Embedded Metric
+# Format line: every stage is a metric in milliseconds (a list when the stage ran several
+# times, e.g. one TTS call per streamed sentence) under the Handler dimension, and the tags
+# (UUID, Turn, ...) are log properties, searchable in Logs Insights without adding metric
+# cardinality. Lambda runs one invocation per container at a time, so the active trace is
+# module state: stages recorded from worker threads land in it too, and calls outside a
+# trace are no-ops.
+namespace = os.environ.get('metrics_namespace', 'AIConversation')
+enabled = os.environ.get('metrics_enabled', 'true').lower() == 'true'
+max_values = 100
+
+class Trace:
+    def __init__(self, handler: str, **tags):
+        self.handler = handler
+        self.tags = tags
+        self.values = {}
+        self.started = time.perf_counter()
+        self.lock = threading.Lock()
+
+    def record(self, stage: str, milliseconds: float):
+        with self.lock:
+            self.values.setdefault(stage, []).append(round(milliseconds, 1))
+
+    def documents(self) -> list:
+        # EMF takes up to 100 values per metric and line: longer lists span several lines
+        self.record("total", (time.perf_counter() - self.started) * 1000)
+        with self.lock:
+            values = {stage: list(v) for stage, v in self.values.items()}
+        timestamp = int(time.time() * 1000)
+        documents = []
+        for start in range(0, max(len(v) for v in values.values()), max_values):
+            page = {stage: v[start:start + max_values] for stage, v in values.items() if v[start:start + max_values]}
+            documents.append({
+                "_aws": {
+                    "Timestamp": timestamp,
+                    "CloudWatchMetrics": [{
+                        "Namespace": namespace,
+                        "Dimensions": [["Handler"]],
+                        "Metrics": [{"Name": stage, "Unit": "Milliseconds"} for stage in page]
+                    }]
+                },
+                "Handler": self.handler,
+                **{key: value for key, value in self.tags.items() if value is not None},
+                **{stage: v[0] if len(v) == 1 else v for stage, v in page.items()}
+            })
+        return documents
+
+active = None
+
+def start(handler: str, **tags) -> Trace:
+    global active
+    active = Trace(handler, **tags)
+    return active
+
+def record(stage: str, milliseconds: float):
+    trace = active
+    if trace is not None:
+        trace.record(stage, milliseconds)
+
+@contextmanager
+def span(stage: str):
+    # times the block, also when it raises
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(stage, (time.perf_counter() - started) * 1000)
+
+def agent_metrics(stage: str, latency: bool = False):
+    # on_metrics callback for bedrock_agent calls: time to first chunk, and the whole call
+    # when it is not timed by a span (a streamed answer is consumed while TTS runs)
+    def on_metrics(metrics: dict):
+        if latency:
+            record(stage, metrics["latency_ms"])
+        if metrics.get("ttfc_ms") is not None:
+            record(f"{stage}_ttfc", metrics["ttfc_ms"])
+    return on_metrics
+
+def emit():
+    # EMF lines on stdout: the Lambda log agent turns them into metrics
+    global active
+    trace, active = active, None
+    if trace is not None and enabled:
+        for document in trace.documents():
+            print(json.dumps(document, default=str), flush=True)
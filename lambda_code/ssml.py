@@ -0,0 +1,145 @@
+import re
+from xml.etree import ElementTree as ET
+
+# Shared SSML helpers. Patterns and value sets are built once at import. A complete response is
+# parsed by the C tree builder and walked once.
+speak_pattern = re.compile(r"<speak>(.*?)</speak>", re.DOTALL)
+volume_pattern = re.compile(r"^[+-]\d+dB$")
+rate_pattern = re.compile(r"^\d+%$")
+time_pattern = re.compile(r"^\d+(ms|s)$")
+
+valid_prosody_attributes = frozenset({"volume", "rate"})
+valid_volume = frozenset({"silent", "x-soft", "soft", "medium", "loud", "x-loud"})
+valid_rate = frozenset({"x-slow", "slow", "medium", "fast", "x-fast"})
+
+def escape(text: str) -> str:
+    # xml.sax.saxutils.escape without its import cost: saxutils pulls in urllib.request,
+    # http.client, email and ssl
+    return text.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+
+def extract_speak_content(input_text):
+    match = speak_pattern.search(input_text)
+    if match:
+        return f"<speak>{match.group(1).strip()}</speak>"
+    return None
+
+def prosody_errors(attributes) -> list:
+    errors = []
+
+    # Check if <prosody> has unexpected attributes
+    for attr_name in attributes.keys():
+        if attr_name not in valid_prosody_attributes:
+            errors.append(f"Invalid attribute '{attr_name}' in <prosody>. Only 'rate' and 'volume' are allowed.")
+
+    if "rate" not in attributes and "volume" not in attributes:
+        errors.append("<prosody> must have at least one attribute: 'rate' or 'volume'.")
+        return errors
+
+    if "volume" in attributes:
+        attr_value = attributes["volume"]
+        if not (attr_value in valid_volume or volume_pattern.match(attr_value)):
+            errors.append(f"Invalid volume value: {attr_value}")
+
+    if "rate" in attributes:
+        attr_value = attributes["rate"]
+        if not (attr_value in valid_rate or rate_pattern.match(attr_value)):
+            errors.append(f"Invalid rate value: {attr_value}")
+
+    return errors
+
+def break_errors(attributes, has_content: bool) -> list:
+    # Ensure <break> is self-closing
+    if has_content:
+        return ["<break> must be a self-closing tag."]
+
+    if "time" in attributes:
+        if not time_pattern.match(attributes["time"]):
+            return [f"Invalid time value in <break>: {attributes['time']}"]
+        return []
+    return ["Missing required 'time' attribute in <break>."]
+
+def validate_ssml(ssml_text):
+    try:
+        root = ET.fromstring(ssml_text)
+    except ET.ParseError:
+        return False, ["Invalid XML structure."]
+
+    # 1. Verify presence of <speak> tag wrapping all text
+    if root.tag != "speak":
+        return False, ["<speak> and </speak> tags must wrap all text."]
+
+    error_messages = []
+    for elem in root.iter():
+        tag = elem.tag
+        if tag == "p":
+            if elem.text is None and len(elem) == 0:
+                error_messages.append("<p> element must not be empty.")
+        elif tag == "prosody":
+            error_messages.extend(prosody_errors(elem.attrib))
+        elif tag == "break":
+            error_messages.extend(break_errors(elem.attrib, elem.text is not None or len(elem) > 0))
+
+    return len(error_messages) == 0, error_messages
+
+# Local rule-based generation: a deterministic alternative to the SSML agent that only emits the
+# subset validate_ssml accepts (<speak>, <p>, <break time>, <prosody rate|volume>).
+# Paragraphs become <p>, sentence punctuation drives the pauses, short questions are slowed
+# down, short exclamations and *markdown emphasis* are spoken louder.
+paragraph_pattern = re.compile(r"\n\s*\n")
+sentence_pattern = re.compile(r"\S.*?(?:[.!?…]+[\"')\]]*(?=\s|$)|$)", re.DOTALL)
+closing_pattern = re.compile(r"[\"')\]]+$")
+emphasis_pattern = re.compile(r"\*{1,2}([^*\n]+?)\*{1,2}")
+dash_pattern = re.compile(r"\s+[—–]\s+")
+whitespace_pattern = re.compile(r"\s+")
+
+pause_after = {"?": "500ms", "!": "300ms", "…": "500ms", "...": "500ms"}
+dash_pause = "200ms"
+max_question_words = 12
+max_exclamation_words = 8
+
+def sentence_ending(sentence: str) -> str:
+    sentence = closing_pattern.sub("", sentence)
+    if sentence.endswith("...") or sentence.endswith("…"):
+        return "..." if sentence.endswith("...") else "…"
+    return sentence[-1:]
+
+def markup_sentence(sentence: str) -> str:
+    ending = sentence_ending(sentence)
+    words = len(sentence.split())
+    text = dash_pattern.sub(f" <break time='{dash_pause}'/> ", escape(sentence))
+
+    # the whole sentence is already emphasized: drop inner markers rather than nest prosody
+    if ending == "?" and words <= max_question_words:
+        return "<prosody rate='slow'>" + emphasis_pattern.sub(r"\1", text) + "</prosody>"
+    if ending == "!" and words <= max_exclamation_words:
+        return "<prosody volume='loud'>" + emphasis_pattern.sub(r"\1", text) + "</prosody>"
+    return emphasis_pattern.sub(r"<prosody volume='loud'>\1</prosody>", text)
+
+def markup_paragraph(paragraph: str) -> str:
+    sentences = sentence_pattern.findall(whitespace_pattern.sub(" ", paragraph).strip())
+    parts = []
+    for index, sentence in enumerate(sentences):
+        parts.append(markup_sentence(sentence))
+        pause = pause_after.get(sentence_ending(sentence))
+        # no pause after the last sentence: the paragraph or </speak> already ends it
+        if pause and index < len(sentences) - 1:
+            parts.append(f"<break time='{pause}'/>")
+    return " ".join(parts)
+
+def generate_ssml(text: str):
+    # Returns None when there is nothing to speak, so callers can fall back to the SSML agent
+    paragraphs = [markup_paragraph(paragraph) for paragraph in paragraph_pattern.split(text.strip())]
+    paragraphs = [paragraph for paragraph in paragraphs if paragraph]
+    if not paragraphs:
+        return None
+    if len(paragraphs) == 1:
+        return f"<speak>{paragraphs[0]}</speak>"
+    return "<speak>" + "".join(f"<p>{paragraph}</p>" for paragraph in paragraphs) + "</speak>"
+
+def generation_mode(config: dict, agent_name: str = None) -> str:
+    # "ssml_generation" ("agent" or "local") is either one mode for every agent or a map of
+    # agent name to mode, with an optional "default" entry
+    mode = config.get("ssml_generation", "agent")
+    if isinstance(mode, dict):
+        mode = mode.get(agent_name, mode.get("default", "agent"))
+    return mode
@@ -1,32 +1,24 @@
 import json
-import boto3
+import aws_clients
 import logging
 import random
 import botocore
+import transcript
+import s3_fetch
+import topic_queue
 
 logging.basicConfig(format='[%(asctime)s] {%(filename)s:%(lineno)d} %(message)s', level=logging.INFO)
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
-s3_client = boto3.client('s3')
+s3_client = aws_clients.lazy('s3')
 bucket = 'ai-conversation-frontend'
 
 def get_inputs():
-  inputs = []
-  response = s3_client.list_objects_v2(Bucket=bucket, Prefix="inputs/")
-
-  inputs = [
-        obj['Key'] for obj in response.get('Contents', [])
-        if obj['Key'].endswith('.txt') and not obj['Key'].endswith('/')
-    ]
-
+  inputs = s3_fetch.list_keys(s3_client, bucket, "inputs/", suffix='.txt')
   return inputs, len(inputs)
 
 def get_uploads():
-  inputs = []
-  response = s3_client.list_objects_v2(Bucket=bucket, Prefix="uploads/")
-
-  inputs = [obj['Key'] for obj in response.get('Contents', []) if not obj['Key'].endswith('/')]
-
+  inputs = s3_fetch.list_keys(s3_client, bucket, "uploads/")
   return inputs, len(inputs)
 
 def get_random_input_and_clean(inputs, inputs_count, uuid):
@@ -38,10 +30,21 @@ def get_random_input_and_clean(inputs, inputs_count, uuid):
   body = response['Body'].read().decode('utf-8').strip()
 
   push_topic_and_clean(key, uuid)
+  transcript.append_turn(s3_client, bucket, uuid, transcript.topic_turn, "Topic", body)
 
   #push_announce_and_clean(key.replace(".txt", ".mp3"), uuid)
   return body
 
+def claim_queued_topic(queue, uuid):
+  claimed = queue.claim()
+  if claimed is None:
+    return None
+
+  #the text is stored inline: no GET or COPY; the consumed topic leaves the ingestion index
+  s3_client.delete_object(Bucket=bucket, Key=f"inputs/{claimed['topic_id']}.txt")
+  transcript.append_turn(s3_client, bucket, uuid, transcript.topic_turn, "Topic", claimed["text"])
+  return claimed["text"]
+
 def push_announce_and_clean(key, uuid):
     copy_source = {'Bucket': bucket, 'Key': key}
     dest_key = f"outputs/{uuid}/0.mp3"
@@ -67,10 +70,9 @@ def push_topic_and_clean(key, uuid):
 def force_new_uploads(uploads, uploads_count):
   if uploads_count == 0:
     return None
-  
-  for key in uploads:
-    response = s3_client.get_object(Bucket=bucket, Key=key)
-    body = response['Body'].read()
+
+  bodies = s3_fetch.fetch_objects(s3_client, bucket, uploads)
+  for key, body in zip(uploads, bodies):
     s3_client.put_object(Bucket=bucket, Key=key, Body=body)
 
   return 0
@@ -81,6 +83,16 @@ def get_random_start_speaker():
 
 def lambda_handler(event, context):
   logger.info(f"Event: {event}")
+
+  #atomic claim from the topic queue when a table is configured
+  queue = topic_queue.get_queue()
+  if queue is not None:
+    topic = claim_queued_topic(queue, event["UUID"])
+    logger.info(f"Claimed topic: {topic}")
+    if topic is not None:
+      return {'Topic': topic, 'StartSpeaker': get_random_start_speaker(), 'End': False}
+    #topics uploaded before the queue existed are only in S3: drain them from the listing
+    logger.info("Topic queue empty, falling back to the S3 listing")
   
   inputs, inputs_count = get_inputs()
   logger.info(f"Inputs count: {inputs_count}")
@@ -1,28 +1,22 @@
 import json
-import boto3
+import aws_clients
 import logging
 import random
+import s3_fetch
+import topic_queue
 
 logging.basicConfig(format='[%(asctime)s] {%(filename)s:%(lineno)d} %(message)s', level=logging.INFO)
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
-s3_client = boto3.client('s3')
+s3_client = aws_clients.lazy('s3')
 bucket = 'ai-conversation-frontend'
 
 def get_inputs():
-  inputs = []
-  response = s3_client.list_objects_v2(Bucket=bucket, Prefix="inputs/")
-
-  inputs = [obj['Key'] for obj in response.get('Contents', []) if not obj['Key'].endswith('/')]
-
+  inputs = s3_fetch.list_keys(s3_client, bucket, "inputs/", suffix='.txt')
   return inputs, len(inputs)
 
 def get_uploads():
-  inputs = []
-  response = s3_client.list_objects_v2(Bucket=bucket, Prefix="uploads/")
-
-  inputs = [obj['Key'] for obj in response.get('Contents', []) if not obj['Key'].endswith('/')]
-
+  inputs = s3_fetch.list_keys(s3_client, bucket, "uploads/")
   return inputs, len(inputs)
 
 def get_random_input_and_clean(inputs, inputs_count):
@@ -53,6 +47,17 @@ def get_random_start_speaker():
 
 def lambda_handler(event, context):
   logger.info(f"Event: {event}")
+
+  #atomic claim from the topic queue when a table is configured
+  queue = topic_queue.get_queue()
+  if queue is not None:
+    claimed = queue.claim()
+    if claimed is not None:
+      s3_client.delete_object(Bucket=bucket, Key=f"inputs/{claimed['topic_id']}.txt")
+      logger.info(f"Claimed topic: {claimed['text']}")
+      return {'Topic': claimed['text'], 'StartSpeaker': get_random_start_speaker()}
+    #topics uploaded before the queue existed are only in S3: drain them, then recycle the uploads
+    logger.info("Topic queue empty, falling back to the S3 listing")
   
   inputs, inputs_count = get_inputs()
   logger.info(f"Inputs count: {inputs_count}")
@@ -1,39 +1,22 @@
 import json
-import boto3
+import os
+import aws_clients
 import logging
 import re
+import bedrock_agent
+import spans
+import stop_context
+import stop_filter
+import trace_capture
 
-logging.basicConfig(format='[%(asctime)s] {%(filename)s:%(lineno)d} %(levelname)s - %(message)s', level=logging.ERROR)
+logging.basicConfig(format='[%(asctime)s] {%(filename)s:%(lineno)d} %(levelname)s - %(message)s', level=os.environ.get('log_level', 'INFO'))
 logger = logging.getLogger(__name__)
-bedrock_agent_runtime_client = boto3.client('bedrock-agent-runtime')
-s3_client = boto3.client('s3')
+bedrock_agent_runtime_client = aws_clients.lazy('bedrock-agent-runtime', profile=aws_clients.agent_profile)
+s3_client = aws_clients.lazy('s3')
+s3_bucket_name = 'ai-conversation-matteo-mus-eu-west-1-992382403092'
 
 def agent(input: str, agent: dict, conversation_params: dict) -> str:
-    agentResponse = bedrock_agent_runtime_client.invoke_agent(
-        inputText=input,
-        agentId=agent['agentId'],
-        agentAliasId=agent['agentAliasId'],
-        sessionId=conversation_params['session_id'],
-        enableTrace=conversation_params['enable_trace'], 
-        endSession=conversation_params['end_session']
-    )
-    logger.error(f"AGENT RESPONSE: {agentResponse}")
-
-    event_stream = agentResponse['completion']
-    agent_answer = ""
-    try:
-        for event in event_stream:        
-            if 'chunk' in event:
-                data = event['chunk']['bytes']
-                agent_answer += data.decode('utf8')  # Accumulate response chunks
-            elif 'trace' in event:
-                logger.info(json.dumps(event['trace'], indent=2))
-            else:
-                raise Exception("Unexpected event.", event)
-    except Exception as e:
-        raise Exception("Unexpected event.", e)
-
-    return agent_answer.strip()
+    return bedrock_agent.complete(bedrock_agent_runtime_client, bedrock_agent.agent_request(input, agent, conversation_params, prompt_creation=False), on_metrics=spans.agent_metrics("stop_llm"))
 
 def get_stop_from_tags(input_str):
     # Define the regex pattern to match content inside <STOP> and </STOP> tags
@@ -62,41 +45,73 @@ def extract_reasoning(text: str) -> str:
     return outside_text
 
 def lambda_handler(event, context):
+    #per-stage timings of this evaluation, one metrics line at the end
+    spans.start("stop", UUID=event.get('UUID'), Turn=event.get('Turn'))
+    #agent traces of a sampled turn, one compressed object at the end
+    trace_capture.start(s3_client, s3_bucket_name, event.get('UUID'), event.get('Turn'), "stop", event.get('ConversationParams', {}))
+    try:
+        return evaluate(event)
+    finally:
+        with spans.span("trace_drain"):
+            trace_capture.finish()
+        spans.emit()
+
+def evaluate(event):
     #print input
-    logger.error(f"EVENT: {event}")
+    logger.debug("EVENT: %s", event)
 
     #vars
-    s3_bucket_name = 'ai-conversation-matteo-mus-eu-west-1-992382403092'
     s3_folder_name = f"outputs/{event['UUID']}"
     max_retries = 2  # Maximum number of retries for agent response generation
     retry_attempts = 0
     response_text = None
     full_conversation = event['ConversationHistory']
 
+    #local pre-filter: only ambiguous turns reach the Stop agent
+    filter_settings = stop_filter.settings(event['ConversationParams'])
+    filter_result = None
+    if filter_settings["enabled"]:
+        with spans.span("stop_filter"):
+            filter_result = stop_filter.decide(stop_context.split_history(full_conversation), int(event['Turn']), filter_settings)
+        # one JSON line per decision: count "decision" values to measure the agent calls saved
+        logger.info("STOP FILTER: %s", json.dumps({'UUID': event['UUID'], 'Turn': int(event['Turn']), **filter_result}))
+        if filter_result["decision"] != "escalate":
+            return {
+                "stop": filter_result["decision"] == "stop",
+                "reasoning": f"<reasoning>{filter_result['reason']}</reasoning>"
+            }
+
     #evaluate minimum number of turns
-    if int(event['Turn']) < 3:
-        logger.error("Number of turn under minimun required")
+    elif int(event['Turn']) < 3:
+        logger.info("Number of turn under minimun required")
         return {
             "stop": False,
             "reasoning": f"<reasoning></reasoning>"
         }
 
-    #get conversation history
+    #get conversation history: the whole of it, or a rolling summary plus the last turns
+    context_settings = stop_context.settings(event['ConversationParams'])
+    if context_settings["mode"] == "incremental":
+        with spans.span("stop_context"):
+            full_conversation = stop_context.bounded_history(s3_client, s3_bucket_name, event['UUID'], full_conversation, context_settings["recent_turns"], context_settings["token_budget"])
     conversation_history = f"<conversation_history>{full_conversation}</conversation_history>"
-    logger.error(conversation_history)
+    logger.debug("%s", conversation_history)
     
     # Retry logic for agent response generation
     while retry_attempts < max_retries:
         try:
             # Generate agent response
-            response_text = agent(conversation_history, event['Stop'], event['ConversationParams'])
-            logger.error(f"RESPONSE TEXT ATTEMPT #{retry_attempts}: {response_text}")
+            with spans.span("stop_llm"):
+                response_text = agent(conversation_history, event['Stop'], event['ConversationParams'])
+            logger.debug("RESPONSE TEXT ATTEMPT #%d: %s", retry_attempts, response_text)
 
             # Check and return stop condition
             stop = get_stop_from_tags(response_text)
 
             #get reasoning
             reasoning = extract_reasoning(response_text)
+            if filter_result is not None:
+                logger.info("STOP FILTER ESCALATED: %s", json.dumps({'UUID': event['UUID'], 'Turn': int(event['Turn']), 'score': filter_result['score'], 'stop': stop}))
             
             return {
                 "stop": stop,
@@ -105,11 +120,11 @@ def lambda_handler(event, context):
         except ValueError as ve:
             # Handle missing <STOP> tags specifically
             retry_attempts += 1
-            logger.error(f"<STOP> tag extraction failed (attempt #{retry_attempts}): {ve}")
+            logger.warning("<STOP> tag extraction failed (attempt #%d): %s", retry_attempts, ve)
         except Exception as e:
             # Handle other agent-related errors
             retry_attempts += 1
-            logger.error(f"Agent failed (attempt #{retry_attempts}): {e}")
+            logger.warning("Agent failed (attempt #%d): %s", retry_attempts, e)
 
     # If reached, agent generation failed after retries
     logger.error("Max retries reached while attempting to generate a valid response.")
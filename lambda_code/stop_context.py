@@ -0,0 +1,110 @@
+import json
+import re
+
+import s3_cas
+import transcript
+
+# Bounded Stop context: instead of the whole history, the Stop agent gets a rolling summary of
+# the older turns plus the last `recent_turns` turns verbatim, within `token_budget` tokens.
+# The summary is extractive (no extra model call): each turn leaving the recent window adds
+# one line with its lead sentences, once, and is persisted next to the transcript so the
+# next invocation only processes the newest turn.
+summary_name = "stop_summary.json"
+default_recent_turns = 4
+default_token_budget = 2000
+summary_words_per_turn = 40
+sentence_pattern = re.compile(r'(?<=[.!?…])\s+')
+whitespace_pattern = re.compile(r'\s+')
+
+def settings(conversation_params: dict) -> dict:
+    # ConversationParams.stop_context: {"mode": "full" | "incremental", "recent_turns", "token_budget"}
+    config = conversation_params.get("stop_context", {})
+    return {
+        "mode": config.get("mode", "full"),
+        "recent_turns": int(config.get("recent_turns", default_recent_turns)),
+        "token_budget": int(config.get("token_budget", default_token_budget))
+    }
+
+def estimate_tokens(text: str) -> int:
+    # ~4 characters per token for English prose: good enough for budgeting
+    return (len(text) + 3) // 4
+
+def summary_key(UUID: str) -> str:
+    return f"outputs/{UUID}/{summary_name}"
+
+def split_history(conversation_history: str) -> list:
+    # ConversationHistory as rendered by transcript.render_history: topic first, then every turn
+    return [text.strip() for text in conversation_history.split(transcript.separator) if text.strip()]
+
+def summarize_turn(text: str, words: int = summary_words_per_turn) -> str:
+    # Lead sentences up to `words` words: the claim a debate turn opens with
+    text = whitespace_pattern.sub(' ', text).strip()
+    summary = []
+    count = 0
+    for sentence in sentence_pattern.split(text):
+        sentence_words = sentence.split()
+        if count and count + len(sentence_words) > words:
+            break
+        summary.append(" ".join(sentence_words[:words - count]))
+        count += len(sentence_words)
+        if count >= words:
+            break
+    return " ".join(summary)
+
+def load_summary(s3_client, bucket: str, UUID: str) -> dict:
+    body, _ = s3_cas.read_object(s3_client, bucket, summary_key(UUID))
+    if body is None:
+        return {"summarized": 0, "lines": []}
+    return json.loads(body)
+
+def update_summary(summary: dict, turns: list, recent_turns: int) -> bool:
+    # Folds every turn that left the recent window into the summary; True if it changed.
+    # turns[0] is the topic, it is always kept apart.
+    older = turns[1:max(1, len(turns) - recent_turns)]
+    if summary["summarized"] > len(older):
+        # shorter history than the saved summary (a retried turn): rebuild from scratch
+        summary["summarized"], summary["lines"] = 0, []
+    new_turns = older[summary["summarized"]:]
+    for offset, text in enumerate(new_turns, start=summary["summarized"] + 1):
+        summary["lines"].append(f"Turn {offset}: {summarize_turn(text)}")
+    summary["summarized"] = len(older)
+    return bool(new_turns)
+
+def render(topic: str, summary_lines: list, recent: list, token_budget: int) -> str:
+    # Recent turns first claim the budget (newest first), then summary lines (newest first)
+    parts_recent = []
+    used = estimate_tokens(topic)
+    for text in reversed(recent):
+        cost = estimate_tokens(text)
+        if parts_recent and used + cost > token_budget:
+            break
+        parts_recent.insert(0, text)
+        used += cost
+    dropped = recent[:len(recent) - len(parts_recent)]
+
+    lines = summary_lines + [f"Turn (recent): {summarize_turn(text)}" for text in dropped]
+    kept = []
+    for line in reversed(lines):
+        cost = estimate_tokens(line)
+        if used + cost > token_budget:
+            break
+        kept.insert(0, line)
+        used += cost
+
+    omitted = len(lines) - len(kept)
+    summary = "\n".join(([f"({omitted} earlier turns omitted)"] if omitted else []) + kept)
+    sections = [f"Topic: {topic}"]
+    if summary:
+        sections.append(f"Summary of earlier turns:\n{summary}")
+    sections.extend(parts_recent)
+    return transcript.separator.join(sections)
+
+def bounded_history(s3_client, bucket: str, UUID: str, conversation_history: str, recent_turns: int, token_budget: int) -> str:
+    turns = split_history(conversation_history)
+    if not turns:
+        return conversation_history
+    summary = load_summary(s3_client, bucket, UUID)
+    if update_summary(summary, turns, recent_turns):
+        s3_client.put_object(Bucket=bucket, Key=summary_key(UUID), Body=json.dumps(summary, ensure_ascii=False), ContentType='application/json')
+    recent = turns[max(1, len(turns) - recent_turns):]
+    return render(turns[0], summary["lines"], recent, token_budget)
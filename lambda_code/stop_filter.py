@@ -0,0 +1,75 @@
+import re
+
+# Local pre-filter for the Stop step: scores the newest turn without a model call and only
+# escalates to the Stop agent when the score is ambiguous. Signals, each in [0, 1]:
+#   closing     closing remarks in the last turn ("in conclusion", "thank you for the debate")
+#   repetition  highest word overlap of the last turn with any earlier turn (going in circles)
+#   convergence word overlap of the last two turns (speakers echoing each other)
+#   progress    turn / max_turns; at max_turns the conversation stops without asking
+word_pattern = re.compile(r"[a-zà-ÿ']+")
+closing_pattern = re.compile(
+    r"\b(in conclusion|to conclude|to sum up|to summari[sz]e|in closing|in summary|all in all|"
+    r"(let's|let us) (wrap|close|end)|final (thought|word|remark)s?|"
+    r"thank(s| you) for (this|the|a|our) (debate|discussion|conversation|exchange)|"
+    r"(it|this) (was|has been) a pleasure|we (seem to |both |all )?agree|common ground|goodbye)\b",
+    re.IGNORECASE
+)
+stopwords = frozenset(
+    "the a an and or but if of to in on at by for with from as is are was were be been being it its this that these "
+    "those i you he she we they me him her us them my your our their not no so than then there here what which who "
+    "whom how why when where all any both each more most other some such can could will would should may might must "
+    "do does did have has had just also very into about over only own same too".split()
+)
+weights = {"closing": 0.45, "repetition": 0.25, "convergence": 0.15, "progress": 0.15}
+closing_saturation = 2
+
+def settings(conversation_params: dict) -> dict:
+    # ConversationParams.stop_filter: {"enabled", "min_turns", "max_turns", "continue_below", "stop_above"}
+    config = conversation_params.get("stop_filter", {})
+    return {
+        "enabled": bool(config.get("enabled", False)),
+        "min_turns": int(config.get("min_turns", 3)),
+        "max_turns": int(config.get("max_turns", 30)),
+        "continue_below": float(config.get("continue_below", 0.3)),
+        "stop_above": float(config.get("stop_above", 0.8))
+    }
+
+def content_words(text: str) -> set:
+    return {word for word in word_pattern.findall(text.lower()) if word not in stopwords and len(word) > 2}
+
+def overlap(a: set, b: set) -> float:
+    # Jaccard similarity
+    return len(a & b) / len(a | b) if a and b else 0.0
+
+def signals(turns: list, turn: int, max_turns: int) -> dict:
+    # turns: the history split per turn, topic first (see stop_context.split_history)
+    spoken = turns[1:]
+    if not spoken:
+        return dict.fromkeys(weights, 0.0)
+    last = content_words(spoken[-1])
+    earlier = [content_words(text) for text in spoken[:-1]]
+    return {
+        "closing": min(1.0, len(closing_pattern.findall(spoken[-1])) / closing_saturation),
+        "repetition": max((overlap(last, words) for words in earlier[:-1]), default=0.0),
+        "convergence": overlap(last, earlier[-1]) if earlier else 0.0,
+        "progress": min(1.0, turn / max_turns) if max_turns else 0.0
+    }
+
+def score(turn_signals: dict) -> float:
+    return round(min(1.0, sum(weights[name] * value for name, value in turn_signals.items())), 3)
+
+def decide(turns: list, turn: int, config: dict) -> dict:
+    # {"decision": "continue" | "stop" | "escalate", "score", "signals", "reason"}
+    turn_signals = signals(turns, turn, config["max_turns"])
+    turn_score = score(turn_signals)
+    if turn < config["min_turns"]:
+        decision, reason = "continue", f"turn {turn} is under the minimum of {config['min_turns']}"
+    elif config["max_turns"] and turn >= config["max_turns"]:
+        decision, reason = "stop", f"turn {turn} reached the maximum of {config['max_turns']}"
+    elif turn_score < config["continue_below"]:
+        decision, reason = "continue", f"no closing remarks or repetition (score {turn_score})"
+    elif turn_score >= config["stop_above"]:
+        decision, reason = "stop", f"closing remarks and repeated arguments (score {turn_score})"
+    else:
+        decision, reason = "escalate", f"ambiguous score {turn_score}"
+    return {"decision": decision, "score": turn_score, "signals": {name: round(value, 3) for name, value in turn_signals.items()}, "reason": reason}
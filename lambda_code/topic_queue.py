@@ -0,0 +1,143 @@
+import logging
+import os
+import random
+import time
+
+import aws_errors
+
+logger = logging.getLogger(__name__)
+
+# Topic queue on a DynamoDB table (partition key "shard", sort key "rank", both strings),
+# with the topic text stored inline. A claim is one Query (Limit=1) plus one conditional
+# DeleteItem that returns the deleted item: whoever deletes it owns the topic, so two
+# executions can never start the same topic, and the cost does not grow with the queue.
+#   random:   rank is the topic hash (uniform), claims seek from a random rank in a random shard
+#   fifo:     rank is the enqueue time, claims take the oldest head across shards
+#   priority: rank is the inverted priority, then the enqueue time
+# Ordered policies read the head of every shard, so they default to a single shard (one Query
+# per claim); more shards spread writes at the cost of one Query per shard on every claim.
+# When the queue is empty, the start handlers fall back to listing inputs/ in S3, which
+# drains topics uploaded before the queue was configured.
+table_name = os.environ.get('topic_queue_table', '')
+policy = os.environ.get('topic_queue_policy', 'random')
+shards = int(os.environ.get('topic_queue_shards', '16' if policy == 'random' else '1'))
+policies = ("random", "fifo", "priority")
+max_priority = 9999
+claim_attempts = 8
+
+class TopicQueue:
+    def __init__(self, dynamodb_client, table: str = table_name, policy: str = policy, shards: int = shards):
+        if policy not in policies:
+            raise ValueError(f"Unknown topic queue policy: {policy}")
+        self.client = dynamodb_client
+        self.table = table
+        self.policy = policy
+        self.shards = shards
+
+    def shard_of(self, topic_id: str) -> str:
+        return str(int(topic_id[:8], 16) % self.shards)
+
+    def rank_of(self, topic_id: str, priority: int, enqueued_at: int) -> str:
+        if self.policy == "random":
+            return topic_id
+        if self.policy == "fifo":
+            return f"{enqueued_at:020d}#{topic_id}"
+        return f"{max_priority - priority:04d}#{enqueued_at:020d}#{topic_id}"
+
+    def enqueue(self, topic_id: str, text: str, priority: int = 0) -> bool:
+        # topic_id is a hex digest of the text; False if the same item is already queued
+        enqueued_at = time.time_ns()
+        try:
+            self.client.put_item(
+                TableName=self.table,
+                Item={
+                    "shard": {"S": self.shard_of(topic_id)},
+                    "rank": {"S": self.rank_of(topic_id, priority, enqueued_at)},
+                    "topic_id": {"S": topic_id},
+                    "text": {"S": text},
+                    "priority": {"N": str(priority)},
+                    "enqueued_at": {"N": str(enqueued_at)}
+                },
+                ConditionExpression="attribute_not_exists(#rank)",
+                ExpressionAttributeNames={"#rank": "rank"}
+            )
+            return True
+        except Exception as e:
+            if aws_errors.error_code(e) == "ConditionalCheckFailedException":
+                return False
+            raise
+
+    def head(self, shard: str, start: str = None, limit: int = 1) -> list:
+        # First items of a shard at or after start
+        condition = "#shard = :shard"
+        values = {":shard": {"S": shard}}
+        if start is not None:
+            condition += " AND #rank >= :start"
+            values[":start"] = {"S": start}
+        response = self.client.query(
+            TableName=self.table,
+            KeyConditionExpression=condition,
+            ExpressionAttributeNames={"#shard": "shard", **({"#rank": "rank"} if start is not None else {})},
+            ExpressionAttributeValues=values,
+            Limit=limit
+        )
+        return response.get("Items", [])
+
+    def delete(self, item: dict):
+        # Atomic claim: only one caller gets the old item back
+        try:
+            response = self.client.delete_item(
+                TableName=self.table,
+                Key={"shard": item["shard"], "rank": item["rank"]},
+                ConditionExpression="attribute_exists(#rank)",
+                ExpressionAttributeNames={"#rank": "rank"},
+                ReturnValues="ALL_OLD"
+            )
+        except Exception as e:
+            if aws_errors.error_code(e) == "ConditionalCheckFailedException":
+                return None
+            raise
+        return response.get("Attributes")
+
+    def pick(self, attempt: int = 0):
+        if self.policy == "random":
+            # a random seek point in a random shard, wrapping to the shard start; empty shards are skipped
+            order = random.sample(range(self.shards), self.shards)
+            for shard in order:
+                items = self.head(str(shard), f"{random.getrandbits(128):032x}") or self.head(str(shard))
+                if items:
+                    return items[0]
+            return None
+
+        # concurrent claimers all see the same head: after a lost race, pick among the first few
+        width = attempt + 1
+        heads = [item for shard in range(self.shards) for item in self.head(str(shard), limit=width)]
+        heads.sort(key=lambda item: item["rank"]["S"])
+        return random.choice(heads[:width]) if heads else None
+
+    def claim(self):
+        # {"topic_id", "text", "priority"} of the claimed topic, None when the queue is empty
+        for attempt in range(claim_attempts):
+            item = self.pick(attempt)
+            if item is None:
+                return None
+            claimed = self.delete(item)
+            if claimed is not None:
+                return {
+                    "topic_id": claimed["topic_id"]["S"],
+                    "text": claimed["text"]["S"],
+                    "priority": int(claimed["priority"]["N"])
+                }
+            logger.info("Topic %s claimed concurrently, retrying", item['topic_id']['S'])
+            time.sleep(random.uniform(0, 0.01 * 2 ** attempt))
+        raise RuntimeError(f"Could not claim a topic after {claim_attempts} attempts")
+
+_queue = None
+
+def get_queue():
+    # None when no table is configured: callers keep the S3 prefix listing
+    global _queue
+    if _queue is None and table_name:
+        import aws_clients
+        _queue = TopicQueue(aws_clients.client('dynamodb'))
+    return _queue
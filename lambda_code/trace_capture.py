@@ -0,0 +1,106 @@
+import gzip
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+logger = logging.getLogger(__name__)
+
+# Out-of-band Bedrock trace capture: agent calls are made with enableTrace only for a
+# sampled turn, and their trace events are buffered in memory, then written as one gzipped
+# JSON Lines object per handler and turn (outputs/{UUID}/traces/{Turn}-{handler}.jsonl.gz)
+# from a background thread, instead of being formatted into the logs inside the completion
+# loop. enable_trace in ConversationParams samples every turn. Sampling is decided per
+# conversation turn (a hash of UUID and Turn), so the speaker and the Stop evaluation of
+# the same turn are captured together. Like spans, the capture is module state: calls
+# outside a sampled turn are no-ops.
+default_sample_rate = 0.0
+wait_seconds = float(os.environ.get('trace_wait_seconds', '10'))
+executor = ThreadPoolExecutor(max_workers=1)
+
+def settings(conversation_params: dict) -> dict:
+    # ConversationParams.trace_capture: {"sample_rate": 0..1}; enable_trace captures every turn
+    if conversation_params.get("enable_trace", False):
+        return {"sample_rate": 1.0}
+    config = conversation_params.get("trace_capture", {})
+    return {"sample_rate": float(config.get("sample_rate", default_sample_rate))}
+
+def sampled(UUID: str, turn: int, sample_rate: float) -> bool:
+    if sample_rate <= 0:
+        return False
+    digest = hashlib.md5(f"{UUID}:{int(turn)}".encode("utf8")).digest()
+    return int.from_bytes(digest[:8], "big") / 2 ** 64 < sample_rate
+
+def trace_key(UUID: str, turn: int, handler: str, part: int = 0) -> str:
+    suffix = f"-{part}" if part else ""
+    return f"outputs/{UUID}/traces/{int(turn)}-{handler}{suffix}.jsonl.gz"
+
+def write(s3_client, bucket: str, key: str, events: list):
+    body = gzip.compress("".join(json.dumps(event, ensure_ascii=False, default=str) + "\n" for event in events).encode("utf8"))
+    s3_client.put_object(Bucket=bucket, Key=key, Body=body, ContentType="application/gzip")
+
+class Capture:
+    def __init__(self, s3_client, bucket: str, UUID: str, turn: int, handler: str):
+        self.s3_client = s3_client
+        self.bucket = bucket
+        self.UUID = UUID
+        self.turn = int(turn)
+        self.handler = handler
+        self.events = []
+        self.parts = 0
+        self.pending = []
+        self.lock = threading.Lock()
+
+    def add(self, agent_id: str, trace: dict):
+        with self.lock:
+            self.events.append({"time": time.time(), "agent": agent_id, "trace": trace})
+
+    def flush(self):
+        # hands the buffered events to the writer; events added later go to the next part
+        with self.lock:
+            events, self.events = self.events, []
+            if not events:
+                return
+            key = trace_key(self.UUID, self.turn, self.handler, self.parts)
+            self.parts += 1
+        self.pending.append(executor.submit(write, self.s3_client, self.bucket, key, events))
+
+active = None
+
+def start(s3_client, bucket: str, UUID: str, turn: int, handler: str, conversation_params: dict):
+    global active
+    active = None
+    if UUID is not None and turn is not None and sampled(UUID, turn, settings(conversation_params)["sample_rate"]):
+        active = Capture(s3_client, bucket, UUID, turn, handler)
+    return active
+
+def capturing() -> bool:
+    return active is not None
+
+def add(agent_id: str, trace: dict):
+    capture = active
+    if capture is not None:
+        capture.add(agent_id, trace)
+
+def flush():
+    # called once the agent calls of a turn are done, so the write overlaps the rest of it
+    capture = active
+    if capture is not None:
+        capture.flush()
+
+def finish():
+    # Lambda freezes the container once the handler returns: pending writes must land first
+    global active
+    capture, active = active, None
+    if capture is None:
+        return
+    capture.flush()
+    done, not_done = wait(capture.pending, timeout=wait_seconds)
+    for future in done:
+        if future.exception():
+            logger.warning("Trace capture write failed: %s", future.exception())
+    if not_done:
+        logger.warning("%d trace capture write(s) still running after %ss, abandoned", len(not_done), wait_seconds)
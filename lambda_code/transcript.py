@@ -0,0 +1,45 @@
+import json
+import re
+
+import s3_cas
+
+# Append-only turn log: outputs/{UUID}/transcript.jsonl, one JSON line per turn
+transcript_name = "transcript.jsonl"
+separator = "\n--------------------\n"
+tag_pattern = re.compile(r'<[^>]*>')
+topic_turn = -1
+
+def transcript_key(UUID: str) -> str:
+    return f"outputs/{UUID}/{transcript_name}"
+
+def strip_tags(text: str) -> str:
+    return tag_pattern.sub('', text).strip()
+
+def parse_turns(body: bytes) -> list:
+    return [json.loads(line) for line in body.decode('utf-8').splitlines() if line]
+
+def append_turn(s3_client, bucket: str, UUID: str, turn: int, speaker: str, text: str):
+    entry = {"turn": int(turn), "speaker": speaker, "text": strip_tags(text)}
+    line = json.dumps(entry, ensure_ascii=False)
+
+    def append(body):
+        if body is None:
+            return (line + "\n").encode('utf-8')
+        turns = parse_turns(body)
+        if all(t["turn"] < entry["turn"] for t in turns):
+            return body + (line + "\n").encode('utf-8')
+        # a retried turn replaces its previous entry, so the log stays idempotent
+        turns = sorted([t for t in turns if t["turn"] != entry["turn"]] + [entry], key=lambda t: t["turn"])
+        return "".join(json.dumps(t, ensure_ascii=False) + "\n" for t in turns).encode('utf-8')
+
+    s3_cas.read_modify_write(s3_client, bucket, transcript_key(UUID), append, ContentType="application/x-ndjson")
+
+def read_turns(s3_client, bucket: str, UUID: str):
+    # None when the conversation predates the transcript log
+    body, _ = s3_cas.read_object(s3_client, bucket, transcript_key(UUID))
+    if body is None:
+        return None
+    return parse_turns(body)
+
+def render_history(turns: list) -> str:
+    return "".join(t["text"] + separator for t in turns)
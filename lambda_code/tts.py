@@ -0,0 +1,196 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+import threading
+from collections import OrderedDict
+
+import s3_cas
+
+logger = logging.getLogger(__name__)
+
+elevenlabs_model = "eleven_multilingual_v2"
+elevenlabs_output_format = "mp3_44100_128"
+polly_engine = "neural"
+polly_output_format = "mp3"
+
+# Two-tier audio cache, content-addressed on provider + voice + model + format + canonical SSML:
+# an S3 prefix, optionally fronted by an LRU of files under /tmp that survives warm invocations
+# (off by default: audio otherwise streams from the provider to S3 without touching disk)
+cache_prefix = os.environ.get('audio_cache_prefix', 'audio-cache/')
+local_cache_dir = os.environ.get('audio_cache_local_dir', '/tmp/audio-cache')
+local_cache_max_bytes = int(os.environ.get('audio_cache_local_max_bytes', '0'))
+
+# Provider response bodies are piped into S3 in bounded chunks; multipart above the threshold
+upload_chunk_bytes = int(os.environ.get('audio_upload_chunk_bytes', str(8 * 1024 * 1024)))
+upload_max_concurrency = 2
+
+whitespace_pattern = re.compile(r'\s+')
+attribute_pattern = re.compile(r"""(\w+)\s*=\s*(['"])(.*?)\2""")
+tag_space_pattern = re.compile(r'\s*(/?>)')
+
+def voice_params(agent: dict) -> dict:
+    if "voice_elevenlabs" in agent and agent["voice_elevenlabs"] != "":
+        return {"provider": "elevenlabs", "voice": agent["voice_elevenlabs"], "model": elevenlabs_model, "output_format": elevenlabs_output_format}
+    return {"provider": "polly", "voice": agent['voice'], "model": polly_engine, "output_format": polly_output_format}
+
+def canonical_ssml(ssml: str) -> str:
+    # Formatting-only differences (whitespace, quote style) must map to the same audio
+    text = whitespace_pattern.sub(' ', ssml).strip()
+    text = attribute_pattern.sub(lambda m: f'{m.group(1)}="{m.group(3)}"', text)
+    return tag_space_pattern.sub(r'\1', text)
+
+def cache_key(body: str, agent: dict) -> str:
+    params = voice_params(agent)
+    material = json.dumps([params["provider"], params["voice"], params["model"], params["output_format"], canonical_ssml(body)], ensure_ascii=False)
+    return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+class LocalAudioCache:
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.size = 0
+        self.lock = threading.Lock()
+
+    def get(self, key: str):
+        with self.lock:
+            if key not in self.entries:
+                return None
+            self.entries.move_to_end(key)
+            return os.path.join(self.directory, f"{key}.mp3")
+
+    def put(self, key: str, filename: str) -> str:
+        # Moves the file into the cache and returns its new path
+        size = os.path.getsize(filename)
+        if size > self.max_bytes:
+            os.remove(filename)
+            return None
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, f"{key}.mp3")
+        shutil.move(filename, path)
+        with self.lock:
+            self.size += size - self.entries.pop(key, 0)
+            self.entries[key] = size
+            while self.size > self.max_bytes:
+                evicted, evicted_size = self.entries.popitem(last=False)
+                self.size -= evicted_size
+                try:
+                    os.remove(os.path.join(self.directory, f"{evicted}.mp3"))
+                except FileNotFoundError:
+                    pass
+        return path
+
+local_cache = LocalAudioCache(local_cache_dir, local_cache_max_bytes)
+cache_stats = {"local": 0, "s3": 0, "miss": 0}
+_transfer_config = None
+
+class TeeReader:
+    # Read-only, non-seekable view of a stream that copies every chunk to sinks
+    def __init__(self, stream, sinks: list):
+        self.stream = stream
+        self.sinks = sinks
+
+    def read(self, size: int = -1) -> bytes:
+        data = self.stream.read(size) if size is not None and size >= 0 else self.stream.read()
+        for sink in self.sinks:
+            sink.write(data)
+        return data
+
+    def seekable(self) -> bool:
+        return False
+
+def transfer_config():
+    global _transfer_config
+    if _transfer_config is None:
+        from boto3.s3.transfer import TransferConfig
+        _transfer_config = TransferConfig(
+            multipart_threshold=upload_chunk_bytes,
+            multipart_chunksize=upload_chunk_bytes,
+            max_concurrency=upload_max_concurrency
+        )
+    return _transfer_config
+
+def open_audio_stream(polly_client, body: str, agent: dict):
+    # File-like audio body straight from the provider, not read yet
+    if "voice_elevenlabs" in agent and agent["voice_elevenlabs"] != "":
+        # imported on first use: Polly-only containers never load the ElevenLabs client
+        import elevenlabs
+        res = elevenlabs.get_client().text_to_speech(agent["voice_elevenlabs"], body, elevenlabs_model, elevenlabs_output_format)
+        if res.status != 200:
+            error = res.read()[:200]
+            raise Exception(f"Could not synthesize speech from text: ElevenLabs {res.status} {error!r}")
+        return res
+    else:
+        response = polly_client.synthesize_speech(
+            Text=body,
+            OutputFormat=polly_output_format,
+            Engine=polly_engine,
+            TextType='ssml',
+            VoiceId=agent['voice']
+        )
+
+        if 'AudioStream' in response:
+            return response['AudioStream']
+        else:
+            raise Exception("Could not synthesize speech from text.")
+
+def copy_from_cache(s3_client, bucket: str, audio_key: str, key: str) -> bool:
+    try:
+        s3_client.copy_object(CopySource={'Bucket': bucket, 'Key': f"{cache_prefix}{audio_key}.mp3"}, Bucket=bucket, Key=key)
+        return True
+    except Exception as e:
+        if s3_cas.error_code(e) in ("NoSuchKey", "404"):
+            return False
+        raise
+
+def synthesize_to_s3(polly_client, s3_client, body: str, agent: dict, bucket: str, key: str, tee=None) -> bool:
+    # tee: optional writable that receives the audio bytes when they pass through this container.
+    # Returns True if it did, False on a server-side S3 cache hit (bytes never left S3).
+    audio_key = cache_key(body, agent)
+
+    filename = local_cache.get(audio_key)
+    if filename and os.path.exists(filename):
+        cache_stats["local"] += 1
+        if not copy_from_cache(s3_client, bucket, audio_key, key):
+            # S3 tier expired (lifecycle rule): restore it from the local copy
+            s3_client.upload_file(filename, bucket, f"{cache_prefix}{audio_key}.mp3")
+            copy_from_cache(s3_client, bucket, audio_key, key)
+        logger.debug("Audio cache hit (local) %s -> %s %s", audio_key, key, cache_stats)
+        if tee is None:
+            return False
+        with open(filename, 'rb') as cached:
+            shutil.copyfileobj(cached, tee)
+        return True
+
+    if copy_from_cache(s3_client, bucket, audio_key, key):
+        cache_stats["s3"] += 1
+        logger.debug("Audio cache hit (s3) %s -> %s %s", audio_key, key, cache_stats)
+        return False
+
+    cache_stats["miss"] += 1
+    logger.debug("Audio cache miss %s -> %s %s", audio_key, key, cache_stats)
+    sinks = [] if tee is None else [tee]
+    local_file = None
+    if local_cache.max_bytes > 0:
+        os.makedirs(local_cache.directory, exist_ok=True)
+        local_file = open(os.path.join(local_cache.directory, f"{audio_key}-{threading.get_ident()}.part"), 'wb')
+        sinks.append(local_file)
+
+    audio_stream = None
+    try:
+        audio_stream = open_audio_stream(polly_client, body, agent)
+        s3_client.upload_fileobj(TeeReader(audio_stream, sinks), bucket, key, ExtraArgs={'ContentType': 'audio/mpeg'}, Config=transfer_config())
+    finally:
+        # also returns a fully read ElevenLabs connection to its pool
+        if audio_stream is not None:
+            audio_stream.close()
+        if local_file is not None:
+            local_file.close()
+
+    s3_client.copy_object(CopySource={'Bucket': bucket, 'Key': key}, Bucket=bucket, Key=f"{cache_prefix}{audio_key}.mp3")
+    if local_file is not None:
+        local_cache.put(audio_key, local_file.name)
+    return tee is not None
@@ -1,216 +1,96 @@
 import json
-import boto3
+import aws_clients
 import logging
-import io
-import hashlib
-import http.client
+import os
 import re
-from xml.etree import ElementTree as ET
+import time
 import uuid
-from time import sleep
-
-logging.basicConfig(format='[%(asctime)s] {%(filename)s:%(lineno)d} %(message)s', level=logging.INFO)
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import rate_limit
+import spans
+import bedrock_agent
+import ingest
+import topic_queue
+import tts
+from ssml import extract_speak_content, validate_ssml, generate_ssml, generation_mode
+
+logging.basicConfig(format='[%(asctime)s] {%(filename)s:%(lineno)d} %(message)s', level=os.environ.get('log_level', 'INFO'))
 logger = logging.getLogger(__name__)
-logger.setLevel(logging.INFO)
-s3_client = boto3.client('s3')
-bedrock_agent_runtime_client = boto3.client('bedrock-agent-runtime')
-polly_client = boto3.client('polly')
+logger.setLevel(os.environ.get('log_level', 'INFO'))
+s3_client = aws_clients.lazy('s3')
+bedrock_agent_runtime_client = aws_clients.lazy('bedrock-agent-runtime', profile=aws_clients.agent_profile)
+polly_client = aws_clients.lazy('polly')
+lambda_client = aws_clients.lazy('lambda')
 bucket = 'ai-conversation-frontend'
 dst_prefix = 'inputs/'
 
-def agent(input: str, agent: dict) -> str:
-   
-   agentResponse = bedrock_agent_runtime_client.invoke_agent(
-        inputText=f"The topic to announce is: {input}",
-        agentId=agent['agentId'],
-        agentAliasId=agent['agentAliasId'],
-        sessionId=str(uuid.uuid4()),
-        enableTrace=False, 
-        endSession=False
-   )
-   logger.info(f"AGENT RESPONSE: {agentResponse}")
-
-   event_stream = agentResponse['completion']
-   agent_answer = ""
-   try:
-         for event in event_stream:        
-            if 'chunk' in event:
-                data = event['chunk']['bytes']
-                agent_answer += data.decode('utf8')  # Accumulate response chunks
-            elif 'trace' in event:
-                logger.error(json.dumps(event['trace'], indent=2))
-            else:
-                raise Exception("Unexpected event.", event)
-   except Exception as e:
-        raise Exception("Unexpected event.", e)
-
-   return agent_answer.strip()
-
-def synthesize(body: str, agent: dict, audio_name: str):
-    filename = f"/tmp/{audio_name}"
-
-    if "voice_elevenlabs" in agent and agent["voice_elevenlabs"] != "":
-        conn = http.client.HTTPSConnection("api.elevenlabs.io")
-
-        payload = json.dumps({
-            "text": body,
-            "model_id": "eleven_multilingual_v2"
-        })
-
-        headers = {
-            'xi-api-key': 'sk_01dcae060a644561ae2b4feaa0007090c5ad869d4299eb8d',
-            'Content-Type': 'application/json'
-        }
-
-        conn.request("POST", f"/v1/text-to-speech/{agent['voice_elevenlabs']}?output_format=mp3_44100_128", payload, headers)
-
-        res = conn.getresponse()
-        data = res.read()
-
-        # Save the mp3 response content to a file
-        with open(filename, "wb") as f:
-            f.write(data)
-
-        return filename
-    else:
-        response = polly_client.synthesize_speech(
-            Text=body,
-            OutputFormat='mp3',
-            Engine="neural",
-            TextType='ssml',
-            VoiceId=agent['voice']
-        )
-        
-        if 'AudioStream' in response:
-            with open(filename, 'wb') as file:
-                file.write(response['AudioStream'].read())        
-            return filename
-        else:
-            raise Exception("Could not synthesize speech from text.")
-
-def extract_speak_content(input_text):
-    match = re.search(r"<speak>(.*?)</speak>", input_text, re.DOTALL)
-    if match:
-        return f"<speak>{match.group(1).strip()}</speak>"
-    return None
-
-def validate_ssml(ssml_text):
-    error_messages = []
-
-    try:
-        # Parse the SSML text into an XML tree
-        tree = ET.ElementTree(ET.fromstring(ssml_text))
-        root = tree.getroot()
-    except ET.ParseError:
-        error_messages.append("Invalid XML structure.")
-        return False, error_messages
-
-    # 1. Verify presence of <speak> tag wrapping all text
-    if root.tag != "speak":
-        error_messages.append("<speak> and </speak> tags must wrap all text.")
-        return False, error_messages
-
-    # Define helper functions for validation
-    def validate_prosody_attributes(attributes):
-        valid_attributes = {"volume", "rate"}
-        valid_volume = {"silent", "x-soft", "soft", "medium", "loud", "x-loud"}
-        valid_rate = {"x-slow", "slow", "medium", "fast", "x-fast"}
-
-        # Check if <prosody> has unexpected attributes
-        for attr_name in attributes.keys():
-            if attr_name not in valid_attributes:
-                error_messages.append(f"Invalid attribute '{attr_name}' in <prosody>. Only 'rate' and 'volume' are allowed.")
+# Topics are announced by a bounded worker pool; Bedrock and Polly calls from all workers
+# share one token bucket that slows down when the services throttle
+announce_workers = int(os.environ.get('announce_workers', '4'))
+announce_rate_per_second = float(os.environ.get('announce_rate_per_second', '2'))
+# the quota the rate may climb back up to after throttling, above the conservative start
+announce_max_rate_per_second = float(os.environ.get('announce_max_rate_per_second', '10'))
+announce_attempts = 2
+# topics per checkpoint: an announce takes seconds, so a batch stays a fraction of the time
+# reserve, and a batch cut short by the deadline is redone without much lost work
+announce_batch_size = int(os.environ.get('announce_batch_size', str(announce_workers * 2)))
+limiter = rate_limit.AdaptiveTokenBucket(rate=announce_rate_per_second, burst=announce_workers, max_rate=announce_max_rate_per_second)
 
-        has_rate = "rate" in attributes
-        has_volume = "volume" in attributes
-
-        # If neither or both attributes are missing, add error
-        if not has_rate and not has_volume:
-            error_messages.append("<prosody> must have at least one attribute: 'rate' or 'volume'.")
-            return
-
-        if "volume" in attributes:
-            attr_value = attributes["volume"]
-            if not (attr_value in valid_volume or re.match(r"^[+-]\d+dB$", attr_value)):
-                error_messages.append(f"Invalid volume value: {attr_value}")
-
-        if "rate" in attributes:
-            attr_value = attributes["rate"]
-            if not (attr_value in valid_rate or re.match(r"^\d+%$", attr_value)):
-                error_messages.append(f"Invalid rate value: {attr_value}")
-
-    def validate_break_structure(elem):
-        # Ensure <break> is self-closing
-        if elem.text is not None or len(elem) > 0:
-            error_messages.append("<break> must be a self-closing tag.")
-            return
-
-        # Validate <break> attributes
-        attributes = elem.attrib
-        if "time" in attributes:
-            if not re.match(r"^\d+(ms|s)$", attributes["time"]):
-                error_messages.append(f"Invalid time value in <break>: {attributes['time']}")
-        else:
-            error_messages.append("Missing required 'time' attribute in <break>.")
-
-    # 2. Traverse the tree and validate elements
-    for elem in tree.iter():
-        # Validate <speak> content (already verified by the root check)
-
-        # Check for <p> tag
-        if elem.tag == "p":
-            if elem.text is None and len(elem) == 0:
-                error_messages.append("<p> element must not be empty.")
-
-        # Check for <prosody> tag
-        if elem.tag == "prosody":
-            validate_prosody_attributes(elem.attrib)
-
-        # Check for <break> tag
-        if elem.tag == "break":
-            validate_break_structure(elem)
-
-    # Return final validation result
-    is_valid = len(error_messages) == 0
-    return is_valid, error_messages
-
-def audio_push_s3(filename: str, audio_name: str):
-    with open(filename, 'rb') as data:
-        s3_client.upload_fileobj(data, bucket, f"{dst_prefix}{audio_name}")
+def agent(input: str, agent: dict) -> str:
+   # one attempt: throttling is retried by the shared limiter, which also slows the pool down
+   request = bedrock_agent.agent_request(f"The topic to announce is: {input}", agent, session_id=str(uuid.uuid4()))
+   return bedrock_agent.complete(bedrock_agent_runtime_client, request, attempts=1)
+
+def add_ssml_tags(response_text: str, SsmlAgent: dict) -> str:
+   # deterministic local markup when configured, the SSML agent otherwise or as fallback
+   if generation_mode(SsmlAgent) == "local":
+      local_text = generate_ssml(response_text)
+      if local_text is not None and validate_ssml(local_text)[0]:
+         logger.info("SSML generated locally")
+         return local_text
+      logger.warning("Local SSML generation failed, falling back to the SSML agent")
+   return limiter.call(agent, response_text, SsmlAgent)
 
 def generate_default_announce(topic: str, agent: dict, content_hash: str) -> str:
    default_announce = f"<speak>Ladies and gentlemen, <break time='300ms'/> welcome! <break time='300ms'/> I’m your host, and today our guests will discuss about: {topic}. <break time='300ms'/> Enjoy the debate!</speak>"
-   audio_name = f"{content_hash}.mp3"
-   response_audio = synthesize(default_announce, agent, audio_name)
-   audio_push_s3(response_audio, audio_name)
+   limiter.call(tts.synthesize_to_s3, polly_client, s3_client, default_announce, agent, bucket, f"{dst_prefix}{content_hash}.mp3")
 
 def generate_announce(AnnouncerAgent, SsmlAgent, content, content_hash):
+   timings = {}
+   started = time.monotonic()
    try:
-      response_text = agent(content, AnnouncerAgent)
-      logger.info(f"RESPONSE TEXT: {response_text}")
+      response_text = limiter.call(agent, content, AnnouncerAgent)
+      timings["announce"] = time.monotonic() - started
+      spans.record("announce_llm", timings["announce"] * 1000)
+      logger.debug("RESPONSE TEXT: %s", response_text)
    except Exception as e:
-      logger.error(f"Error in announce generation: {e}")
+      logger.error("Error in announce generation: %s", e)
       return {
          "validation": False,
          "response_error": str(e),
-         "response_text": ""
+         "response_text": "",
+         "timings": timings
       }
 
    # Add SSML tags
+   started = time.monotonic()
    try:
-      response_text = agent(response_text, SsmlAgent)
-      logger.info(f"RESPONSE TEXT: {response_text}")
+      response_text = add_ssml_tags(response_text, SsmlAgent)
+      timings["ssml"] = time.monotonic() - started
+      spans.record("ssml", timings["ssml"] * 1000)
+      logger.debug("RESPONSE TEXT: %s", response_text)
    except Exception as e:
-      logger.error(f"Error in SSML tags generation: {e}")
+      logger.error("Error in SSML tags generation: %s", e)
       return {
          "validation": False,
          "response_error": str(e),
-         "response_text": ""
+         "response_text": "",
+         "timings": timings
       }
 
    # get <speak></speak> content
    speak_text = str(extract_speak_content(response_text))
-   logger.error(f"SPEAK TEXT: {speak_text}")
+   logger.debug("SPEAK TEXT: %s", speak_text)
 
    # check <speak></speak> content
    if speak_text is None:
@@ -218,31 +98,36 @@ def generate_announce(AnnouncerAgent, SsmlAgent, content, content_hash):
       return {
          "validation": False,
          "response_error": "No text included in <speak> and </speak> tags.",
-         "response_text": response_text
+         "response_text": response_text,
+         "timings": timings
       }
 
    # check SSML
-   ssml_is_valid, ssml_validation_errors = validate_ssml(speak_text)
+   with spans.span("validation"):
+      ssml_is_valid, ssml_validation_errors = validate_ssml(speak_text)
    if not ssml_is_valid:
-      logger.error(f"SSML validation failed: {ssml_validation_errors}")
+      logger.error("SSML validation failed: %s", ssml_validation_errors)
       return {
          "validation": False,
          "response_error": ssml_validation_errors,
-         "response_text": response_text
+         "response_text": response_text,
+         "timings": timings
       }
 
    # audio from text generation
    # save audio to S3
+   started = time.monotonic()
    try:
-      audio_name = f"{content_hash}.mp3"
-      response_audio = synthesize(speak_text, AnnouncerAgent, audio_name)
-      audio_push_s3(response_audio, audio_name)
+      limiter.call(tts.synthesize_to_s3, polly_client, s3_client, speak_text, AnnouncerAgent, bucket, f"{dst_prefix}{content_hash}.mp3")
+      timings["tts"] = time.monotonic() - started
+      spans.record("tts", timings["tts"] * 1000)
    except Exception as e:
-      logger.error(f"Error in audio generation: {e}")
+      logger.error("Error in audio generation: %s", e)
       return {
          "validation": False,
          "response_error": str(e),
-         "response_text": response_text
+         "response_text": response_text,
+         "timings": timings
       }
    
    #If everything is ok
@@ -250,10 +135,45 @@ def generate_announce(AnnouncerAgent, SsmlAgent, content, content_hash):
       "validation": True,
       "response_error": "",
       "response_text": response_text,
+      "timings": timings
    }
 
+def announce_topic(idx, content, content_hash, AnnouncerAgent, SsmlAgent):
+   started = time.monotonic()
+   announce_generation_failure_counter = 0
+   timings = {}
+   while announce_generation_failure_counter < announce_attempts:
+      result = generate_announce(AnnouncerAgent, SsmlAgent, content, content_hash)
+      timings = result["timings"]
+      if result["validation"]:
+         logger.debug("Successfully processed line %s: %s", idx, result['response_text'])
+         break
+      else:
+         logger.warning("Failed to process line %s: %s", idx, result['response_error'])
+         announce_generation_failure_counter += 1
+
+   default_announce = announce_generation_failure_counter == announce_attempts
+   if default_announce:
+      logger.error("Failed to process line %s after %d attempts.", idx, announce_attempts)
+      # Generate default announce
+      generate_default_announce(content, AnnouncerAgent, content_hash)
+      logger.info("Default announce generated for line %s.", idx)
+
+   elapsed = time.monotonic() - started
+   spans.record("announce_topic", elapsed * 1000)
+   logger.info("Line %s announced in %.2fs (failed attempts: %d, default: %s, last attempt: %s)", idx, elapsed, announce_generation_failure_counter, default_announce, timings)
+   return elapsed
+
 def lambda_handler(event, context):
-   logger.info(f"Event: {event}")
+   # per-stage timings of every topic announced by this invocation
+   spans.start("upload", Source=event['Records'][0]['s3']['object']['key'])
+   try:
+      return process_upload(event, context)
+   finally:
+      spans.emit()
+
+def process_upload(event, context):
+   logger.debug("Event: %s", event)
    upload_file = event['Records'][0]['s3']['object']['key']
 
    AnnouncerAgent = {
@@ -266,48 +186,66 @@ def lambda_handler(event, context):
    SsmlAgent = {
       "agentId": "EMCMWQNLST",
       "agentAliasId": "NT9HMO4MKC",
+      "ssml_generation": "agent"
    }
    
-   #generate_inputs(upload_file)
-   obj = s3_client.get_object(Bucket=bucket, Key=upload_file)
-   body = obj['Body'].read().decode('utf-8')
-
-  # Process and upload
-   for idx, line in enumerate(body.splitlines(), start=1):
-      content = line.strip()
-      if content:
-         content_hash = hashlib.md5(content.encode('utf-8')).hexdigest()
-         s3_key = f"{dst_prefix}{content_hash}.txt"
-         fileobj = io.BytesIO(content.encode('utf-8'))
-         s3_client.upload_fileobj(fileobj, bucket, s3_key)
-         logger.info(f"Uploaded line {idx} to s3://{bucket}/{s3_key}")
-
-   logger.info("Input file processed. Starting announce generation...")
+   checkpoint = ingest.open_source(s3_client, bucket, upload_file, event['Records'][0]['s3']['object'].get('sequencer'))
+   if checkpoint["done"]:
+      logger.info("s3://%s/%s already processed", bucket, upload_file)
+      return {
+         'statusCode': 200,
+         'body': json.dumps('File already processed.')
+      }
 
-   #Generate announce
-   for idx, line in enumerate(body.splitlines(), start=1):
-      content = line.strip()
-      if content:
-         content_hash = hashlib.md5(content.encode('utf-8')).hexdigest()
-         announce_generation_failure_counter = 0
-         while announce_generation_failure_counter < 2:
-            result = generate_announce(AnnouncerAgent, SsmlAgent, content, content_hash)
-            if result["validation"]:
-               logger.info(f"Successfully processed line {idx}: {result['response_text']}")
-               break
-            else:
-               logger.error(f"Failed to process line {idx}: {result['response_error']}")
-               announce_generation_failure_counter += 1
-         
-         if announce_generation_failure_counter == 2:
-            logger.error(f"Failed to process line {idx} after 2 attempts.")
-            # Generate default announce
-            generate_default_announce(content, AnnouncerAgent, content_hash)
-            logger.info(f"Default announce generated for line {idx}.")
-      
-      sleep(2)
+   # Stream the file in batches: upload new topics, announce those without audio, checkpoint.
+   # A topic that already has both its text and its announce is skipped.
+   index = ingest.load_index(s3_client, bucket, dst_prefix)
+   def done(content_hash):
+      return f"{dst_prefix}{content_hash}.txt" in index and f"{dst_prefix}{content_hash}.mp3" in index
+
+   started = time.monotonic()
+   elapsed = []
+   submitted = 0
+   with ThreadPoolExecutor(max_workers=announce_workers) as executor:
+      for batch in ingest.iter_batches(s3_client, bucket, upload_file, checkpoint, done, size=announce_batch_size):
+         new_topics = [topic for topic in batch["topics"] if f"{dst_prefix}{topic[2]}.txt" not in index]
+         ingest.write_topics(s3_client, bucket, dst_prefix, new_topics, queue=topic_queue.get_queue())
+         logger.info("Uploaded %d topics up to line %d to s3://%s/%s", len(new_topics), batch['line'], bucket, dst_prefix)
+
+         #Generate announce
+         futures = {}
+         for idx, content, content_hash in batch["topics"]:
+            if f"{dst_prefix}{content_hash}.mp3" not in index:
+               futures[executor.submit(announce_topic, idx, content, content_hash, AnnouncerAgent, SsmlAgent)] = idx
+         submitted += len(futures)
+
+         # the deadline is checked as each announce completes: queued ones are cancelled and the
+         # running ones finish. A batch cut short is left uncommitted; the next invocation redoes
+         # it, skipping the topics whose announce already exists.
+         for future in as_completed(futures):
+            if future.cancelled():
+               continue
+            try:
+               elapsed.append(future.result())
+            except Exception as e:
+               logger.error("Announce generation failed for line %s: %s", futures[future], e)
+            if ingest.out_of_time(context):
+               for pending in futures:
+                  pending.cancel()
+
+         if not any(future.cancelled() for future in futures):
+            ingest.commit_batch(s3_client, bucket, upload_file, checkpoint, batch)
+         if ingest.out_of_time(context):
+            ingest.continue_later(lambda_client, event, context)
+            return {
+               'statusCode': 202,
+               'body': json.dumps('File partially processed, continuing.')
+            }
 
-   logger.info("Announce generation completed.")
+   ingest.finish(s3_client, bucket, upload_file, checkpoint)
+   total = time.monotonic() - started
+   slowest = max(elapsed, default=0)
+   logger.info("Announce generation completed: %d/%d topics in %.2fs, slowest %.2fs, limiter %s rate %.2f/s", len(elapsed), submitted, total, slowest, limiter.stats, limiter.rate)
 
    return {
       'statusCode': 200,
@@ -1,31 +1,36 @@
 import json
-import boto3
+import aws_clients
 import logging
-import io
-import hashlib
+import ingest
+import topic_queue
 
 logging.basicConfig(format='[%(asctime)s] {%(filename)s:%(lineno)d} %(message)s', level=logging.INFO)
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
-s3_client = boto3.client('s3')
+s3_client = aws_clients.lazy('s3')
+lambda_client = aws_clients.lazy('lambda')
 bucket = 'ai-conversation-frontend'
 dst_prefix = 'inputs/'
 
 def lambda_handler(event, context):
-  logger.info(f"Event: {event}")
+  logger.debug("Event: %s", event)
   src_key = event['Records'][0]['s3']['object']['key']
-  obj = s3_client.get_object(Bucket=bucket, Key=src_key)
-  body = obj['Body'].read().decode('utf-8')
+  checkpoint = ingest.open_source(s3_client, bucket, src_key, event['Records'][0]['s3']['object'].get('sequencer'))
+  if checkpoint["done"]:
+      logger.info("s3://%s/%s already processed", bucket, src_key)
+      return {'statusCode': 200, 'body': json.dumps('File already processed.')}
 
-  # Process and upload
-  for idx, line in enumerate(body.splitlines(), start=1):
-      content = line.strip()
-      if content:
-          s3_key = f"{dst_prefix}{hashlib.md5(content.encode('utf-8')).hexdigest()}.txt"
-          fileobj = io.BytesIO(content.encode('utf-8'))
-          s3_client.upload_fileobj(fileobj, bucket, s3_key)
-          logger.info(f"Uploaded line {idx} to s3://{bucket}/{s3_key}")
+  # Stream, dedupe against the existing topics and upload in batches
+  index = ingest.load_index(s3_client, bucket, dst_prefix)
+  for batch in ingest.iter_batches(s3_client, bucket, src_key, checkpoint, lambda topic_hash: f"{dst_prefix}{topic_hash}.txt" in index):
+      ingest.write_topics(s3_client, bucket, dst_prefix, batch["topics"], queue=topic_queue.get_queue())
+      ingest.commit_batch(s3_client, bucket, src_key, checkpoint, batch)
+      logger.info("Uploaded %d topics up to line %d to s3://%s/%s", len(batch['topics']), batch['line'], bucket, dst_prefix)
+      if ingest.out_of_time(context):
+          ingest.continue_later(lambda_client, event, context)
+          return {'statusCode': 202, 'body': json.dumps('File partially processed, continuing.')}
 
+  ingest.finish(s3_client, bucket, src_key, checkpoint)
   return {'statusCode': 200, 'body': json.dumps('File processed and uploaded successfully!')}  
 
 if __name__ == "__main__":